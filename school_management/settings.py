@@ -23,6 +23,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'schools.profiling.ProfilerMiddleware',
+    'schools.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,9 +55,48 @@ WSGI_APPLICATION = 'school_management.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # django.db.backends.sqlite3 с BEGIN IMMEDIATE для write_transaction
+        'ENGINE': 'schools.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Соединение живет между запросами воркера; PRAGMA выполняются один раз на соединение
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Таймаут модуля sqlite3 (секунды); PRAGMA busy_timeout ниже задает то же в мс
+            'timeout': 20,
+        },
+    },
+    # Аналитическая реплика: снимок default, который обновляет refresh_analytics_replica.
+    # Новое соединение на каждый запрос видит заново подмененный файл снимка.
+    'analytics': {
+        'ENGINE': 'schools.sqlite',
+        'NAME': BASE_DIR / 'analytics.sqlite3',
+        'CONN_MAX_AGE': 0,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# Статистика панелей и выгрузки оценок читают реплику (schools/analytics.py),
+# пока она не старше MAX_STALENESS секунд; иначе — основную БД.
+DATABASE_ROUTERS = ['schools.analytics.AnalyticsRouter']
+
+ANALYTICS_REPLICA = {
+    'ENABLED': True,
+    'DATABASE': 'analytics',
+    'MAX_STALENESS': 300,
+    'REFRESH_INTERVAL': 60,
+}
+
+# Параметры соединений SQLite (schools/database.py): WAL, synchronous=NORMAL,
+# ожидание блокировки записи, mmap и кэш страниц. WRITE_GATE выстраивает
+# транзакции журнала, загрузки списков и агрегатов в очередь между воркерами.
+SQLITE = {
+    'JOURNAL_MODE': 'wal',
+    'SYNCHRONOUS': 'normal',
+    'BUSY_TIMEOUT': 20000,
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    'CACHE_SIZE': -65536,
+    'WRITE_GATE': True,
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -86,8 +127,43 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Журнал оценок отправляет учащиеся × предметы × 7 полей одной формой
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 20000
+
 AUTH_USER_MODEL = 'schools.User'
 
+# Раннер включает настройки тестов (schools.testing.test_settings)
+TEST_RUNNER = 'schools.testing.SchoolTestRunner'
+
+# Пользователь сессии загружается вместе со школой и кэшируется, если кэш
+# общий для воркеров (schools/backends.py)
+AUTHENTICATION_BACKENDS = ['schools.backends.SchoolModelBackend']
+
+AUTH_USER_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'TIMEOUT': 60,
+}
+
+# Кэш сессий, пользователей и статистики. LocMemCache — свой в каждом процессе:
+# при нескольких воркерах нужен общий кэш (Redis, Memcached), чтобы сброс
+# записей сигналами был виден всем.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'school-management',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# С общим кэшем сессии читаются из него, django_session — только при промахе
+# и записи. В кэше процесса выход из системы удалил бы сессию только в одном
+# воркере, поэтому с LocMemCache сессии хранятся в БД.
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -119,6 +195,54 @@ LOGGING = {
     },
 }
 
+# Журнал аудита пишется фоновым потоком пакетами (schools/audit.py).
+# В тестах запись синхронная, чтобы она попадала в транзакцию теста:
+# это включает тестовый раннер (schools.testing.test_settings).
+AUDIT_LOG = {
+    'ASYNC': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE_SIZE': 10000,
+}
+
+# Бюджет SQL-запросов на страницу (schools/query_budget.py): нарушения
+# пишутся в лог, а в тестах прерывают запрос (schools.testing.test_settings).
+QUERY_BUDGET = {
+    'ENABLED': True,
+    'DEFAULT': 30,
+    'REPEAT_THRESHOLD': 5,
+    'RAISE': False,
+}
+
+# Профилировщик запросов для страницы superuser/profiler/ (schools/profiling.py).
+# Замеры хранятся в памяти каждого процесса; SAMPLE_RATE < 1 снижает накладные расходы.
+PROFILER = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'BUFFER_SIZE': 500,
+}
+
+# Кэш статистики панелей (schools/stats_cache.py). Записи версионируются и
+# сбрасываются сигналами при изменении данных; с LocMemCache сброс виден только
+# своему воркеру, поэтому записи живут не дольше LOCAL_TIMEOUT.
+STATISTICS_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'TIMEOUT': 3600,
+    'LOCAL_TIMEOUT': 30,
+    'LOCK_TIMEOUT': 30,
+}
+
+# Учебные годы (schools/academic_years.py). Оценки и назначения привязаны к году,
+# страницы и статистика читают активный; закрытые годы переносятся в GradeArchive.
+ACADEMIC_YEARS = {
+    'CACHE': 'default',
+    'TIMEOUT': 300,
+    'LOCAL_TIMEOUT': 10,
+    'START_MONTH': 9,
+    'ARCHIVE_BATCH_SIZE': 5000,
+}
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap5'
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
 
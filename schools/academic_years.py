@@ -0,0 +1,191 @@
+import datetime
+import logging
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .caching import entry_timeout
+from .database import write_transaction
+from .memberships import set_group_members, single_group_members
+from .models import AcademicYear, ClassSubjectGroup, Grade, GradeArchive, StudentSubjectGroup
+from .rollups import grade_deltas_applied, rebuild_rollups
+from .stats_cache import invalidate_all
+
+logger = logging.getLogger('schools')
+
+ACADEMIC_YEAR_DEFAULTS = {
+    'CACHE': 'default',
+    # Сколько хранится id активного года в кэше (секунды); сигналы сбрасывают запись
+    'TIMEOUT': 300,
+    # Срок в кэше одного процесса (LocMemCache): сброс виден только процессу,
+    # открывшему год, остальные воркеры ждут истечения записи
+    'LOCAL_TIMEOUT': 10,
+    # Месяц начала учебного года, если активный год создается автоматически
+    'START_MONTH': 9,
+    # Сколько оценок переносится в архив одной транзакцией
+    'ARCHIVE_BATCH_SIZE': 5000,
+}
+
+ACTIVE_YEAR_KEY = 'academic_year:active'
+
+def get_academic_year_settings():
+    return {**ACADEMIC_YEAR_DEFAULTS, **getattr(settings, 'ACADEMIC_YEARS', {})}
+
+def _cache():
+    return caches[get_academic_year_settings()['CACHE']]
+
+def year_bounds(day=None):
+    """(название, начало, окончание) учебного года, в который попадает день"""
+    day = day or timezone.localdate()
+    start_month = get_academic_year_settings()['START_MONTH']
+    first = day.year if day.month >= start_month else day.year - 1
+    start = datetime.date(first, start_month, 1)
+    end = datetime.date(first + 1, start_month, 1) - datetime.timedelta(days=1)
+    return f'{first}/{first + 1}', start, end
+
+def get_active_year_id():
+    """Id активного учебного года для чтения: фильтры страниц и статистики.
+
+    Читается на каждую страницу, поэтому кэшируется — только id, без
+    экземпляра с is_active, который устаревал бы вместе с кэшем. Записи
+    оценок проверяют год заново в своей транзакции (get_active_year).
+    """
+    cache = _cache()
+    year_id = cache.get(ACTIVE_YEAR_KEY)
+    if year_id is None:
+        year_id = get_active_year().pk
+        options = get_academic_year_settings()
+        cache.set(ACTIVE_YEAR_KEY, year_id, entry_timeout(cache, options['TIMEOUT'], options['LOCAL_TIMEOUT']))
+    return year_id
+
+def get_active_year():
+    """Активный учебный год из БД; если его нет, создается год по текущей дате"""
+    return AcademicYear.objects.filter(is_active=True).first() or _create_current_year()
+
+def _create_current_year():
+    name, start, end = year_bounds()
+    try:
+        with transaction.atomic():
+            year, _ = AcademicYear.objects.get_or_create(
+                name=name, defaults={'start_date': start, 'end_date': end, 'is_active': True}
+            )
+            if not year.is_active:
+                year.is_active = True
+                year.save(update_fields=['is_active'])
+    except IntegrityError:
+        # Параллельный процесс успел активировать год
+        return AcademicYear.objects.get(is_active=True)
+    return year
+
+def forget_active_year():
+    transaction.on_commit(lambda: _cache().delete(ACTIVE_YEAR_KEY))
+
+def open_year(name, start_date, end_date, copy_assignments=True):
+    """Открыть новый учебный год и сделать его активным.
+
+    Назначения учителей активных классов и составы их групп копируются из
+    прежнего года пакетно (после rollover_classes классы уже переведены);
+    строки прежнего года остаются в истории. Агрегаты оценок пересчитываются
+    в той же транзакции: они всегда считаются по активному году, и запись
+    оценки, ждущая шлюза записи, увидит уже новый год.
+    """
+    with write_transaction():
+        previous = AcademicYear.objects.filter(is_active=True).first()
+        AcademicYear.objects.filter(is_active=True).update(is_active=False)
+        year = AcademicYear.objects.create(
+            name=name, start_date=start_date, end_date=end_date, is_active=True
+        )
+        copied = {'assignments': 0, 'memberships': 0}
+        if copy_assignments and previous is not None:
+            copied = _copy_assignments(previous, year)
+        rebuild_rollups(year)
+    forget_active_year()
+
+    logger.info(
+        f"Academic year {year.name} opened: {copied['assignments']} assignments, "
+        f"{copied['memberships']} memberships copied"
+    )
+    return year, copied
+
+def _copy_assignments(previous, year):
+    old_groups = list(
+        ClassSubjectGroup.objects.filter(academic_year=previous, class_group__is_archived=False)
+    )
+    ClassSubjectGroup.objects.bulk_create([
+        ClassSubjectGroup(
+            academic_year=year, class_group_id=group.class_group_id, subject_id=group.subject_id,
+            teacher_id=group.teacher_id, group_number=group.group_number, level=group.level,
+        )
+        for group in old_groups
+    ], batch_size=1000)
+
+    new_ids = {
+        (class_id, subject_id, teacher_id, group_number): group_id
+        for group_id, class_id, subject_id, teacher_id, group_number in ClassSubjectGroup.objects.filter(
+            academic_year=year
+        ).values_list('id', 'class_group_id', 'subject_id', 'teacher_id', 'group_number')
+    }
+    group_map = {
+        group.id: new_ids[(group.class_group_id, group.subject_id, group.teacher_id, group.group_number)]
+        for group in old_groups
+    }
+
+    # Переводятся только учащиеся, оставшиеся в классе группы
+    memberships = [
+        StudentSubjectGroup(subject_group_id=group_map[group_id], student_id=student_id)
+        for group_id, student_id in StudentSubjectGroup.objects.filter(
+            subject_group_id__in=list(group_map),
+            student__class_group_id=F('subject_group__class_group_id'),
+        ).values_list('subject_group_id', 'student_id')
+    ]
+    StudentSubjectGroup.objects.bulk_create(memberships, batch_size=1000)
+
+    # Группы, которые ведутся всем классом, дополняются учащимися, пришедшими
+    # в класс в течение прошлого года
+    class_ids = {group.class_group_id for group in old_groups}
+    added = set_group_members(single_group_members(class_ids, year))['added']
+    return {'assignments': len(old_groups), 'memberships': len(memberships) + added}
+
+def archive_year(year, progress=None):
+    """Перенести оценки закрытого года в GradeArchive.
+
+    Оценки переносятся пакетами по ARCHIVE_BATCH_SIZE, каждый пакет —
+    отдельная транзакция: INSERT в архив и DELETE из Grade. В Grade остаются
+    только строки открытых лет. Активный год архивировать нельзя.
+    """
+    if year.is_active:
+        raise ValueError(f'Учебный год {year.name} активен, его нельзя перенести в архив')
+
+    batch_size = get_academic_year_settings()['ARCHIVE_BATCH_SIZE']
+    moved = 0
+    last_id = 0
+    fields = ('id', 'student_id', 'subject_id', 'quarter', 'grade', 'created_at', 'updated_at')
+    while True:
+        with write_transaction():
+            rows = list(
+                Grade.objects.filter(academic_year=year, id__gt=last_id).order_by('id')
+                .values_list(*fields)[:batch_size]
+            )
+            if not rows:
+                break
+            GradeArchive.objects.bulk_create([
+                GradeArchive(
+                    academic_year=year, student_id=student_id, subject_id=subject_id, quarter=quarter,
+                    grade=grade, created_at=created_at, updated_at=updated_at,
+                )
+                for _, student_id, subject_id, quarter, grade, created_at, updated_at in rows
+            ])
+            # Оценки неактивного года в агрегаты не входят
+            with grade_deltas_applied():
+                Grade.objects.filter(id__in=[row[0] for row in rows]).delete()
+        last_id = rows[-1][0]
+        moved += len(rows)
+        if progress:
+            progress(moved)
+
+    AcademicYear.objects.filter(pk=year.pk).update(is_archived=True)
+    forget_active_year()
+    invalidate_all()
+    logger.info(f'Academic year {year.name} archived: {moved} grades moved')
+    return moved
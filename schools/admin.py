@@ -1,9 +1,11 @@
+from collections import defaultdict
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
-    User, School, ClassGroup, Student, Teacher, Subject,
-    ClassSubjectGroup, StudentSubjectGroup, Grade, AuditLog
+    User, School, ClassGroup, Student, Teacher, Subject, AcademicYear,
+    ClassSubjectGroup, StudentSubjectGroup, Grade, GradeArchive, AuditLog
 )
+from .grades import save_grade_matrix
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -27,7 +29,7 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(School)
 class SchoolAdmin(admin.ModelAdmin):
-    list_display = ('name', 'director_name', 'graduation_class', 'education_dept', 'created_at')
+    list_display = ('name', 'director_name', 'graduation_class', 'education_dept', 'last_rollover_year', 'created_at')
     list_filter = ('graduation_class', 'created_at')
     search_fields = ('name', 'director_name')
 
@@ -62,10 +64,16 @@ class SubjectAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at')
     search_fields = ('name',)
 
+@admin.register(AcademicYear)
+class AcademicYearAdmin(admin.ModelAdmin):
+    list_display = ('name', 'start_date', 'end_date', 'is_active', 'is_archived')
+    # Открытие и архивирование года — команды open_academic_year и archive_academic_year
+    readonly_fields = ('is_active', 'is_archived')
+
 @admin.register(ClassSubjectGroup)
 class ClassSubjectGroupAdmin(admin.ModelAdmin):
-    list_display = ('class_group', 'subject', 'teacher', 'level', 'group_number', 'created_at')
-    list_filter = ('level', 'group_number', 'class_group__school', 'subject')
+    list_display = ('class_group', 'subject', 'teacher', 'level', 'group_number', 'academic_year', 'created_at')
+    list_filter = ('academic_year', 'level', 'group_number', 'class_group__school', 'subject')
     search_fields = ('class_group__name', 'subject__name', 'teacher__first_name', 'teacher__last_name')
 
 @admin.register(StudentSubjectGroup)
@@ -76,8 +84,25 @@ class StudentSubjectGroupAdmin(admin.ModelAdmin):
 
 @admin.register(Grade)
 class GradeAdmin(admin.ModelAdmin):
-    list_display = ('student', 'subject', 'quarter', 'grade', 'updated_at')
-    list_filter = ('quarter', 'subject', 'student__class_group__school', 'student__class_group')
+    list_display = ('student', 'subject', 'academic_year', 'quarter', 'grade', 'updated_at')
+    list_filter = ('academic_year', 'quarter', 'subject', 'student__class_group__school', 'student__class_group')
+    search_fields = ('student__first_name', 'student__last_name', 'subject__name')
+    
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Grade.objects.filter(pk=obj.pk))
+    
+    def delete_queryset(self, request, queryset):
+        # Удаление через движок записи, чтобы агрегаты оценок остались согласованными
+        by_year = defaultdict(dict)
+        for year_id, *key in queryset.values_list('academic_year_id', 'student_id', 'subject_id', 'quarter'):
+            by_year[year_id][tuple(key)] = None
+        for year in AcademicYear.objects.filter(id__in=list(by_year)):
+            save_grade_matrix(by_year[year.id], year)
+
+@admin.register(GradeArchive)
+class GradeArchiveAdmin(admin.ModelAdmin):
+    list_display = ('student', 'subject', 'academic_year', 'quarter', 'grade', 'updated_at')
+    list_filter = ('academic_year', 'quarter', 'subject')
     search_fields = ('student__first_name', 'student__last_name', 'subject__name')
 
 @admin.register(AuditLog)
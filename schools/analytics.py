@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import ContextDecorator
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ANALYTICS_REPLICA_DEFAULTS = {
+    'ENABLED': True,
+    # Алиас реплики в DATABASES
+    'DATABASE': 'analytics',
+    # Реплика старше этого (секунды) не используется: чтение идет с основной БД
+    'MAX_STALENESS': 300,
+    # Период обновления для refresh_analytics_replica --loop (секунды)
+    'REFRESH_INTERVAL': 60,
+}
+
+_state = threading.local()
+
+def get_analytics_settings():
+    return {**ANALYTICS_REPLICA_DEFAULTS, **getattr(settings, 'ANALYTICS_REPLICA', {})}
+
+def replica_path(options=None):
+    options = options or get_analytics_settings()
+    if options['DATABASE'] not in settings.DATABASES:
+        return None
+    return str(settings.DATABASES[options['DATABASE']]['NAME'])
+
+def replica_age():
+    """Сколько секунд назад снят снимок реплики (None, если реплики нет)"""
+    path = replica_path()
+    try:
+        return time.time() - os.path.getmtime(path) if path else None
+    except OSError:
+        return None
+
+def analytics_database():
+    """Алиас реплики, если она включена и не старше MAX_STALENESS, иначе None"""
+    options = get_analytics_settings()
+    if not options['ENABLED']:
+        return None
+    age = replica_age()
+    if age is None or age > options['MAX_STALENESS']:
+        return None
+    return options['DATABASE']
+
+def is_analytics_connection(connection):
+    return connection.alias == get_analytics_settings()['DATABASE']
+
+def replica_cache_timeout():
+    """Срок кэша для статистики с реплики: снимок не должен пережить свое обновление"""
+    if analytics_database() is None:
+        return None
+    return get_analytics_settings()['MAX_STALENESS']
+
+class analytics_reads(ContextDecorator):
+    """Чтения внутри блока идут на аналитическую реплику (см. AnalyticsRouter)"""
+
+    def __enter__(self):
+        _state.depth = getattr(_state, 'depth', 0) + 1
+        return self
+
+    def __exit__(self, *exc):
+        _state.depth -= 1
+        return False
+
+def analytics_iter(rows):
+    """Ленивая выгрузка, каждый шаг которой читает с реплики.
+
+    Потоковый ответ выполняет запросы уже после выхода из представления,
+    поэтому флаг ставится только на время очередного next().
+    """
+    iterator = iter(rows)
+    while True:
+        with analytics_reads():
+            try:
+                row = next(iterator)
+            except StopIteration:
+                return
+        yield row
+
+class AnalyticsRouter:
+    """Чтения в блоках analytics_reads — на реплику, все остальное — на основную БД.
+
+    Реплика только читается (PRAGMA query_only) и не мигрируется. Внутри
+    транзакции основной БД чтения остаются на ней, чтобы видеть свои записи.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, 'depth', 0):
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return analytics_database()
+
+    def db_for_write(self, model, **hints):
+        # Объекты, прочитанные с реплики, сохраняются в основную БД
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, get_analytics_settings()['DATABASE']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == get_analytics_settings()['DATABASE']:
+            return False
+        return None
+
+def refresh_replica():
+    """Снять снимок основной БД через backup API SQLite и подменить им реплику.
+
+    Снимок пишется во временный файл и переименовывается поверх реплики:
+    читатели видят либо старый, либо новый файл целиком. Время изменения файла —
+    момент начала снимка, по нему считается отставание. Реплика переводится
+    в режим журнала DELETE, чтобы читать ее без файлов -wal/-shm.
+    """
+    options = get_analytics_settings()
+    target = replica_path(options)
+    if target is None:
+        raise ValueError(f"В DATABASES нет базы «{options['DATABASE']}»")
+    source_settings = connections[DEFAULT_DB_ALIAS].settings_dict
+    temp = f'{target}.tmp-{os.getpid()}'
+
+    started = time.time()
+    source = sqlite3.connect(str(source_settings['NAME']), timeout=source_settings.get('OPTIONS', {}).get('timeout', 5))
+    try:
+        destination = sqlite3.connect(temp)
+        try:
+            # Один шаг (pages=-1): снимок согласован и не блокирует писателей в режиме WAL
+            source.backup(destination)
+            destination.execute('PRAGMA journal_mode = delete')
+        finally:
+            destination.close()
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    finally:
+        source.close()
+
+    os.utime(temp, (started, started))
+    os.replace(temp, target)
+    return {'seconds': time.time() - started, 'size': os.path.getsize(target)}
@@ -0,0 +1,131 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from .database import write_transaction
+from .models import AuditLog
+
+logger = logging.getLogger('schools')
+
+AUDIT_LOG_DEFAULTS = {
+    'ASYNC': True,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_QUEUE_SIZE': 10000,
+}
+
+def get_audit_settings():
+    return {**AUDIT_LOG_DEFAULTS, **getattr(settings, 'AUDIT_LOG', {})}
+
+class AuditLogWriter:
+    """Фоновая запись журнала аудита пакетами через bulk_create.
+
+    Запросы только ставят записи в очередь; поток-писатель сбрасывает их,
+    когда набирается BATCH_SIZE записей или проходит FLUSH_INTERVAL секунд.
+    При переполнении очереди (MAX_QUEUE_SIZE) запись выполняется синхронно
+    в вызывающем потоке. При ASYNC=False (тесты) очередь не используется.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+        atexit.register(self.stop)
+
+    def submit(self, entry):
+        options = get_audit_settings()
+        if not options['ASYNC']:
+            self._write([entry])
+            return
+
+        self._ensure_started(options)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            logger.warning("Audit log queue is full, writing synchronously")
+            self._write([entry])
+
+    def flush(self):
+        """Синхронно записать все накопленные записи"""
+        if self._queue is None:
+            return
+        batch = self._drain(self._queue.qsize())
+        if batch:
+            self._write(batch)
+
+    def stop(self, timeout=5.0):
+        """Остановить поток-писатель и дописать очередь (вызывается при завершении процесса)"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self.flush()
+        self._thread = None
+
+    def _ensure_started(self, options):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            # После fork (например, в воркерах gunicorn) поток родителя недоступен
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=options['MAX_QUEUE_SIZE'])
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(options['BATCH_SIZE'], options['FLUSH_INTERVAL']),
+                name='audit-log-writer',
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self, batch_size, flush_interval):
+        try:
+            while not self._stopping.is_set():
+                batch = self._collect(batch_size, flush_interval)
+                if batch:
+                    self._write(batch)
+        finally:
+            connection.close()
+
+    def _collect(self, batch_size, flush_interval):
+        batch = []
+        deadline = time.monotonic() + flush_interval
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _drain(self, limit):
+        batch = []
+        for _ in range(limit):
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            # Короткая запись встает в общую очередь, а не ждет busy_timeout за журналом
+            with write_transaction():
+                AuditLog.objects.bulk_create(batch)
+        except Exception as e:
+            logger.error(f"Failed to log {len(batch)} action(s): {e}")
+            return
+        for entry in batch:
+            logger.info(f"Action logged: {entry.actor} {entry.action} {entry.model_name} {entry.object_id}")
+
+audit_writer = AuditLogWriter()
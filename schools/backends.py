@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+from .caching import is_process_local
+
+USER_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    # Сколько живет пользователь в кэше (секунды). Сигналы сбрасывают запись
+    # при изменении; кэш процесса (LocMemCache) не используется, см. get_user
+    'TIMEOUT': 60,
+}
+
+def get_user_cache_settings():
+    return {**USER_CACHE_DEFAULTS, **getattr(settings, 'AUTH_USER_CACHE', {})}
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+def get_user_cache():
+    """Кэш пользователей сессий или None.
+
+    Кэш процесса не подходит: смена пароля или is_active=False сбросили бы
+    запись только в одном воркере, а остальные до TIMEOUT пускали бы
+    прежнего пользователя. Без общего кэша пользователь читается из БД.
+    """
+    options = get_user_cache_settings()
+    if not options['ENABLED']:
+        return None
+    cache = caches[options['CACHE']]
+    return None if is_process_local(cache) else cache
+
+def invalidate_users(user_ids):
+    """Сбросить кэш пользователей после фиксации транзакции"""
+    cache = get_user_cache()
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    if not keys or cache is None:
+        return
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+class SchoolModelBackend(ModelBackend):
+    """ModelBackend, который загружает пользователя сессии вместе со школой.
+
+    Пользователь читается одним запросом с select_related('school'):
+    get_user_school() и проверки роли в представлениях больше не ходят в БД.
+    С общим кэшем (get_user_cache) пользователь кэшируется на TIMEOUT секунд;
+    сигналы сбрасывают запись при сохранении, поэтому смена пароля и
+    деактивация завершают сессии во всех воркерах.
+    """
+
+    def get_user(self, user_id):
+        options = get_user_cache_settings()
+        cache = get_user_cache()
+        user = cache.get(user_cache_key(user_id)) if cache is not None else None
+        if user is None:
+            UserModel = get_user_model()
+            try:
+                user = UserModel._default_manager.select_related('school').get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            if cache is not None:
+                cache.set(user_cache_key(user_id), user, options['TIMEOUT'])
+        return user if self.user_can_authenticate(user) else None
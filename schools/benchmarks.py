@@ -0,0 +1,210 @@
+import multiprocessing
+import platform
+import random
+import subprocess
+import time
+import django
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from .database import get_sqlite_settings, write_transaction
+from .diagnostics import QueryRecorder, consume, iter_view_requests, percentile
+from .grades import save_grade_matrix
+from .models import AuditLog, ClassGroup, ClassSubjectGroup, Grade, School, Student, Teacher, User
+
+PERCENTILES = (50, 95, 99)
+
+def current_commit():
+    """Короткий хеш текущего коммита или None вне git-репозитория"""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def dataset_size():
+    return {
+        'schools': School.objects.count(),
+        'classes': ClassGroup.objects.count(),
+        'students': Student.objects.count(),
+        'teachers': Teacher.objects.count(),
+        'grades': Grade.objects.count(),
+        'users': User.objects.count(),
+    }
+
+def measure_view(client, path, repeat, warmup):
+    """Время ответа и запросы страницы за repeat прогонов (после warmup прогревочных)"""
+    for _ in range(warmup):
+        consume(client.get(path))
+
+    timings = []
+    sql_timings = []
+    query_counts = []
+    status = None
+    for _ in range(repeat):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = consume(client.get(path))
+        timings.append((time.perf_counter() - started) * 1000)
+        sql_timings.append(sum(query['time'] for query in recorder.queries) * 1000)
+        query_counts.append(len(recorder.queries))
+        status = response.status_code
+
+    result = {'path': path, 'status': status, 'runs': repeat}
+    for percent in PERCENTILES:
+        result[f'p{percent}_ms'] = round(percentile(timings, percent), 2)
+    result['sql_p50_ms'] = round(percentile(sql_timings, 50), 2)
+    result['queries'] = max(query_counts)
+    return result
+
+def run_benchmarks(repeat=10, warmup=1, names=None, progress=None):
+    """Прогнать все GET-страницы приложения через тестовый клиент.
+
+    Каждая страница открывается пользователем своей роли; для каждой
+    считаются перцентили времени ответа, время SQL и число запросов.
+    Изменения, которые сделают страницы, откатываются.
+    """
+    client = Client(raise_request_exception=False)
+    report = {
+        'created_at': timezone.now().isoformat(),
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'repeat': repeat,
+        'dataset': dataset_size(),
+        'views': {},
+        'skipped': {},
+    }
+
+    with transaction.atomic():
+        for name, path, user, skip_reason in iter_view_requests():
+            if names and name not in names:
+                continue
+            if skip_reason:
+                report['skipped'][name] = skip_reason
+                continue
+            client.force_login(user)
+            report['views'][name] = measure_view(client, path, repeat, warmup)
+            if progress:
+                progress(name, report['views'][name])
+        transaction.set_rollback(True)
+
+    return report
+
+def compare_reports(baseline, current):
+    """Изменения p50 и числа запросов относительно прошлого отчета: [(name, old, new), ...]"""
+    rows = []
+    for name, result in current['views'].items():
+        old = baseline.get('views', {}).get(name)
+        if old is not None:
+            rows.append((name, old, result))
+    return rows
+
+WRITE_BENCHMARK_MODEL = 'WriteBenchmark'
+
+def _journal_classes(limit):
+    """Классы для нагрузки на запись: {class_id: ([student_id, ...], [subject_id, ...])}"""
+    classes = {}
+    for class_id in ClassGroup.objects.filter(students__isnull=False).distinct().values_list('id', flat=True)[:limit]:
+        students = list(Student.objects.filter(class_group_id=class_id).values_list('id', flat=True))
+        subjects = list(ClassSubjectGroup.objects.for_year().filter(class_group_id=class_id).values_list(
+            'subject_id', flat=True).distinct())
+        if students and subjects:
+            classes[class_id] = (students, subjects)
+    return classes
+
+def _write_worker(index, classes, duration, long_ratio, gate, results):
+    """Один писатель: сохранения журнала класса, одиночные ячейки и записи аудита"""
+    rng = random.Random(index)
+    class_ids = list(classes)
+    samples = []
+    with override_settings(SQLITE={**get_sqlite_settings(), 'WRITE_GATE': gate}):
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            students, subjects = classes[rng.choice(class_ids)]
+            if rng.random() < long_ratio:
+                kind = 'journal'
+                values = {
+                    (student_id, subject_id, quarter): rng.randint(1, 10)
+                    for student_id in students for subject_id in subjects for quarter in Grade.TERM_QUARTERS
+                }
+            else:
+                kind = rng.choice(('cell', 'audit'))
+                values = {(rng.choice(students), rng.choice(subjects), rng.choice(Grade.TERM_QUARTERS)): rng.randint(1, 10)}
+
+            started = time.perf_counter()
+            failed = False
+            try:
+                if kind == 'audit':
+                    # Как AuditLogWriter._write
+                    with write_transaction():
+                        AuditLog.objects.bulk_create([
+                            AuditLog(action='update', model_name=WRITE_BENCHMARK_MODEL, object_id=str(index))
+                        ])
+                else:
+                    save_grade_matrix(values)
+            except OperationalError:
+                failed = True
+            samples.append((kind, (time.perf_counter() - started) * 1000, failed))
+    connections.close_all()
+    results.put(samples)
+
+def run_write_benchmark(writers=8, duration=10.0, long_ratio=0.1, gate=True, classes=20):
+    """Параллельные писатели в отдельных процессах (как воркеры gunicorn).
+
+    Каждый в течение duration секунд сохраняет журнал целого класса (доля
+    long_ratio), одну ячейку журнала или запись аудита. Возвращает пропускную
+    способность, перцентили времени и число ошибок «database is locked» по видам.
+    Оценки выбранных классов меняются; записи аудита удаляются в конце.
+    """
+    targets = _journal_classes(classes)
+    if not targets:
+        raise ValueError('Нет классов с учащимися и предметами')
+
+    # Дочерние процессы не должны делить соединение родителя
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [
+        context.Process(target=_write_worker, args=(index, targets, duration, long_ratio, gate, results))
+        for index in range(writers)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    samples = []
+    for _ in processes:
+        samples.extend(results.get())
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    AuditLog.objects.filter(model_name=WRITE_BENCHMARK_MODEL).delete()
+
+    report = {
+        'writers': writers,
+        'duration_s': round(elapsed, 2),
+        'gate': gate,
+        'operations': len(samples),
+        'ops_per_s': round(sum(1 for _, _, failed in samples if not failed) / elapsed, 1),
+        'errors': sum(1 for _, _, failed in samples if failed),
+        'kinds': {},
+    }
+    for kind in ('journal', 'cell', 'audit'):
+        timings = [ms for sample_kind, ms, failed in samples if sample_kind == kind and not failed]
+        result = {
+            'ok': len(timings),
+            'errors': sum(1 for sample_kind, _, failed in samples if sample_kind == kind and failed),
+        }
+        for percent in PERCENTILES:
+            value = percentile(timings, percent)
+            result[f'p{percent}_ms'] = round(value, 1) if value is not None else None
+        report['kinds'][kind] = result
+    return report
@@ -0,0 +1,15 @@
+from django.core.cache.backends.locmem import LocMemCache
+
+def is_process_local(cache):
+    """Кэш виден только своему процессу (LocMemCache).
+
+    Сброс записи сигналом доходит лишь до процесса, который изменил данные;
+    остальные воркеры читают свою копию, пока не истечет срок записи.
+    """
+    return isinstance(cache, LocMemCache)
+
+def entry_timeout(cache, timeout, local_timeout):
+    """Срок записи: в кэше процесса — не дольше local_timeout"""
+    if not is_process_local(cache):
+        return timeout
+    return local_timeout if timeout is None else min(timeout, local_timeout)
@@ -0,0 +1,127 @@
+import os
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from .analytics import is_analytics_connection
+
+try:
+    import fcntl
+except ImportError:  # Windows: очередь пишущих транзакций только внутри процесса
+    fcntl = None
+
+SQLITE_DEFAULTS = {
+    # WAL: читатели не ждут писателя, писатель не ждет читателей
+    'JOURNAL_MODE': 'wal',
+    # В режиме WAL NORMAL не теряет целостность, fsync только на контрольных точках
+    'SYNCHRONOUS': 'normal',
+    # Сколько ждать блокировку записи, прежде чем вернуть «database is locked» (мс)
+    'BUSY_TIMEOUT': 20000,
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    # Отрицательное значение — размер кэша страниц в КиБ
+    'CACHE_SIZE': -65536,
+    # Очередь пишущих транзакций между потоками и процессами (write_transaction)
+    'WRITE_GATE': True,
+}
+
+def get_sqlite_settings():
+    return {**SQLITE_DEFAULTS, **getattr(settings, 'SQLITE', {})}
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """PRAGMA для каждого нового соединения SQLite"""
+    if connection.vendor != 'sqlite':
+        return
+    options = get_sqlite_settings()
+    read_only = is_analytics_connection(connection)
+    with connection.cursor() as cursor:
+        # journal_mode хранится в файле БД, остальные параметры — на соединение;
+        # режим реплики задает refresh_replica
+        if not connection.is_in_memory_db() and not read_only:
+            cursor.execute(f"PRAGMA journal_mode = {options['JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous = {options['SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout = {int(options['BUSY_TIMEOUT'])}")
+        cursor.execute(f"PRAGMA mmap_size = {int(options['MMAP_SIZE'])}")
+        cursor.execute(f"PRAGMA cache_size = {int(options['CACHE_SIZE'])}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+
+class WriteGate:
+    """Очередь пишущих транзакций к одному файлу SQLite.
+
+    Ожидание busy_timeout в SQLite — опрос со сном: короткие записи
+    проигрывают длинным транзакциям журнала, пока не истечет таймаут. Шлюз
+    выстраивает транзакции в очередь заранее: внутри процесса — блокировкой
+    потока, между процессами (воркеры gunicorn) — flock на файле рядом с БД.
+    Ожидающие просыпаются сразу по освобождению, без опроса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._files = {}
+        self._pid = None
+
+    def _lock_file(self, path):
+        # После fork дескриптор родителя разделяет с ним блокировку — открываем свой
+        if self._pid != os.getpid():
+            self._files = {}
+            self._pid = os.getpid()
+        fd = self._files.get(path)
+        if fd is None:
+            fd = self._files[path] = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        return fd
+
+    @contextmanager
+    def hold(self, path):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        try:
+            if depth:
+                yield
+                return
+            with self._lock:
+                fd = self._lock_file(path) if fcntl is not None else None
+                if fd is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fd is not None:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            self._local.depth = depth
+
+write_gate = WriteGate()
+
+def _gate_path(connection):
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return None
+    if connection.in_atomic_block:
+        # Внешняя транзакция могла уже взять блокировку записи SQLite: ждать шлюз
+        # внутри нее значит ждать того, кто сам ждет нас
+        return None
+    if not get_sqlite_settings()['WRITE_GATE']:
+        return None
+    return f"{connection.settings_dict['NAME']}-writegate"
+
+@contextmanager
+def write_transaction(using=None):
+    """transaction.atomic для транзакций, которые пишут в БД, с очередью в SQLite"""
+    using = using or DEFAULT_DB_ALIAS
+    path = _gate_path(connections[using])
+    if path is None:
+        with transaction.atomic(using=using):
+            yield
+        return
+    connection = connections[using]
+    with write_gate.hold(path):
+        # Бэкенд schools.sqlite начнет транзакцию с BEGIN IMMEDIATE
+        connection.begin_immediate = True
+        try:
+            with transaction.atomic(using=using):
+                yield
+        finally:
+            connection.begin_immediate = False
@@ -0,0 +1,136 @@
+import math
+import time
+from django.db import connection
+from django.urls import URLPattern, URLResolver, reverse
+from .models import ClassGroup, ClassSubjectGroup, School, Student, Subject, Teacher, User
+from . import urls as schools_urls
+
+# Роль пользователя определяется по префиксу имени URL
+ROLE_PREFIXES = (
+    ('superuser-', 'superuser'),
+    ('education_dept-', 'education_dept'),
+    ('school_admin-', 'school_admin'),
+)
+
+class QueryRecorder:
+    """execute_wrapper, запоминающий SQL, параметры и время каждого запроса"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'time': time.perf_counter() - started,
+            })
+
+    def record(self):
+        """Контекстный менеджер: with recorder.record(): ..."""
+        return connection.execute_wrapper(self)
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга (None для пустого списка)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def iter_url_patterns(patterns=None):
+    """Имена URL приложения и имена их параметров: (name, [kwarg, ...])"""
+    if patterns is None:
+        patterns = schools_urls.urlpatterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_url_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name, list(pattern.pattern.converters)
+
+def role_for_url(name):
+    for prefix, role in ROLE_PREFIXES:
+        if name.startswith(prefix):
+            return role
+    return None
+
+class SampleObjects:
+    """Пользователи нужных ролей и объекты для параметров URL из текущей БД"""
+
+    def __init__(self):
+        self.users = {
+            'superuser': User.objects.filter(is_superuser=True).first(),
+            'education_dept': User.objects.filter(role='education_dept', schools__isnull=False).first(),
+            'school_admin': User.objects.filter(
+                role='school_admin', school__classes__students__isnull=False
+            ).select_related('school').first(),
+        }
+        self._kwargs = {'superuser': {}, 'education_dept': {}, 'school_admin': {}}
+
+        dept = self.users['education_dept']
+        if dept is not None:
+            school = School.objects.filter(education_dept=dept).first()
+            target_user = User.objects.exclude(role='superuser').exclude(id=dept.id).first() or dept
+            subject = Subject.objects.first()
+            self._kwargs['education_dept'] = {
+                'school_id': school.id if school else None,
+                'user_id': target_user.id,
+                'subject_id': subject.id if subject else None,
+            }
+
+        admin = self.users['school_admin']
+        if admin is not None:
+            school = admin.school
+            assignment = ClassSubjectGroup.objects.for_year().filter(class_group__school=school).order_by('id').first()
+            if assignment is not None:
+                class_group = assignment.class_group
+            else:
+                class_group = ClassGroup.objects.filter(school=school, students__isnull=False).first()
+            student = Student.objects.filter(class_group=class_group).first()
+            teacher = Teacher.objects.filter(school=school).first()
+            self._kwargs['school_admin'] = {
+                'class_id': class_group.id if class_group else None,
+                'student_id': student.id if student else None,
+                'teacher_id': teacher.id if teacher else None,
+                'assignment_id': assignment.id if assignment else None,
+                'subject_id': assignment.subject_id if assignment else None,
+            }
+
+    def user_for(self, role):
+        return self.users.get(role)
+
+    def kwargs_for(self, role, names):
+        """Значения параметров URL или None, если в БД нет подходящего объекта"""
+        values = self._kwargs.get(role, {})
+        kwargs = {}
+        for name in names:
+            if values.get(name) is None:
+                return None
+            kwargs[name] = values[name]
+        return kwargs
+
+def iter_view_requests(samples=None):
+    """Все GET-страницы приложения: (url_name, path, user, причина пропуска или None)"""
+    samples = samples or SampleObjects()
+    for name, kwarg_names in iter_url_patterns():
+        role = role_for_url(name)
+        user = samples.user_for(role)
+        if user is None:
+            yield name, None, None, f'нет пользователя с ролью {role}'
+            continue
+        kwargs = samples.kwargs_for(role, kwarg_names)
+        if kwargs is None:
+            yield name, None, user, 'нет объектов для параметров URL'
+            continue
+        yield name, reverse(f'{schools_urls.app_name}:{name}', kwargs=kwargs), user, None
+
+def consume(response):
+    """Дочитать ответ (включая потоковые), чтобы выполнились все его запросы"""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
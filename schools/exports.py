@@ -0,0 +1,98 @@
+import csv
+import tempfile
+from django.http import FileResponse, StreamingHttpResponse
+from .grades import QUARTERS, JournalSnapshot
+from .models import ClassGroup, Grade
+
+EXPORT_CHUNK_SIZE = 2000
+CSV_DELIMITER = ';'  # Excel с русской локалью ожидает «;»
+
+QUARTER_LABELS = dict(Grade.QUARTER_CHOICES)
+
+GRADE_EXPORT_HEADER = ['Школа', 'Класс', 'Фамилия', 'Имя', 'Отчество', 'Предмет', 'Четверть', 'Оценка']
+
+class Echo:
+    """Псевдо-буфер для csv.writer: writerow возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+def journal_rows(class_group):
+    """Журнал класса в виде таблицы: учащийся × (предмет, четверть), как на странице журнала"""
+    snapshot = JournalSnapshot(class_group)
+    header = ['Учащийся']
+    for subject in snapshot.subjects:
+        header.extend(f'{subject.name} ({QUARTER_LABELS[quarter]})' for quarter in QUARTERS)
+    yield header
+
+    matrix = snapshot.matrix
+    for student in snapshot.students:
+        row = [str(student)]
+        for subject in snapshot.subjects:
+            row.extend(matrix.get(student.id, subject.id, quarter) for quarter in QUARTERS)
+        yield row
+
+def grade_rows(schools, year=None):
+    """Оценки школ за учебный год (по умолчанию активный) построчно (одна оценка — одна строка).
+
+    Заголовок отдается сразу, затем оценки читаются по одному классу за запрос
+    через iterator(): сортировка идет в пределах класса, поэтому время до
+    первой строки и память не зависят от объема выгрузки.
+    """
+    yield GRADE_EXPORT_HEADER
+    grades_of_year = Grade.objects.for_year(year)
+
+    classes = ClassGroup.objects.filter(school__in=schools).order_by(
+        'school__name', 'school_id', 'name', 'id'
+    ).values_list('id', 'name', 'school__name')
+    for class_id, class_name, school_name in classes:
+        grades = grades_of_year.filter(student__class_group_id=class_id, grade__isnull=False).order_by(
+            'student__last_name', 'student__first_name', 'student_id', 'subject__name', 'quarter'
+        ).values_list(
+            'student__last_name', 'student__first_name', 'student__patronymic',
+            'subject__name', 'quarter', 'grade'
+        )
+        for last_name, first_name, patronymic, subject_name, quarter, grade in grades.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [school_name, class_name, last_name, first_name, patronymic,
+                   subject_name, QUARTER_LABELS.get(quarter, quarter), grade]
+
+def csv_response(rows, filename):
+    """Потоковая выдача CSV: строки пишутся в ответ по мере чтения из БД"""
+    writer = csv.writer(Echo(), delimiter=CSV_DELIMITER)
+
+    def stream():
+        yield '\ufeff'  # BOM, чтобы Excel распознал UTF-8
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+def xlsx_response(rows, filename, title='Оценки'):
+    """Выдача XLSX через write-only книгу openpyxl.
+
+    Строки сбрасываются во временный файл по мере записи, так что память
+    ограничена; XLSX — zip-архив, поэтому отдается после сборки файла.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    for row in rows:
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f'{filename}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+def export_response(rows, filename, export_format='csv'):
+    if export_format == 'xlsx':
+        return xlsx_response(rows, filename)
+    return csv_response(rows, filename)
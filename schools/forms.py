@@ -194,7 +194,7 @@ class StudentForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         
         if self.school:
-            self.fields['class_group'].queryset = ClassGroup.objects.filter(school=self.school)
+            self.fields['class_group'].queryset = ClassGroup.objects.filter(school=self.school).active().select_related('school')
         
         self.helper = FormHelper()
         self.helper.form_method = 'post'
@@ -263,37 +263,6 @@ class AssignTeacherToSubjectForm(forms.Form):
             Submit('submit', _('Назначить'), css_class='btn-primary')
         )
 
-class GradeJournalForm(forms.Form):
-    """Динамическая форма для журнала оценок"""
-    
-    def __init__(self, *args, **kwargs):
-        self.class_group = kwargs.pop('class_group', None)
-        students = kwargs.pop('students', [])
-        subjects = kwargs.pop('subjects', [])
-        grades_data = kwargs.pop('grades_data', {})
-        
-        super().__init__(*args, **kwargs)
-        
-        quarters = ['q1', 'q2', 'q3', 'q4', 'exam', 'year', 'final']
-        
-        for student in students:
-            for subject in subjects:
-                for quarter in quarters:
-                    field_name = f'grade_{student.id}_{subject.id}_{quarter}'
-                    current_grade = grades_data.get((student.id, subject.id, quarter))
-                    self.fields[field_name] = forms.IntegerField(
-                        required=False,
-                        min_value=1,
-                        max_value=10,
-                        initial=current_grade,
-                        widget=forms.NumberInput(attrs={
-                            'class': 'grade-input',
-                            'data-student': student.id,
-                            'data-subject': subject.id,
-                            'data-quarter': quarter
-                        })
-                    )
-
 class DistributeStudentsToSubgroupsForm(forms.Form):
     """Форма для распределения учащихся по подгруппам (transfer-box)"""
     
@@ -338,7 +307,7 @@ class AssignTeacherToGroupForm(forms.Form):
         super().__init__(*args, **kwargs)
         
         if self.school:
-            self.fields['class_groups'].queryset = ClassGroup.objects.filter(school=self.school)
+            self.fields['class_groups'].queryset = ClassGroup.objects.filter(school=self.school).active().select_related('school')
         
         self.helper = FormHelper()
         self.helper.form_method = 'post'
@@ -347,4 +316,28 @@ class AssignTeacherToGroupForm(forms.Form):
             Field('class_groups'),
             Field('level'),
             Submit('submit', _('Назначить'), css_class='btn-primary')
-        )
\ No newline at end of file
+        )
+
+class RosterImportForm(forms.Form):
+    """Форма загрузки списка учащихся (CSV или XLSX)"""
+    
+    file = forms.FileField(
+        label=_('Файл списка'),
+        help_text=_('CSV или XLSX с колонками: Класс, Фамилия, Имя, Отчество')
+    )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.form_enctype = 'multipart/form-data'
+        self.helper.layout = Layout(
+            Field('file'),
+            Submit('submit', _('Импортировать'), css_class='btn-primary')
+        )
+    
+    def clean_file(self):
+        uploaded = self.cleaned_data['file']
+        if not uploaded.name.lower().endswith(('.csv', '.xlsx')):
+            raise ValidationError(_('Поддерживаются только файлы CSV и XLSX'))
+        return uploaded
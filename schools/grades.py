@@ -0,0 +1,233 @@
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .academic_years import get_active_year, get_active_year_id
+from .database import write_transaction
+from .models import ClassSubjectGroup, Grade, Student, Subject
+from .rollups import apply_grade_deltas, collect_grade_deltas, grade_deltas_applied
+
+QUARTERS = [code for code, _ in Grade.QUARTER_CHOICES]
+TERM_QUARTERS = Grade.TERM_QUARTERS
+
+def save_grade_matrix(values, year=None):
+    """Сохранить матрицу оценок пакетно, записывая только изменившиеся ячейки.
+
+    values: {(student_id, subject_id, quarter): оценка или None}.
+    None означает очищенную ячейку: существующая запись удаляется.
+    Оценки пишутся в учебный год year (по умолчанию активный).
+    Возвращает счетчики created/updated/deleted/unchanged.
+    """
+    result = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    if not values:
+        return result
+
+    student_ids = {key[0] for key in values}
+    subject_ids = {key[1] for key in values}
+
+    to_create = []
+    to_update = []
+    to_delete = []
+    changes = []
+    now = timezone.now()
+
+    with write_transaction():
+        # Год читается из БД внутри транзакции: кэш других процессов мог еще не
+        # узнать об открытии нового года, а агрегаты считаются по активному
+        active_year = get_active_year()
+        year = year or active_year
+        existing = {
+            (g.student_id, g.subject_id, g.quarter): g
+            for g in Grade.objects.filter(
+                academic_year=year,
+                student_id__in=student_ids,
+                subject_id__in=subject_ids,
+            ).only('id', 'student_id', 'subject_id', 'quarter', 'grade')
+        }
+
+        for key, value in values.items():
+            grade_obj = existing.get(key)
+            if grade_obj is None:
+                if value is None:
+                    result['unchanged'] += 1
+                else:
+                    student_id, subject_id, quarter = key
+                    changes.append((student_id, quarter, None, value))
+                    to_create.append(Grade(
+                        academic_year=year,
+                        student_id=student_id,
+                        subject_id=subject_id,
+                        quarter=quarter,
+                        grade=value,
+                    ))
+            elif value is None:
+                to_delete.append(grade_obj.id)
+                changes.append((grade_obj.student_id, grade_obj.quarter, grade_obj.grade, None))
+            elif grade_obj.grade != value:
+                changes.append((grade_obj.student_id, grade_obj.quarter, grade_obj.grade, value))
+                grade_obj.grade = value
+                grade_obj.updated_at = now
+                to_update.append(grade_obj)
+            else:
+                result['unchanged'] += 1
+
+        if to_create:
+            Grade.objects.bulk_create(to_create)
+        if to_update:
+            Grade.objects.bulk_update(to_update, ['grade', 'updated_at'])
+        if to_delete:
+            with grade_deltas_applied():
+                Grade.objects.filter(id__in=to_delete).delete()
+
+        if year.pk == active_year.pk:
+            apply_grade_deltas(collect_grade_deltas(changes))
+
+    result['created'] = len(to_create)
+    result['updated'] = len(to_update)
+    result['deleted'] = len(to_delete)
+    return result
+
+MAX_CELL_CHANGES = 500
+
+def parse_cell_changes(class_group, changes):
+    """Проверить пакет изменений ячеек журнала класса.
+
+    changes: [{'student': id, 'subject': id, 'quarter': код, 'grade': 1..10 или None}];
+    ключ grade обязателен, None удаляет оценку. Учащийся должен быть в классе,
+    предмет — назначен классу. Возвращает
+    ({(student_id, subject_id, quarter): оценка}, [ошибки]); при ошибках
+    пакет не сохраняется целиком. Проверка стоит двух запросов.
+    """
+    if not isinstance(changes, list) or not changes:
+        return {}, ['Нет изменений']
+    if len(changes) > MAX_CELL_CHANGES:
+        return {}, [f'Не более {MAX_CELL_CHANGES} изменений за запрос']
+
+    values = {}
+    errors = []
+    for index, change in enumerate(changes):
+        try:
+            student_id = int(change['student'])
+            subject_id = int(change['subject'])
+            quarter = change['quarter']
+            grade = change['grade']
+        except (KeyError, TypeError, ValueError):
+            errors.append(f'Изменение {index + 1}: нужны student, subject, quarter и grade')
+            continue
+        if quarter not in QUARTERS:
+            errors.append(f'Изменение {index + 1}: неизвестная четверть «{quarter}»')
+            continue
+        if grade == '':
+            grade = None
+        if grade is not None:
+            # isdigit() пропускает «²» и другие цифры Юникода, на которых падает int()
+            text = str(grade).strip()
+            if isinstance(grade, bool) or not isinstance(grade, (int, str)) or not (text.isascii() and text.isdecimal()):
+                errors.append(f'Изменение {index + 1}: оценка должна быть числом')
+                continue
+            grade = int(text)
+            if not (1 <= grade <= 10):
+                errors.append(f'Изменение {index + 1}: оценка должна быть от 1 до 10')
+                continue
+        values[(student_id, subject_id, quarter)] = grade
+
+    student_ids = {key[0] for key in values}
+    subject_ids = {key[1] for key in values}
+    known_students = set(Student.objects.filter(
+        class_group=class_group, id__in=student_ids
+    ).values_list('id', flat=True))
+    known_subjects = set(ClassSubjectGroup.objects.for_year().filter(
+        class_group=class_group, subject_id__in=subject_ids
+    ).values_list('subject_id', flat=True))
+    if student_ids - known_students:
+        errors.append('Учащиеся не из этого класса: ' + ', '.join(map(str, sorted(student_ids - known_students))))
+    if subject_ids - known_subjects:
+        errors.append('Предметы не назначены классу: ' + ', '.join(map(str, sorted(subject_ids - known_subjects))))
+    return values, errors
+
+def save_grade_cells(class_group, changes):
+    """Сохранить пакет ячеек журнала и пересчитать средние баллы затронутых учащихся.
+
+    Возвращает (результат save_grade_matrix, {student_id: средний балл}, ошибки);
+    при ошибках ничего не сохраняется.
+    """
+    values, errors = parse_cell_changes(class_group, changes)
+    if errors:
+        return None, {}, errors
+
+    result = save_grade_matrix(values)
+    student_ids = {key[0] for key in values}
+    subjects = Subject.objects.filter(
+        class_groups__class_group=class_group, class_groups__academic_year=get_active_year_id()
+    ).distinct()
+    matrix = load_grade_matrix(student_ids, subjects)
+    averages = {student_id: matrix.average(student_id) for student_id in student_ids}
+    return result, averages, []
+
+class GradeMatrix:
+    """Оценки группы учащихся, загруженные одним запросом.
+
+    Хранится как {student_id: {subject_id: {quarter: оценка}}}; средние
+    баллы считаются в памяти без обращений к БД.
+    """
+
+    def __init__(self, rows=()):
+        self.data = {}
+        for student_id, subject_id, quarter, grade in rows:
+            self.data.setdefault(student_id, {}).setdefault(subject_id, {})[quarter] = grade
+
+    def get(self, student_id, subject_id, quarter):
+        return self.data.get(student_id, {}).get(subject_id, {}).get(quarter)
+
+    def student_row(self, student_id):
+        """Оценки учащегося: {subject_id: {quarter: оценка}}"""
+        return self.data.get(student_id, {})
+
+    def _grades(self, student_id, subject_ids=None, quarters=None):
+        for subject_id, subject_grades in self.student_row(student_id).items():
+            if subject_ids is not None and subject_id not in subject_ids:
+                continue
+            for quarter, grade in subject_grades.items():
+                if grade is not None and (quarters is None or quarter in quarters):
+                    yield grade
+
+    def average(self, student_id, subject_ids=None, quarters=None):
+        """Средний балл учащегося по выбранным предметам и четвертям (None, если оценок нет)"""
+        grades = list(self._grades(student_id, subject_ids, quarters))
+        if not grades:
+            return None
+        return round(sum(grades) / len(grades), 2)
+
+    def subject_average(self, student_id, subject_id, quarters=TERM_QUARTERS):
+        return self.average(student_id, subject_ids={subject_id}, quarters=quarters)
+
+    def quarter_averages(self, student_id):
+        """Средние баллы учащегося по каждой четверти: {quarter: средний балл}"""
+        return {quarter: self.average(student_id, quarters={quarter}) for quarter in QUARTERS}
+
+def load_grade_matrix(students, subjects=None, year=None):
+    """Загрузить оценки учащихся (одного или всего класса) за учебный год одним запросом"""
+    grades = Grade.objects.for_year(year).filter(student__in=students)
+    if subjects is not None:
+        grades = grades.filter(subject__in=subjects)
+    return GradeMatrix(grades.values_list('student_id', 'subject_id', 'quarter', 'grade'))
+
+class JournalSnapshot:
+    """Данные журнала класса, загружаемые один раз за запрос.
+
+    Класс, упорядоченный список учащихся, уникальные предметы класса и матрица
+    оценок; используются формой, контекстом шаблона и обработкой POST.
+    Снимок стоит фиксированного числа запросов (не более 3) независимо от
+    размера класса; матрица оценок загружается при первом обращении.
+    """
+
+    def __init__(self, class_group):
+        self.class_group = class_group
+        self.students = list(class_group.students.order_by('last_name', 'first_name', 'id'))
+        self.subjects = list(
+            Subject.objects.filter(
+                class_groups__class_group=class_group, class_groups__academic_year=get_active_year_id()
+            ).distinct().order_by('name')
+        )
+
+    @cached_property
+    def matrix(self):
+        return load_grade_matrix(self.students, self.subjects)
@@ -0,0 +1,73 @@
+from django.template.defaultfilters import floatformat
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+from .grades import QUARTERS
+
+# Разметка строки журнала собирается строковыми шаблонами: при тысячах ячеек
+# поля форм и теги шаблонов Django стоят на порядок дороже
+ROW_START = '<tr data-student-id="%d"><td class="sticky-column bg-white"><strong>%s</strong></td>'
+CELL = (
+    '<td class="p-0"><input type="text" name="grade_%d_%d_%s" '
+    'class="grade-input form-control form-control-sm border-0 rounded-0%s" value="%s"></td>'
+)
+ROW_END = '<td class="average-cell text-center fw-bold">%s</td></tr>'
+ERROR_CLASS = ' grade-error'
+
+def grade_field_name(student_id, subject_id, quarter):
+    return f'grade_{student_id}_{subject_id}_{quarter}'
+
+def parse_journal_post(data, snapshot):
+    """Разобрать отправленный журнал за один проход по ячейкам снимка.
+
+    Возвращает ({(student_id, subject_id, quarter): оценка или None}, {имя поля: значение})
+    — значения для save_grade_matrix и неверные ячейки. Пустая ячейка означает
+    удаление оценки; ячейки, которых нет в POST, не меняются.
+    """
+    values = {}
+    invalid = {}
+    for student in snapshot.students:
+        for subject in snapshot.subjects:
+            for quarter in QUARTERS:
+                name = grade_field_name(student.id, subject.id, quarter)
+                raw = data.get(name)
+                if raw is None:
+                    continue
+                raw = raw.strip()
+                if not raw:
+                    values[(student.id, subject.id, quarter)] = None
+                # isdigit() пропускает «²», на котором падает int()
+                elif raw.isascii() and raw.isdecimal() and 1 <= int(raw) <= 10:
+                    values[(student.id, subject.id, quarter)] = int(raw)
+                else:
+                    invalid[name] = raw
+    return values, invalid
+
+def render_journal_rows(snapshot, submitted=None, invalid=()):
+    """HTML строк журнала (tbody) по снимку класса.
+
+    submitted — отправленные значения (QueryDict) для повторного показа формы
+    с ошибками; ячейки из invalid подсвечиваются.
+    """
+    matrix = snapshot.matrix
+    parts = []
+    for student in snapshot.students:
+        row = matrix.student_row(student.id)
+        parts.append(ROW_START % (student.id, conditional_escape(student.get_full_name())))
+        for subject in snapshot.subjects:
+            grades = row.get(subject.id, {})
+            for quarter in QUARTERS:
+                value = None
+                error = ''
+                if submitted is not None:
+                    name = grade_field_name(student.id, subject.id, quarter)
+                    value = submitted.get(name)
+                    if value is not None:
+                        value = conditional_escape(value)
+                        error = ERROR_CLASS if name in invalid else ''
+                if value is None:
+                    value = grades.get(quarter)
+                    value = '' if value is None else value
+                parts.append(CELL % (student.id, subject.id, quarter, error, value))
+        average = matrix.average(student.id)
+        parts.append(ROW_END % (floatformat(average, 2) if average is not None else '-'))
+    return mark_safe(''.join(parts))
@@ -0,0 +1,149 @@
+import bisect
+import os
+import re
+import threading
+
+BLOCK_SIZE = 64 * 1024
+INDEX_STEP = 1024 * 1024
+
+# Формат из settings.LOGGING: {levelname} {asctime} {module} {message}
+LOG_LINE_RE = re.compile(r'^(?P<level>[A-Z]+) (?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:,\d+)?) (?P<message>.*)$')
+
+def parse_log_line(line):
+    """Разобрать строку лога в словарь level/timestamp/message (None для строк продолжения)"""
+    match = LOG_LINE_RE.match(line.rstrip('\r\n'))
+    if not match:
+        return None
+    return match.groupdict()
+
+def read_lines_backwards(f, start=0, end=None, block_size=BLOCK_SIZE):
+    """Построчно читать бинарный файл от end к start блоками, не загружая его целиком"""
+    if end is None:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+
+    position = end
+    tail = b''
+    while position > start:
+        read_size = min(block_size, position - start)
+        position -= read_size
+        f.seek(position)
+        chunk = f.read(read_size) + tail
+        lines = chunk.split(b'\n')
+        # Первая строка блока может быть неполной: дочитаем ее со следующим блоком
+        tail = lines.pop(0)
+        for line in reversed(lines):
+            if line:
+                yield line.decode('utf-8', errors='replace')
+    if tail:
+        yield tail.decode('utf-8', errors='replace')
+
+class LogIndex:
+    """Разреженный индекс «время → смещение» с шагом INDEX_STEP байт.
+
+    Строится лениво и дополняется по мере роста файла; при ротации
+    (смена inode или уменьшение размера) строится заново.
+    """
+
+    def __init__(self, path, step=INDEX_STEP):
+        self.path = path
+        self.step = step
+        self.inode = None
+        self.size = 0
+        self.timestamps = []
+        self.offsets = []
+
+    def refresh(self):
+        stat = os.stat(self.path)
+        if stat.st_ino != self.inode or stat.st_size < self.size:
+            self.inode = stat.st_ino
+            self.size = 0
+            self.timestamps = []
+            self.offsets = []
+        if stat.st_size == self.size:
+            return
+
+        next_offset = self.offsets[-1] + self.step if self.offsets else 0
+        with open(self.path, 'rb') as f:
+            while next_offset < stat.st_size:
+                entry = self._first_entry_after(f, next_offset, stat.st_size)
+                if entry is None:
+                    break
+                timestamp, offset = entry
+                if not self.offsets or offset > self.offsets[-1]:
+                    self.timestamps.append(timestamp)
+                    self.offsets.append(offset)
+                next_offset = max(offset, next_offset) + self.step
+        self.size = stat.st_size
+
+    def _first_entry_after(self, f, offset, size):
+        f.seek(offset)
+        if offset:
+            f.readline()
+        while f.tell() < size:
+            line_offset = f.tell()
+            parsed = parse_log_line(f.readline().decode('utf-8', errors='replace'))
+            if parsed:
+                return parsed['timestamp'], line_offset
+        return None
+
+    def seek_range(self, date_from=None, date_to=None):
+        """Границы (start, end) участка файла, где могут быть записи за период"""
+        start, end = 0, None
+        if date_from:
+            # Последняя точка индекса строго раньше начала периода
+            position = bisect.bisect_left(self.timestamps, date_from.isoformat())
+            if position > 0:
+                start = self.offsets[position - 1]
+        if date_to:
+            # Первая точка индекса позже конца периода
+            position = bisect.bisect_right(self.timestamps, date_to.isoformat() + '~')
+            if position < len(self.offsets):
+                end = self.offsets[position]
+        return start, end
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_log_index(path):
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = LogIndex(path)
+        index.refresh()
+        return index
+
+def tail_log(path, limit=100, search_term=None, date_from=None, date_to=None):
+    """Последние limit записей лога (новые первыми) с фильтром по подстроке и датам.
+
+    Файл читается с конца блоками, поиск применяется до ограничения limit;
+    при фильтре по датам чтение начинается с нужного участка по индексу.
+    """
+    if not os.path.exists(path):
+        return []
+
+    start, end = 0, None
+    if date_from or date_to:
+        start, end = get_log_index(path).seek_range(date_from, date_to)
+
+    needle = search_term.lower() if search_term else None
+    from_key = date_from.isoformat() if date_from else None
+    to_key = date_to.isoformat() if date_to else None
+
+    logs = []
+    with open(path, 'rb') as f:
+        for line in read_lines_backwards(f, start, end):
+            parsed = parse_log_line(line)
+            if not parsed:
+                continue
+            day = parsed['timestamp'][:10]
+            if to_key and day > to_key:
+                continue
+            if from_key and day < from_key:
+                break
+            if needle and needle not in line.lower():
+                continue
+            logs.append(parsed)
+            if len(logs) >= limit:
+                break
+    return logs
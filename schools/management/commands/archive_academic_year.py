@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from schools.academic_years import archive_year
+from schools.models import AcademicYear, Grade
+
+class Command(BaseCommand):
+    help = 'Перенести оценки закрытого учебного года из таблицы оценок в архив (GradeArchive)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Название года, например 2025/2026')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать число оценок')
+
+    def handle(self, *args, **options):
+        try:
+            year = AcademicYear.objects.get(name=options['name'])
+        except AcademicYear.DoesNotExist:
+            raise CommandError(f"Учебный год {options['name']} не найден")
+        if year.is_active:
+            raise CommandError(f'Учебный год {year.name} активен; сначала откройте следующий (open_academic_year)')
+
+        total = Grade.objects.filter(academic_year=year).count()
+        if options['dry_run']:
+            self.stdout.write(f'Оценок к переносу: {total} (--dry-run)')
+            return
+
+        moved = archive_year(year, progress=lambda moved: self.stdout.write(f'  {moved}/{total}'))
+        self.stdout.write(self.style.SUCCESS(f'Учебный год {year.name}: в архив перенесено оценок: {moved}'))
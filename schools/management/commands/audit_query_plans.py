@@ -0,0 +1,98 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from schools.diagnostics import QueryRecorder, consume, iter_view_requests
+
+SCAN_RE = re.compile(r'^SCAN (?P<table>\S+)(?P<rest>.*)$')
+
+class Command(BaseCommand):
+    help = (
+        'Открыть все страницы приложения, выполнить EXPLAIN QUERY PLAN для их SELECT-запросов '
+        'и найти полные просмотры таблиц в запросах с условием WHERE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=0,
+                            help='Не отмечать просмотры таблиц, в которых меньше строк')
+        parser.add_argument('--fail', action='store_true',
+                            help='Завершиться с ошибкой, если найдены полные просмотры (для CI)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN поддерживается только для SQLite')
+
+        self.row_counts = {}
+        findings = []
+        # Ошибка одной страницы не прерывает проверку остальных: она вернет 500
+        client = Client(raise_request_exception=False)
+
+        # Все страницы открываются в транзакции, которая затем откатывается
+        with transaction.atomic():
+            for name, path, user, skip_reason in iter_view_requests():
+                if skip_reason:
+                    self.stdout.write(self.style.WARNING(f'{name}: пропущено ({skip_reason})'))
+                    continue
+
+                client.force_login(user)
+                recorder = QueryRecorder()
+                with recorder.record():
+                    response = consume(client.get(path))
+
+                view_findings = self.audit_queries(name, recorder.queries, options['min_rows'])
+                findings.extend(view_findings)
+                status = self.style.ERROR('SCAN') if view_findings else self.style.SUCCESS('ok')
+                self.stdout.write(f'{name} [{response.status_code}] запросов: {len(recorder.queries)} — {status}')
+                for finding in view_findings:
+                    self.stdout.write(f"    {finding['detail']} ({finding['rows']} строк)")
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"      {finding['sql']}")
+            transaction.set_rollback(True)
+
+        if findings:
+            message = f'Полных просмотров таблиц: {len(findings)}'
+            if options['fail']:
+                raise CommandError(message)
+            self.stdout.write(self.style.ERROR(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('Полных просмотров таблиц не найдено'))
+
+    def audit_queries(self, name, queries, min_rows):
+        findings = []
+        seen = set()
+        for query in queries:
+            sql = query['sql']
+            # Выборки без WHERE (полные списки) читают всю таблицу намеренно
+            if not sql.lstrip().upper().startswith('SELECT') or ' WHERE ' not in sql.upper():
+                continue
+            if query['many'] or sql in seen:
+                continue
+            seen.add(sql)
+
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', query['params'])
+                plan = cursor.fetchall()
+
+            for row in plan:
+                detail = row[-1]
+                match = SCAN_RE.match(detail)
+                # «SCAN t USING ... INDEX» — обход индекса, а не таблицы
+                if not match or ' INDEX' in match.group('rest'):
+                    continue
+                table = match.group('table')
+                rows = self.count_rows(table)
+                if rows < min_rows:
+                    continue
+                findings.append({'view': name, 'detail': detail, 'rows': rows, 'sql': sql})
+        return findings
+
+    def count_rows(self, table):
+        if table not in self.row_counts:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                    self.row_counts[table] = cursor.fetchone()[0]
+            except Exception:
+                # Подзапросы и CTE в плане не являются таблицами
+                self.row_counts[table] = 0
+        return self.row_counts[table]
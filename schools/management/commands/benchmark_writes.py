@@ -0,0 +1,51 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from schools.benchmarks import run_write_benchmark
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузка параллельными писателями на SQLite: пропускная способность, перцентили '
+        'и ошибки «database is locked» с очередью записи и без нее. Меняет оценки в БД'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Параллельных процессов-писателей')
+        parser.add_argument('--duration', type=float, default=10.0, help='Длительность прогона (секунды)')
+        parser.add_argument('--long-ratio', type=float, default=0.1, help='Доля сохранений журнала целого класса')
+        parser.add_argument('--mode', choices=['gate', 'nogate', 'both'], default='both',
+                            help='С очередью записи (WRITE_GATE), без нее или оба прогона')
+        parser.add_argument('--output', help='Записать отчет в JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            raise CommandError('Нужна файловая БД SQLite')
+        if options['writers'] < 1:
+            raise CommandError('--writers должен быть не меньше 1')
+
+        modes = {'gate': [True], 'nogate': [False], 'both': [False, True]}[options['mode']]
+        reports = []
+        for gate in modes:
+            try:
+                report = run_write_benchmark(
+                    writers=options['writers'], duration=options['duration'],
+                    long_ratio=options['long_ratio'], gate=gate,
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            reports.append(report)
+
+            self.stdout.write(
+                f"{'С очередью записи' if gate else 'Без очереди записи'}: {report['writers']} писателей, "
+                f"{report['ops_per_s']} операций/с, ошибок: {report['errors']}"
+            )
+            for kind, result in report['kinds'].items():
+                self.stdout.write(
+                    f"  {kind}: {result['ok']} успешно, ошибок {result['errors']}, "
+                    f"p50 {result['p50_ms']} мс, p95 {result['p95_ms']} мс, p99 {result['p99_ms']} мс"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(reports, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Отчет записан в {options['output']}"))
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from schools.synthetic import generate_district
+
+class Command(BaseCommand):
+    help = 'Создать синтетический район (отделы образования, школы, классы, учащиеся, назначения, оценки за год)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depts', type=int, default=1, help='Количество отделов образования')
+        parser.add_argument('--schools', type=int, default=5, help='Школ на отдел образования')
+        parser.add_argument('--classes', type=int, default=11, help='Классов в школе')
+        parser.add_argument('--students', type=int, default=25, help='Учащихся в классе')
+        parser.add_argument('--teachers', type=int, default=20, help='Учителей в школе')
+        parser.add_argument('--subjects', type=int, default=12, help='Предметов в каждом классе')
+        parser.add_argument('--split-subjects', type=int, default=2,
+                            help='Сколько предметов класса ведутся двумя подгруппами')
+        parser.add_argument('--grade-fill', type=float, default=1.0,
+                            help='Доля заполненных ячеек журнала (0..1)')
+        parser.add_argument('--prefix', default='bench', help='Префикс адресов создаваемых пользователей')
+        parser.add_argument('--password', default='password', help='Пароль создаваемых пользователей')
+        parser.add_argument('--seed', type=int, help='Зерно генератора случайных чисел для воспроизводимости')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            counts = generate_district(
+                depts=options['depts'],
+                schools_per_dept=options['schools'],
+                classes_per_school=options['classes'],
+                students_per_class=options['students'],
+                teachers_per_school=options['teachers'],
+                subjects=options['subjects'],
+                split_subjects=options['split_subjects'],
+                grade_fill=options['grade_fill'],
+                prefix=options['prefix'],
+                password=options['password'],
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Район создан за {time.monotonic() - started:.1f} с; вход: {options['prefix']}-dept1@district.test, "
+            f"{options['prefix']}-admin1-1@district.test, пароль {options['password']}"
+        ))
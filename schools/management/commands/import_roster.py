@@ -0,0 +1,44 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from schools.models import School, User
+from schools.roster_import import CHUNK_SIZE, import_roster, describe_import
+from schools.utils import log_action
+
+class Command(BaseCommand):
+    help = 'Импортировать список учащихся из CSV/XLSX (для районного файла — с колонкой «Школа»)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv или .xlsx')
+        parser.add_argument('--school', type=int, help='ID школы; без него школа берется из колонки «Школа»')
+        parser.add_argument('--actor', help='Email пользователя для записи в журнал аудита')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    
+    def handle(self, *args, **options):
+        school = None
+        schools = None
+        if options['school']:
+            school = School.objects.filter(id=options['school']).first()
+            if school is None:
+                raise CommandError(f"Школа {options['school']} не найдена")
+        else:
+            schools = School.objects.all()
+        
+        actor = None
+        if options['actor']:
+            actor = User.objects.filter(email=options['actor']).first()
+            if actor is None:
+                raise CommandError(f"Пользователь {options['actor']} не найден")
+        
+        try:
+            with open(options['path'], 'rb') as f:
+                result = import_roster(f, options['path'], school=school, schools=schools,
+                                       chunk_size=options['chunk_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+        except ValidationError as e:
+            raise CommandError(' '.join(e.messages))
+        
+        log_action(actor, 'create', 'Student', None, describe_import(options['path'], result))
+        for error in result['errors']:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(describe_import(options['path'], result)))
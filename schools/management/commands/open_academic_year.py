@@ -0,0 +1,36 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from schools.academic_years import get_active_year, open_year, year_bounds
+from schools.models import AcademicYear
+
+class Command(BaseCommand):
+    help = (
+        'Открыть новый учебный год: он становится активным, назначения учителей и составы групп '
+        'копируются из прежнего года, агрегаты оценок пересчитываются. Запускать после rollover_classes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help='Название года, например 2026/2027 (по умолчанию следующий за активным)')
+        parser.add_argument('--start', help='Дата начала (ГГГГ-ММ-ДД)')
+        parser.add_argument('--end', help='Дата окончания (ГГГГ-ММ-ДД)')
+        parser.add_argument('--no-copy-assignments', action='store_true', help='Не копировать назначения учителей')
+
+    def handle(self, *args, **options):
+        current = get_active_year()
+        name, start, end = year_bounds(current.end_date + datetime.timedelta(days=1))
+        name = options['name'] or name
+        if options['start']:
+            start = parse_date(options['start'])
+        if options['end']:
+            end = parse_date(options['end'])
+        if start is None or end is None or start >= end:
+            raise CommandError('Неверные даты начала и окончания года')
+        if AcademicYear.objects.filter(name=name).exists():
+            raise CommandError(f'Учебный год {name} уже существует')
+
+        year, copied = open_year(name, start, end, copy_assignments=not options['no_copy_assignments'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Учебный год {year.name} ({year.start_date} — {year.end_date}) открыт вместо {current.name}; "
+            f"скопировано назначений: {copied['assignments']}, записей в группах: {copied['memberships']}"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from schools.rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    help = 'Пересчитать агрегаты оценок (учащиеся, классы, школы) по таблице оценок'
+    
+    def handle(self, *args, **options):
+        counts = rebuild_rollups()
+        for model_name, created in counts.items():
+            self.stdout.write(f"{model_name}: {created}")
+        self.stdout.write(self.style.SUCCESS('Агрегаты оценок пересчитаны'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from schools.models import Student, Teacher
+from schools.search import SEARCH_FIELDS
+
+BATCH_SIZE = 2000
+
+class Command(BaseCommand):
+    help = 'Пересчитать нормализованные поля поиска ФИО учащихся и учителей'
+    
+    def handle(self, *args, **options):
+        for model in (Student, Teacher):
+            updated = 0
+            last_id = 0
+            while True:
+                # Обход по диапазонам id: запись в таблицу во время чтения курсора в SQLite небезопасна
+                batch = list(model.objects.filter(id__gt=last_id).order_by('id').only(
+                    'id', 'last_name', 'first_name', 'patronymic'
+                )[:BATCH_SIZE])
+                if not batch:
+                    break
+                for person in batch:
+                    person.update_search_fields()
+                model.objects.bulk_update(batch, SEARCH_FIELDS)
+                updated += len(batch)
+                last_id = batch[-1].id
+            self.stdout.write(f"{model.__name__}: {updated}")
+        self.stdout.write(self.style.SUCCESS('Поисковые поля обновлены'))
@@ -0,0 +1,36 @@
+import sqlite3
+import time
+from django.core.management.base import BaseCommand, CommandError
+from schools.analytics import get_analytics_settings, refresh_replica
+
+class Command(BaseCommand):
+    help = (
+        'Обновить аналитическую реплику снимком основной БД (backup API SQLite). '
+        'С --loop обновлять каждые REFRESH_INTERVAL секунд (или указанное число секунд)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', nargs='?', type=float, const=0, default=None,
+                            help='Обновлять по расписанию; интервал в секундах')
+
+    def handle(self, *args, **options):
+        interval = options['loop']
+        if interval is not None and interval <= 0:
+            interval = get_analytics_settings()['REFRESH_INTERVAL']
+
+        while True:
+            try:
+                result = refresh_replica()
+            except (ValueError, OSError, sqlite3.Error) as e:
+                if interval is None:
+                    raise CommandError(f'Не удалось обновить реплику: {e}')
+                # По расписанию сбой не останавливает цикл: после MAX_STALENESS чтения
+                # сами вернутся на основную БД
+                self.stderr.write(f'Не удалось обновить реплику: {e}')
+            else:
+                self.stdout.write(
+                    f"Реплика обновлена за {result['seconds']:.2f} с, размер {result['size'] / 1024 / 1024:.1f} МБ"
+                )
+            if interval is None:
+                return
+            time.sleep(interval)
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from schools.models import School
+from schools.rollover import execute_rollover, plan_rollover
+
+class Command(BaseCommand):
+    help = (
+        'Перевести классы на следующий учебный год: «5А» → «6А», выпускные классы — в архив, '
+        'новые первые классы. С --dry-run только показывает план'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, action='append', dest='schools', help='ID школы (можно несколько)')
+        parser.add_argument('--dept', help='Email отдела образования: все его школы')
+        parser.add_argument('--all', action='store_true', help='Все школы')
+        parser.add_argument('--year', type=int, help='Год выпуска для архивных названий (по умолчанию текущий)')
+        parser.add_argument('--no-first-classes', action='store_true', help='Не создавать новые первые классы')
+        parser.add_argument('--dry-run', action='store_true', help='Показать план без изменений')
+
+    def handle(self, *args, **options):
+        schools = School.objects.order_by('id')
+        if options['schools']:
+            schools = schools.filter(id__in=options['schools'])
+        elif options['dept']:
+            schools = schools.filter(education_dept__email=options['dept'])
+        elif not options['all']:
+            raise CommandError('Укажите --school, --dept или --all')
+        if not schools.exists():
+            raise CommandError('Школы не найдены')
+
+        plans = plan_rollover(schools, year=options['year'], first_classes=not options['no_first_classes'])
+        for plan in plans:
+            self.write_plan(plan, verbose=options['dry_run'] or options['verbosity'] > 1)
+
+        failed = [plan for plan in plans if plan.errors]
+        if options['dry_run']:
+            self.stdout.write(f'Без изменений (--dry-run): {len(plans) - len(failed)} школ готовы к переводу')
+            return
+        if failed:
+            raise CommandError(f'Перевод не выполнен: ошибки в плане {len(failed)} школ')
+
+        totals = execute_rollover(plans)
+        self.stdout.write(self.style.SUCCESS(
+            f"Переведено школ: {totals['schools']}, классов: {totals['promoted']}, в архив: {totals['graduated']}, "
+            f"создано первых классов: {totals['first_classes']}. Назначения нового года скопирует open_academic_year"
+        ))
+        # Школы, которые за это время перевел параллельный запуск
+        failed = [plan for plan in plans if plan.errors]
+        for plan in failed:
+            self.stdout.write(self.style.ERROR(f"{plan.school.name}: {'; '.join(plan.errors)}"))
+        if failed:
+            raise CommandError(f'Не переведено школ: {len(failed)}')
+
+    def write_plan(self, plan, verbose):
+        self.stdout.write(
+            f'{plan.school.name}: {len(plan.promoted)} классов переходят, {len(plan.graduated)} выпускаются, '
+            f'{len(plan.first_classes)} новых первых, учащихся: {plan.student_count}'
+        )
+        if verbose:
+            for _, old, new, students in plan.promoted:
+                self.stdout.write(f'  {old} → {new} ({students} уч.)')
+            for _, old, new, students in plan.graduated:
+                self.stdout.write(f'  {old} → архив «{new}» ({students} уч.)')
+            for name in plan.first_classes:
+                self.stdout.write(f'  новый класс {name}')
+        for name, reason in plan.skipped:
+            self.stdout.write(self.style.WARNING(f'  {name}: пропущен ({reason})'))
+        for error in plan.errors:
+            self.stdout.write(self.style.ERROR(f'  {error}'))
@@ -0,0 +1,54 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from schools.benchmarks import compare_reports, run_benchmarks
+
+class Command(BaseCommand):
+    help = (
+        'Открыть все страницы приложения пользователями нужных ролей и записать перцентили '
+        'времени ответа и число SQL-запросов в JSON-отчет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10, help='Прогонов каждой страницы')
+        parser.add_argument('--warmup', type=int, default=1, help='Прогревочных прогонов (не учитываются)')
+        parser.add_argument('--view', action='append', dest='views', help='Только указанные имена URL')
+        parser.add_argument('--output', help='Файл отчета (по умолчанию benchmark-<дата>.json)')
+        parser.add_argument('--compare', help='Прошлый отчет для сравнения')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть не меньше 1')
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Не удалось прочитать {options['compare']}: {e}")
+
+        def progress(name, result):
+            self.stdout.write(
+                f"{name} [{result['status']}] p50 {result['p50_ms']} мс, p95 {result['p95_ms']} мс, "
+                f"p99 {result['p99_ms']} мс, запросов: {result['queries']}"
+            )
+
+        report = run_benchmarks(
+            repeat=options['repeat'], warmup=options['warmup'], names=options['views'], progress=progress,
+        )
+        for name, reason in report['skipped'].items():
+            self.stdout.write(self.style.WARNING(f'{name}: пропущено ({reason})'))
+
+        output = options['output'] or f"benchmark-{timezone.localtime():%Y%m%d-%H%M%S}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Отчет записан в {output}'))
+
+        if baseline is not None:
+            self.stdout.write(f"Сравнение с {options['compare']} (коммит {baseline.get('commit')}):")
+            for name, old, new in compare_reports(baseline, report):
+                self.stdout.write(
+                    f"{name}: p50 {old['p50_ms']} → {new['p50_ms']} мс, "
+                    f"запросов {old['queries']} → {new['queries']}"
+                )
@@ -0,0 +1,104 @@
+from collections import defaultdict
+from django.db import transaction
+from .models import ClassSubjectGroup, Student, StudentSubjectGroup
+
+BULK_BATCH_SIZE = 1000
+
+def set_group_members(desired):
+    """Привести состав групп к заданному, записывая только разницу.
+
+    desired: {subject_group_id: iterable student_id}. Текущий состав этих групп
+    читается одним запросом, лишние записи удаляются одним DELETE, недостающие
+    добавляются одним bulk_create. Возвращает счетчики added/removed.
+    """
+    wanted = {
+        (group_id, student_id)
+        for group_id, student_ids in desired.items()
+        for student_id in student_ids
+    }
+
+    with transaction.atomic():
+        current = {
+            (group_id, student_id): membership_id
+            for membership_id, group_id, student_id in StudentSubjectGroup.objects.filter(
+                subject_group_id__in=list(desired)
+            ).values_list('id', 'subject_group_id', 'student_id')
+        }
+        to_remove = [membership_id for key, membership_id in current.items() if key not in wanted]
+        to_add = [
+            StudentSubjectGroup(subject_group_id=group_id, student_id=student_id)
+            for group_id, student_id in wanted if (group_id, student_id) not in current
+        ]
+
+        if to_remove:
+            StudentSubjectGroup.objects.filter(id__in=to_remove).delete()
+        if to_add:
+            StudentSubjectGroup.objects.bulk_create(to_add, batch_size=BULK_BATCH_SIZE)
+
+    return {'added': len(to_add), 'removed': len(to_remove)}
+
+def single_groups_by_class(class_ids, subject_ids=None, year=None):
+    """Группы предметов, которые ведутся в классе одной группой: {class_group_id: [group_id, ...]}"""
+    assignments = ClassSubjectGroup.objects.for_year(year).filter(class_group_id__in=class_ids)
+    if subject_ids is not None:
+        assignments = assignments.filter(subject_id__in=subject_ids)
+    
+    groups = defaultdict(lambda: defaultdict(list))
+    for group_id, class_id, subject_id in assignments.values_list('id', 'class_group_id', 'subject_id'):
+        groups[class_id][subject_id].append(group_id)
+
+    return {
+        class_id: [group_ids[0] for group_ids in subjects.values() if len(group_ids) == 1]
+        for class_id, subjects in groups.items()
+    }
+
+def single_group_members(class_ids, year=None):
+    """{group_id: [student_id, ...]} — полный состав классов для групп, которые ведутся всем классом"""
+    groups = single_groups_by_class(list(class_ids), year=year)
+    students = defaultdict(list)
+    for student_id, class_id in Student.objects.filter(class_group_id__in=list(groups)).values_list('id', 'class_group_id'):
+        students[class_id].append(student_id)
+    return {
+        group_id: students[class_id]
+        for class_id, group_ids in groups.items()
+        for group_id in group_ids
+    }
+
+def enroll_in_single_groups(students):
+    """Записать новых учащихся во все предметы их класса, которые ведутся одной группой.
+
+    Один запрос на группы классов и один INSERT на всех учащихся; в группы
+    предметов с несколькими подгруппами учащиеся распределяются отдельно.
+    """
+    students = [student for student in students if student.pk]
+    if not students:
+        return 0
+
+    groups = single_groups_by_class({student.class_group_id for student in students})
+    memberships = [
+        StudentSubjectGroup(subject_group_id=group_id, student_id=student.pk)
+        for student in students
+        for group_id in groups.get(student.class_group_id, ())
+    ]
+    StudentSubjectGroup.objects.bulk_create(memberships, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    return len(memberships)
+
+def fill_single_groups(class_ids, subject_ids=None):
+    """Записать всех учащихся классов в их предметы, которые ведутся одной группой.
+
+    Используется при назначении учителя: один запрос на группы, один на
+    учащихся и один INSERT; уже записанные учащиеся пропускаются.
+    """
+    groups = single_groups_by_class(class_ids, subject_ids)
+    if not groups:
+        return 0
+
+    memberships = [
+        StudentSubjectGroup(subject_group_id=group_id, student_id=student_id)
+        for student_id, class_id in Student.objects.filter(
+            class_group_id__in=list(groups)
+        ).values_list('id', 'class_group_id')
+        for group_id in groups[class_id]
+    ]
+    StudentSubjectGroup.objects.bulk_create(memberships, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    return len(memberships)
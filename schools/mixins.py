@@ -1,6 +1,6 @@
 from django.contrib.auth.mixins import AccessMixin
 from django.core.exceptions import PermissionDenied
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from .models import School, ClassGroup, Student, Teacher, Subject, ClassSubjectGroup
 
 class SuperuserRequiredMixin(AccessMixin):
@@ -27,98 +27,73 @@ class SchoolAdminRequiredMixin(AccessMixin):
             return self.handle_no_permission()
         return super().dispatch(request, *args, **kwargs)
 
-class SchoolOwnerRequiredMixin(AccessMixin):
-    """Проверка, что пользователь является администратором нужной школы"""
+class ScopedObjectMixin(AccessMixin):
+    """Загрузка защищаемого объекта одним запросом через visible_to(user)
     
-    def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated or request.user.role != 'school_admin':
-            return self.handle_no_permission()
-        
-        school_id = self.kwargs.get('school_id')
-        if school_id:
-            school = get_object_or_404(School, id=school_id)
-            if not self._is_school_owner(request.user, school):
-                raise PermissionDenied("Вы не являетесь администратором этой школы")
-        
-        return super().dispatch(request, *args, **kwargs)
-    
-    def _is_school_owner(self, user, school):
-        """Проверка, что пользователь администрирует данную школу"""
-        if user.role == 'school_admin':
-            try:
-                return user.school == school
-            except AttributeError:
-                return False
-        return user.is_superuser or user.role == 'education_dept'
-
-class ClassOwnerRequiredMixin(AccessMixin):
-    """Проверка доступа к классу (только для администратора школы)"""
+    Проверка доступа выполняется в WHERE, объект загружается с нужными
+    select_related и сохраняется в self.scoped_object; get_object() DetailView,
+    UpdateView и DeleteView возвращает его без повторного запроса.
+    """
+    scoped_model = None
+    scoped_url_kwarg = None
+    scoped_select_related = ()
+    scoped_denied_message = "У вас нет доступа к этому объекту"
     
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return self.handle_no_permission()
         
-        class_id = self.kwargs.get('class_id')
-        if class_id:
-            class_group = get_object_or_404(ClassGroup, id=class_id)
-            if not self._can_access_class(request.user, class_group):
-                raise PermissionDenied("У вас нет доступа к этому классу")
+        object_id = self.kwargs.get(self.scoped_url_kwarg)
+        if object_id:
+            self.scoped_object = self.get_scoped_object(object_id)
         
         return super().dispatch(request, *args, **kwargs)
     
-    def _can_access_class(self, user, class_group):
-        """Проверка доступа к классу"""
-        if user.role == 'school_admin':
-            try:
-                return user.owned_school == class_group.school
-            except AttributeError:
-                return False
-        return user.is_superuser or user.role == 'education_dept'
+    def get_scoped_object(self, object_id):
+        queryset = self.scoped_model.objects.select_related(*self.scoped_select_related)
+        obj = queryset.visible_to(self.request.user).filter(pk=object_id).first()
+        if obj is None:
+            # Второй запрос только на пути отказа: 403 для чужого объекта, 404 для несуществующего
+            if self.scoped_model.objects.filter(pk=object_id).exists():
+                raise PermissionDenied(self.scoped_denied_message)
+            raise Http404
+        return obj
+    
+    def get_object(self, queryset=None):
+        if queryset is None and hasattr(self, 'scoped_object'):
+            return self.scoped_object
+        return super().get_object(queryset)
+
+class SchoolOwnerRequiredMixin(ScopedObjectMixin):
+    """Проверка доступа к школе: своя школа администратора, школы своего отдела образования"""
+    scoped_model = School
+    scoped_url_kwarg = 'school_id'
+    scoped_denied_message = "У вас нет доступа к этой школе"
+
+class ClassOwnerRequiredMixin(ScopedObjectMixin):
+    """Проверка доступа к классу"""
+    scoped_model = ClassGroup
+    scoped_url_kwarg = 'class_id'
+    scoped_select_related = ('school',)
+    scoped_denied_message = "У вас нет доступа к этому классу"
 
-class StudentOwnerRequiredMixin(AccessMixin):
+class StudentOwnerRequiredMixin(ScopedObjectMixin):
     """Проверка доступа к учащемуся"""
-    
-    def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return self.handle_no_permission()
-        
-        student_id = self.kwargs.get('student_id')
-        if student_id:
-            student = get_object_or_404(Student, id=student_id)
-            if not self._can_access_student(request.user, student):
-                raise PermissionDenied("У вас нет доступа к этому учащемуся")
-        
-        return super().dispatch(request, *args, **kwargs)
-    
-    def _can_access_student(self, user, student):
-        """Проверка доступа к учащемуся"""
-        if user.role == 'school_admin':
-            try:
-                return user.owned_school == student.class_group.school
-            except AttributeError:
-                return False
-        return user.is_superuser or user.role == 'education_dept'
+    scoped_model = Student
+    scoped_url_kwarg = 'student_id'
+    scoped_select_related = ('class_group__school',)
+    scoped_denied_message = "У вас нет доступа к этому учащемуся"
 
-class TeacherOwnerRequiredMixin(AccessMixin):
+class TeacherOwnerRequiredMixin(ScopedObjectMixin):
     """Проверка доступа к учителю"""
-    
-    def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_authenticated:
-            return self.handle_no_permission()
-        
-        teacher_id = self.kwargs.get('teacher_id')
-        if teacher_id:
-            teacher = get_object_or_404(Teacher, id=teacher_id)
-            if not self._can_access_teacher(request.user, teacher):
-                raise PermissionDenied("У вас нет доступа к этому учителю")
-        
-        return super().dispatch(request, *args, **kwargs)
-    
-    def _can_access_teacher(self, user, teacher):
-        """Проверка доступа к учителю"""
-        if user.role == 'school_admin':
-            try:
-                return user.owned_school == teacher.school
-            except AttributeError:
-                return False
-        return user.is_superuser or user.role == 'education_dept'
\ No newline at end of file
+    scoped_model = Teacher
+    scoped_url_kwarg = 'teacher_id'
+    scoped_select_related = ('school',)
+    scoped_denied_message = "У вас нет доступа к этому учителю"
+
+class AssignmentOwnerRequiredMixin(ScopedObjectMixin):
+    """Проверка доступа к назначению предмета"""
+    scoped_model = ClassSubjectGroup
+    scoped_url_kwarg = 'assignment_id'
+    scoped_select_related = ('class_group', 'subject', 'teacher')
+    scoped_denied_message = "У вас нет доступа к этому назначению"
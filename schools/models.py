@@ -1,10 +1,12 @@
 import os
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db.models import Q, Avg
+from django.db.models import Q, Avg, Sum
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import logging
+from .search import NAME_FIELDS, SEARCH_FIELDS, normalize_search_text
 
 logger = logging.getLogger('schools')
 
@@ -63,6 +65,10 @@ class User(AbstractUser):
     
     objects = UserManager()
     
+    class Meta(AbstractUser.Meta):
+        # Ключ keyset-пагинации списков пользователей
+        indexes = [models.Index(fields=['last_name', 'id'])]
+    
     def __str__(self):
         return f"{self.get_full_name()} ({self.email})"
     
@@ -78,6 +84,63 @@ class User(AbstractUser):
             initials += self.patronymic[0] + '.'
         return f"{self.last_name} {initials}".strip()
 
+class SchoolScopedQuerySet(models.QuerySet):
+    """Выборка с ограничением доступа по школе прямо в WHERE запроса"""
+    school_field = 'school'
+    
+    def visible_to(self, user):
+        """Объекты, доступные пользователю: все — суперпользователю, школ отдела —
+        отделу образования, только своей школы — администратору школы"""
+        if not user.is_authenticated:
+            return self.none()
+        if user.role == 'school_admin':
+            if user.school_id is None:
+                return self.none()
+            return self.filter(**{self.school_field: user.school_id})
+        if user.role == 'education_dept':
+            return self.filter(**{self.school_lookup('education_dept'): user.pk})
+        if user.is_superuser:
+            return self
+        return self.none()
+
+    def school_lookup(self, field):
+        """Путь к полю школы: 'education_dept' или 'school__education_dept'"""
+        return field if self.school_field == 'pk' else f'{self.school_field}__{field}'
+
+class SchoolQuerySet(SchoolScopedQuerySet):
+    school_field = 'pk'
+
+class ClassGroupQuerySet(SchoolScopedQuerySet):
+    school_field = 'school'
+
+    def active(self):
+        """Классы текущего года без выпущенных в архив (см. rollover.py)"""
+        return self.filter(is_archived=False)
+
+class StudentQuerySet(SchoolScopedQuerySet):
+    school_field = 'class_group__school'
+
+class TeacherQuerySet(SchoolScopedQuerySet):
+    school_field = 'school'
+
+class YearScopedQuerySet(models.QuerySet):
+    def for_year(self, year=None):
+        """Строки учебного года (по умолчанию активного)"""
+        if year is None:
+            from .academic_years import get_active_year_id
+            year = get_active_year_id()
+        return self.filter(academic_year=year)
+
+class GradeQuerySet(YearScopedQuerySet):
+    def delete(self):
+        """Удалить оценки, вычтя их из агрегатов одним пакетом (rollups.py)"""
+        from .rollups import grades_subtracted
+        with grades_subtracted(self):
+            return super().delete()
+
+class ClassSubjectGroupQuerySet(SchoolScopedQuerySet, YearScopedQuerySet):
+    school_field = 'class_group__school'
+
 class School(models.Model):
     GRADUATION_CLASS_CHOICES = [
         (4, '4 класс'),
@@ -97,6 +160,10 @@ class School(models.Model):
         related_name='schools'
     )
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
+    # Год последнего перевода классов (rollover.py): повторный перевод за тот же год запрещен
+    last_rollover_year = models.PositiveIntegerField(_('год последнего перевода классов'), null=True, blank=True)
+    
+    objects = SchoolQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('школа')
@@ -114,25 +181,45 @@ class School(models.Model):
         student_count = students.count()
         teacher_count = teachers.count()
         
-        average_grade = Grade.objects.filter(
-            student__in=students,
-            quarter__in=['q1', 'q2', 'q3', 'q4']
-        ).aggregate(avg=Avg('grade'))['avg'] or 0
+        average_grade = self.grade_aggregates.filter(quarter__in=Grade.TERM_QUARTERS).average()
         
         return {
             'class_count': class_count,
             'student_count': student_count,
             'teacher_count': teacher_count,
-            'average_grade': round(average_grade, 2) if average_grade else 0
+            'average_grade': average_grade or 0
         }
 
-class Teacher(models.Model):
+class SearchableNameModel(models.Model):
+    """Нормализованные копии ФИО с индексами для поиска по префиксу (см. search.py)"""
+    search_last_name = models.CharField(max_length=150, blank=True, editable=False, db_index=True)
+    search_first_name = models.CharField(max_length=150, blank=True, editable=False, db_index=True)
+    search_patronymic = models.CharField(max_length=150, blank=True, editable=False, db_index=True)
+    
+    class Meta:
+        abstract = True
+    
+    def update_search_fields(self):
+        """Пересчитать поля поиска; вызывать перед bulk_create/bulk_update"""
+        for name_field, search_field in zip(NAME_FIELDS, SEARCH_FIELDS):
+            setattr(self, search_field, normalize_search_text(getattr(self, name_field)))
+    
+    def save(self, *args, **kwargs):
+        self.update_search_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(NAME_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | set(SEARCH_FIELDS)
+        super().save(*args, **kwargs)
+
+class Teacher(SearchableNameModel):
     school = models.ForeignKey(School, on_delete=models.CASCADE, verbose_name=_('школа'), related_name='teachers')
     first_name = models.CharField(_('имя'), max_length=150)
     last_name = models.CharField(_('фамилия'), max_length=150)
     patronymic = models.CharField(_('отчество'), max_length=150, blank=True)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
     
+    objects = TeacherQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('учитель')
         verbose_name_plural = _('учителя')
@@ -141,6 +228,9 @@ class Teacher(models.Model):
         parts = [self.last_name, self.first_name, self.patronymic]
         return ' '.join(filter(None, parts))
     
+    def get_full_name(self):
+        return str(self)
+    
     def get_initials(self):
         initials = ''
         if self.first_name:
@@ -163,8 +253,12 @@ class Subject(models.Model):
 class ClassGroup(models.Model):
     name = models.CharField(_('название класса'), max_length=50)
     school = models.ForeignKey(School, on_delete=models.CASCADE, verbose_name=_('школа'), related_name='classes')
+    # Выпущенный класс: остается ради истории оценок, но не показывается в списках
+    is_archived = models.BooleanField(_('в архиве'), default=False)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
     
+    objects = ClassGroupQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('класс')
         verbose_name_plural = _('классы')
@@ -174,32 +268,33 @@ class ClassGroup(models.Model):
         return f"{self.name} ({self.school.name})"
     
     def get_average_grade(self):
-        students = self.students.all()
-        if not students:
-            return 0
-        
-        average = Grade.objects.filter(
-            student__in=students,
-            quarter__in=['q1', 'q2', 'q3', 'q4']
-        ).aggregate(avg=Avg('grade'))['avg']
-        
-        return round(average, 2) if average else 0
+        average = self.grade_aggregates.filter(quarter__in=Grade.TERM_QUARTERS).average()
+        return average or 0
 
-class Student(models.Model):
+class Student(SearchableNameModel):
     class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE, verbose_name=_('класс'), related_name='students')
     first_name = models.CharField(_('имя'), max_length=150)
     last_name = models.CharField(_('фамилия'), max_length=150)
     patronymic = models.CharField(_('отчество'), max_length=150, blank=True)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
     
+    objects = StudentQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('учащийся')
         verbose_name_plural = _('учащиеся')
+        indexes = [
+            # Список класса в порядке журнала
+            models.Index(fields=['class_group', 'last_name', 'first_name']),
+        ]
         
     def __str__(self):
         parts = [self.last_name, self.first_name, self.patronymic]
         return ' '.join(filter(None, parts))
     
+    def get_full_name(self):
+        return str(self)
+    
     def get_initials(self):
         initials = ''
         if self.first_name:
@@ -209,9 +304,7 @@ class Student(models.Model):
         return f"{self.last_name} {initials}".strip()
     
     def get_average_by_quarter(self, quarter):
-        grades = Grade.objects.filter(student=self, quarter=quarter).exclude(grade__isnull=True)
-        avg = grades.aggregate(avg=Avg('grade'))['avg']
-        return round(avg, 2) if avg else None
+        return self.grade_aggregates.filter(quarter=quarter).average()
     
     def get_year_average(self):
         return self.get_average_by_quarter('year')
@@ -219,12 +312,44 @@ class Student(models.Model):
     def get_final_average(self):
         return self.get_average_by_quarter('final')
 
+class AcademicYear(models.Model):
+    """Учебный год. Оценки и назначения предметов относятся к году; по умолчанию
+    везде используется активный год (academic_years.get_active_year_id)"""
+    name = models.CharField(_('учебный год'), max_length=20, unique=True)
+    start_date = models.DateField(_('начало'))
+    end_date = models.DateField(_('окончание'))
+    is_active = models.BooleanField(_('текущий'), default=False)
+    # Оценки года перенесены в GradeArchive (academic_years.archive_year)
+    is_archived = models.BooleanField(_('в архиве'), default=False)
+    created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('учебный год')
+        verbose_name_plural = _('учебные годы')
+        ordering = ['-start_date']
+        constraints = [
+            models.UniqueConstraint(fields=['is_active'], condition=models.Q(is_active=True),
+                                    name='single_active_academic_year'),
+        ]
+        
+    def __str__(self):
+        return self.name
+
+def current_academic_year_id():
+    """Значение по умолчанию для оценок и назначений — активный учебный год"""
+    from .academic_years import get_active_year_id
+    return get_active_year_id()
+
 class ClassSubjectGroup(models.Model):
     LEVEL_CHOICES = [
         ('basic', 'Базовый'),
         ('advanced', 'Повышенный'),
     ]
     
+    academic_year = models.ForeignKey(
+        AcademicYear, on_delete=models.PROTECT, default=current_academic_year_id,
+        verbose_name=_('учебный год'), related_name='subject_groups'
+    )
     class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE, verbose_name=_('класс'), related_name='subject_groups')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, verbose_name=_('предмет'), related_name='class_groups')
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE, verbose_name=_('учитель'), related_name='subject_groups')
@@ -232,10 +357,12 @@ class ClassSubjectGroup(models.Model):
     group_number = models.IntegerField(_('номер группы'), default=1)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
     
+    objects = ClassSubjectGroupQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('назначение предмета')
         verbose_name_plural = _('назначения предметов')
-        unique_together = ['class_group', 'subject', 'teacher', 'group_number']
+        unique_together = ['academic_year', 'class_group', 'subject', 'teacher', 'group_number']
         
     def __str__(self):
         return f"{self.class_group} - {self.subject} - {self.teacher} (Группа {self.group_number})"
@@ -263,7 +390,12 @@ class Grade(models.Model):
         ('year', 'Годовая'),
         ('final', 'Итоговая'),
     ]
+    TERM_QUARTERS = ['q1', 'q2', 'q3', 'q4']
     
+    academic_year = models.ForeignKey(
+        AcademicYear, on_delete=models.PROTECT, default=current_academic_year_id,
+        verbose_name=_('учебный год'), related_name='grades'
+    )
     student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name=_('учащийся'), related_name='grades')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, verbose_name=_('предмет'), related_name='grades')
     quarter = models.CharField(_('четверть'), max_length=20, choices=QUARTER_CHOICES)
@@ -274,10 +406,19 @@ class Grade(models.Model):
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
     updated_at = models.DateTimeField(_('дата обновления'), auto_now=True)
     
+    objects = GradeQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _('оценка')
         verbose_name_plural = _('оценки')
-        unique_together = ['student', 'subject', 'quarter']
+        # Индексы начинаются с года: запросы активного года не читают историю
+        unique_together = [
+            ['academic_year', 'student', 'subject', 'quarter'],
+            # Средние по четвертям: student__in + quarter__in + grade__isnull без обращения к таблице.
+            # Уникальность следует из ключа выше; индекс объявлен здесь, а не в indexes:
+            # makemigrations в Django 4.2 ставит AddIndex раньше AddField(academic_year)
+            ['academic_year', 'student', 'quarter', 'subject', 'grade'],
+        ]
         
     def __str__(self):
         quarter_display = dict(self.QUARTER_CHOICES).get(self.quarter, self.quarter)
@@ -287,6 +428,86 @@ class Grade(models.Model):
         if self.grade is not None and (self.grade < 1 or self.grade > 10):
             raise ValidationError(_('Оценка должна быть от 1 до 10'))
 
+    def delete(self, *args, **kwargs):
+        from .rollups import grades_subtracted
+        with grades_subtracted(Grade.objects.filter(pk=self.pk)):
+            return super().delete(*args, **kwargs)
+
+class GradeArchive(models.Model):
+    """Оценки закрытых учебных лет (academic_years.archive_year).
+
+    Таблица только дополняется и читается для истории: Grade и его индексы
+    остаются размером в открытые годы.
+    """
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.PROTECT, verbose_name=_('учебный год'), related_name='archived_grades')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name=_('учащийся'), related_name='archived_grades')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, verbose_name=_('предмет'), related_name='archived_grades')
+    quarter = models.CharField(_('четверть'), max_length=20, choices=Grade.QUARTER_CHOICES)
+    grade = models.IntegerField(_('оценка'), null=True, blank=True)
+    # Даты исходной оценки, а не переноса в архив
+    created_at = models.DateTimeField(_('дата создания'))
+    updated_at = models.DateTimeField(_('дата обновления'))
+    archived_at = models.DateTimeField(_('дата переноса'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('архивная оценка')
+        verbose_name_plural = _('архивные оценки')
+        indexes = [
+            models.Index(fields=['academic_year', 'student']),
+        ]
+        
+    def __str__(self):
+        return f"{self.student} - {self.subject} - {self.academic_year}: {self.grade}"
+
+class GradeAggregateQuerySet(models.QuerySet):
+    def average(self):
+        """Средний балл по выбранным строкам агрегатов (None, если оценок нет)"""
+        totals = self.aggregate(grade_sum=Sum('grade_sum'), grade_count=Sum('grade_count'))
+        if not totals['grade_count']:
+            return None
+        return round(totals['grade_sum'] / totals['grade_count'], 2)
+
+class GradeAggregate(models.Model):
+    """Сумма и количество оценок за четверть, поддерживаются инкрементально (см. rollups.py)"""
+    quarter = models.CharField(_('четверть'), max_length=20, choices=Grade.QUARTER_CHOICES)
+    grade_sum = models.IntegerField(_('сумма оценок'), default=0)
+    grade_count = models.IntegerField(_('количество оценок'), default=0)
+    
+    objects = GradeAggregateQuerySet.as_manager()
+    
+    class Meta:
+        abstract = True
+    
+    @property
+    def average(self):
+        if not self.grade_count:
+            return None
+        return round(self.grade_sum / self.grade_count, 2)
+
+class StudentGradeAggregate(GradeAggregate):
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name=_('учащийся'), related_name='grade_aggregates')
+    
+    class Meta:
+        verbose_name = _('агрегат оценок учащегося')
+        verbose_name_plural = _('агрегаты оценок учащихся')
+        unique_together = ['student', 'quarter']
+
+class ClassGradeAggregate(GradeAggregate):
+    class_group = models.ForeignKey(ClassGroup, on_delete=models.CASCADE, verbose_name=_('класс'), related_name='grade_aggregates')
+    
+    class Meta:
+        verbose_name = _('агрегат оценок класса')
+        verbose_name_plural = _('агрегаты оценок классов')
+        unique_together = ['class_group', 'quarter']
+
+class SchoolGradeAggregate(GradeAggregate):
+    school = models.ForeignKey(School, on_delete=models.CASCADE, verbose_name=_('школа'), related_name='grade_aggregates')
+    
+    class Meta:
+        verbose_name = _('агрегат оценок школы')
+        verbose_name_plural = _('агрегаты оценок школ')
+        unique_together = ['school', 'quarter']
+
 class AuditLog(models.Model):
     ACTION_CHOICES = [
         ('create', 'Создание'),
@@ -303,12 +524,18 @@ class AuditLog(models.Model):
     object_id = models.CharField(_('ID объекта'), max_length=255, blank=True)
     details = models.TextField(_('детали'), blank=True)
     ip_address = models.GenericIPAddressField(_('IP адрес'), null=True, blank=True)
-    created_at = models.DateTimeField(_('дата и время'), auto_now_add=True)
+    # Не auto_now_add: фоновый писатель сохраняет время действия, а не время записи пакета
+    created_at = models.DateTimeField(_('дата и время'), default=timezone.now, editable=False)
     
     class Meta:
         verbose_name = _('лог действия')
         verbose_name_plural = _('логи действий')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['action', 'created_at']),
+            models.Index(fields=['model_name', 'created_at']),
+        ]
         
     def __str__(self):
         return f"{self.actor} - {self.get_action_display()} - {self.model_name} ({self.created_at})"
\ No newline at end of file
@@ -0,0 +1,169 @@
+import base64
+import binascii
+import datetime
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse
+
+class KeysetPage:
+    """Страница keyset-пагинации: объекты и курсоры соседних страниц"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+class KeysetPaginator:
+    """Пагинация по индексированным колонкам вместо OFFSET.
+
+    ordering — уникальная комбинация полей, например ('last_name', 'id') или
+    ('-created_at', '-id'). Страница N стоит столько же, сколько первая:
+    выборка начинается с WHERE (ключ) > (последний ключ предыдущей страницы).
+    Курсор также хранит фильтры списка, чтобы переход по нему их сохранял.
+    """
+
+    def __init__(self, queryset, ordering, per_page=50):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def page(self, cursor=None, filters=None):
+        """Страница для декодированного курсора (см. decode_cursor); None — первая страница"""
+        filters = filters or {}
+        position = cursor.get('position') if cursor else None
+        backwards = bool(cursor and cursor.get('backwards'))
+
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, self._to_python(position)))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows)
+
+        first_key = self._key(rows[0])
+        last_key = self._key(rows[-1])
+        if backwards:
+            next_cursor = encode_cursor(last_key, filters)
+            previous_cursor = encode_cursor(first_key, filters, backwards=True) if has_more else None
+        else:
+            next_cursor = encode_cursor(last_key, filters) if has_more else None
+            previous_cursor = encode_cursor(first_key, filters, backwards=True) if position is not None else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _to_python(self, position):
+        model = self.queryset.model
+        return [model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, position)]
+
+    def _after(self, ordering, values):
+        """(a, b, c) > (x, y, z) с учетом направления каждого поля, в виде OR из AND"""
+        condition = Q()
+        for index, name in enumerate(ordering):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[index]})
+            for prev_index in range(index):
+                step &= Q(**{ordering[prev_index].lstrip('-'): values[prev_index]})
+            condition |= step
+        return condition
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder без усечения времени до миллисекунд: ключ курсора
+    сравнивается с микросекундами в БД, иначе строки одной миллисекунды
+    пропускаются или повторяются"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+def encode_cursor(position, filters=None, backwards=False):
+    payload = {'position': position, 'filters': filters or {}}
+    if backwards:
+        payload['backwards'] = True
+    raw = json.dumps(payload, cls=CursorJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Декодировать курсор; для поврежденного курсора возвращает None (первая страница)"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get('position'), list):
+        return None
+    if not isinstance(payload.get('filters'), dict):
+        payload['filters'] = {}
+    return payload
+
+class KeysetPaginationMixin:
+    """Keyset-пагинация для ListView с сохранением фильтров в курсоре и JSON-режимом (?format=json)"""
+    paginate_by = 50
+    keyset_ordering = ('id',)
+    keyset_filter_params = ()
+    json_fields = ('id',)
+
+    def get_cursor(self):
+        if not hasattr(self, '_cursor'):
+            self._cursor = decode_cursor(self.request.GET.get('cursor'))
+        return self._cursor
+
+    def get_filter_params(self):
+        """Фильтры списка: из курсора при переходе по страницам, иначе из GET"""
+        cursor = self.get_cursor()
+        if cursor:
+            source = cursor['filters']
+        else:
+            source = self.request.GET
+        return {name: str(source.get(name, '')) for name in self.keyset_filter_params}
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.keyset_ordering, page_size)
+        filters = {name: value for name, value in self.get_filter_params().items() if value}
+        page = paginator.page(self.get_cursor(), filters)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_json_item(self, obj):
+        return {field: getattr(obj, field) for field in self.json_fields}
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.GET.get('format') != 'json':
+            return super().render_to_response(context, **response_kwargs)
+        page = context['page_obj']
+        return JsonResponse({
+            'results': [self.get_json_item(obj) for obj in page.object_list],
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        }, json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from .query_budget import counting_queries, request_report
+
+PROFILER_DEFAULTS = {
+    'ENABLED': True,
+    # Доля профилируемых запросов (0..1)
+    'SAMPLE_RATE': 1.0,
+    # Сколько последних замеров хранится для каждой пары (URL, роль)
+    'BUFFER_SIZE': 500,
+}
+
+PERCENTILES = (50, 95, 99)
+
+def get_profiler_settings():
+    return {**PROFILER_DEFAULTS, **getattr(settings, 'PROFILER', {})}
+
+def percentiles(values):
+    """p50/p95/p99 для страницы профилировщика"""
+    # Импорт здесь: diagnostics импортирует urls и views, а views — этот модуль
+    from .diagnostics import percentile
+    return {percent: percentile(values, percent) for percent in PERCENTILES}
+
+class RequestProfile:
+    """Замеры одного запроса страницы"""
+    __slots__ = ('wall', 'db', 'queries', 'template', 'size')
+
+    def __init__(self, wall, db, queries, template, size):
+        self.wall = wall
+        self.db = db
+        self.queries = queries
+        self.template = template
+        self.size = size
+
+class ProfileStore:
+    """Кольцевые буферы последних замеров по (имя URL, роль).
+
+    Хранится в памяти процесса: у каждого воркера свои замеры, запись —
+    одно добавление в deque под блокировкой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._totals = {}
+
+    def add(self, url_name, role, profile, buffer_size):
+        key = (url_name, role)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None or buffer.maxlen != buffer_size:
+                buffer = self._buffers[key] = deque(buffer or (), maxlen=buffer_size)
+            buffer.append(profile)
+            self._totals[key] = self._totals.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+            self._totals.clear()
+
+    def summary(self):
+        """Строки для страницы профилировщика, самые медленные (по p95) сначала"""
+        with self._lock:
+            snapshot = {key: list(buffer) for key, buffer in self._buffers.items()}
+            totals = dict(self._totals)
+
+        rows = []
+        for (url_name, role), profiles in snapshot.items():
+            if not profiles:
+                continue
+            wall = percentiles([p.wall for p in profiles])
+            db = percentiles([p.db for p in profiles])
+            template_times = [p.template for p in profiles if p.template is not None]
+            sizes = [p.size for p in profiles if p.size is not None]
+            rows.append({
+                'url_name': url_name,
+                'role': role,
+                'total': totals.get((url_name, role), len(profiles)),
+                'samples': len(profiles),
+                'wall': wall,
+                'db': db,
+                'template': percentiles(template_times) if template_times else None,
+                'queries': sum(p.queries for p in profiles) / len(profiles),
+                'max_queries': max(p.queries for p in profiles),
+                'size': sum(sizes) / len(sizes) if sizes else None,
+            })
+        rows.sort(key=lambda row: row['wall'][95], reverse=True)
+        return rows
+
+profile_store = ProfileStore()
+
+class ProfilerMiddleware:
+    """Постоянный профилировщик запросов: время ответа, время и число SQL,
+    время рендеринга шаблона и размер ответа по имени URL и роли.
+
+    Профилируется доля SAMPLE_RATE запросов; SQL считается тем же
+    QueryBudgetReport, что и бюджет запросов (query_budget.request_report). Шаблон замеряется от process_template_response
+    до post-render callback. Потоковые ответы записываются, когда тело отдано
+    целиком.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = get_profiler_settings()
+        if not options['ENABLED'] or random.random() >= options['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        sql = request_report(request)
+        with counting_queries(sql):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match else 'unresolved'
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            role = 'anonymous'
+        else:
+            role = user.role or ('superuser' if user.is_superuser else 'unknown')
+        template_time = getattr(request, '_profiler_template_time', None)
+
+        def record(size):
+            profile_store.add(url_name, role, RequestProfile(
+                wall=(time.perf_counter() - started) * 1000,
+                db=sql.duration * 1000,
+                queries=sql.count,
+                template=template_time * 1000 if template_time is not None else None,
+                size=size,
+            ), options['BUFFER_SIZE'])
+
+        if response.streaming:
+            response.streaming_content = self.stream(response.streaming_content, sql, record)
+        else:
+            record(len(response.content))
+        return response
+
+    def stream(self, content, sql, record):
+        size = 0
+        with counting_queries(sql):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        record(size)
+
+    def process_template_response(self, request, response):
+        render_started = time.perf_counter()
+
+        def finished(rendered):
+            request._profiler_template_time = time.perf_counter() - render_started
+
+        response.add_post_render_callback(finished)
+        return response
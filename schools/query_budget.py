@@ -0,0 +1,194 @@
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+from django.template.base import Node
+
+logger = logging.getLogger('schools.query_budget')
+
+QUERY_BUDGET_DEFAULTS = {
+    'ENABLED': True,
+    # Бюджет страниц, для которых он не объявлен
+    'DEFAULT': 30,
+    # Столько одинаковых запросов за запрос страницы считается подозрением на N+1
+    'REPEAT_THRESHOLD': 5,
+    # True — превышение бюджета и N+1 вызывают исключение (тесты), иначе пишутся в лог
+    'RAISE': False,
+}
+
+def get_query_budget_settings():
+    return {**QUERY_BUDGET_DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+class QueryBudgetExceeded(AssertionError):
+    """Страница выполнила больше запросов, чем объявлено, или повторяет один запрос"""
+
+def query_budget(limit):
+    """Объявить бюджет запросов для функции-представления: @query_budget(5)"""
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+    return decorator
+
+def get_view_budget(resolver_match, default):
+    """Бюджет из атрибута query_budget класса представления или функции;
+    query_budget = None отключает проверку для представления"""
+    if resolver_match is None:
+        return default
+    func = resolver_match.func
+    view = getattr(func, 'view_class', func)
+    return getattr(view, 'query_budget', default)
+
+def find_call_site():
+    """Ближайшее к запросу место в коде проекта: строка .py или тег шаблона.
+
+    Запросы из шаблонов ({{ obj.related.count }}) выполняются в коде Django,
+    поэтому для них указывается шаблон и строка, на которой стоит тег.
+    """
+    base_dir = str(settings.BASE_DIR)
+    this_file = os.path.abspath(__file__)
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'render_annotated' and isinstance(frame.f_locals.get('self'), Node):
+            node = frame.f_locals['self']
+            if node.origin is not None and node.token is not None:
+                return f'{node.origin.template_name}:{node.token.lineno} ({node.token.contents[:80]})'
+        filename = os.path.abspath(code.co_filename)
+        if (filename != this_file and filename.startswith(base_dir)
+                and 'site-packages' not in filename and os.path.isfile(filename)):
+            return f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {code.co_name}'
+        frame = frame.f_back
+    return None
+
+class QueryBudgetReport:
+    """Запросы одного запроса страницы: число, время SQL и повторы одинакового SQL.
+
+    Используется как execute_wrapper. Место вызова ищется только для запроса,
+    повторившегося repeat_threshold раз, поэтому обычные запросы не платят за
+    разбор стека.
+    """
+
+    def __init__(self, url_name=None, budget=None, repeat_threshold=5):
+        self.url_name = url_name
+        self.budget = budget
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.repeats = Counter()
+        self.call_sites = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.repeats[sql] += 1
+            if self.repeats[sql] == self.repeat_threshold:
+                self.call_sites[sql] = find_call_site()
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    @property
+    def suspected_n_plus_one(self):
+        """[(sql, число повторов, место вызова), ...] для запросов, повторенных не меньше порога"""
+        return [
+            (sql, count, self.call_sites.get(sql))
+            for sql, count in self.repeats.most_common()
+            if count >= self.repeat_threshold
+        ]
+
+    @property
+    def violations(self):
+        # Бюджет None — объем запросов ограничен данными по замыслу (потоковые выгрузки)
+        if self.budget is None:
+            return []
+        problems = []
+        if self.over_budget:
+            problems.append(f'{self.count} queries, budget {self.budget}')
+        for sql, count, call_site in self.suspected_n_plus_one:
+            problems.append(f'suspected N+1: {count}x at {call_site}: {sql[:200]}')
+        return problems
+
+    def summary(self):
+        return (
+            f'{self.url_name}: {self.count} queries ({self.duration * 1000:.1f} ms SQL), '
+            f'budget {self.budget}'
+        )
+
+def request_report(request):
+    """Общий QueryBudgetReport запроса страницы.
+
+    Его используют и бюджет запросов, и профилировщик: SQL считает один
+    execute_wrapper, установленный тем middleware, что стоит снаружи.
+    """
+    report = getattr(request, 'query_report', None)
+    if report is None:
+        options = get_query_budget_settings()
+        report = request.query_report = QueryBudgetReport(repeat_threshold=options['REPEAT_THRESHOLD'])
+    return report
+
+@contextmanager
+def counting_queries(report):
+    """Установить report как execute_wrapper, если он еще не установлен"""
+    if report in connection.execute_wrappers:
+        yield
+        return
+    with connection.execute_wrapper(report):
+        yield
+
+class QueryBudgetMiddleware:
+    """Счетчик SQL-запросов и времени SQL на каждый запрос страницы.
+
+    Запросы считаются через connection.execute_wrapper, результат
+    помечается именем URL и сравнивается с бюджетом представления
+    (атрибут query_budget, иначе QUERY_BUDGET['DEFAULT']). Нарушения пишутся
+    в лог schools.query_budget, при QUERY_BUDGET['RAISE'] — вызывают
+    QueryBudgetExceeded. Отчет доступен как response.query_report. У потоковых
+    ответов учитываются и запросы, выполненные при выдаче тела.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = get_query_budget_settings()
+        if not options['ENABLED']:
+            return self.get_response(request)
+
+        report = request_report(request)
+        with counting_queries(report):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        report.url_name = match.view_name if match else request.path
+        report.budget = get_view_budget(match, options['DEFAULT'])
+        response.query_report = report
+
+        if response.streaming:
+            response.streaming_content = self.stream(response.streaming_content, report, options)
+        else:
+            self.check(report, options)
+        return response
+
+    def stream(self, content, report, options):
+        with counting_queries(report):
+            yield from content
+        self.check(report, options)
+
+    def check(self, report, options):
+        violations = report.violations
+        if not violations:
+            logger.debug(report.summary())
+            return
+        message = f"{report.summary()}; " + '; '.join(violations)
+        if options['RAISE']:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
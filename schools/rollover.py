@@ -0,0 +1,165 @@
+import logging
+import re
+from django.db.models import Count, Q
+from django.utils import timezone
+from .database import write_transaction
+from .models import ClassGroup, School
+from .stats_cache import invalidate_all
+
+logger = logging.getLogger('schools')
+
+# «5А», «10 Б», «3В-1»: номер параллели и остаток названия
+CLASS_NAME_RE = re.compile(r'^(\d{1,2})(\D.*)?$')
+TEMP_NAME = '~rollover-{id}'
+
+def parse_class_name(name):
+    """(параллель, остаток названия) или None, если номер класса не распознан"""
+    match = CLASS_NAME_RE.match(name.strip())
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2) or ''
+
+def archived_name(name, year):
+    return f'{name} (выпуск {year})'
+
+def already_done(school):
+    return f'классы уже переведены за {school.last_rollover_year} год'
+
+class SchoolRollover:
+    """План перевода одной школы: какие классы переименовываются, какие
+    уходят в архив, какие первые классы создаются"""
+
+    def __init__(self, school, year):
+        self.school = school
+        self.year = year
+        self.promoted = []    # (class_id, старое название, новое название, учащихся)
+        self.graduated = []   # (class_id, старое название, архивное название, учащихся)
+        self.first_classes = []
+        self.skipped = []     # (название, причина)
+        self.errors = []
+
+    @property
+    def student_count(self):
+        return sum(row[3] for row in self.promoted) + sum(row[3] for row in self.graduated)
+
+def plan_rollover(schools, year=None, first_classes=True):
+    """План перевода классов школ на следующий год без изменений в БД.
+
+    Класс «5А» переходит в «6А» вместе с учащимися, назначениями учителей и
+    агрегатами оценок: меняется только название. Выпускные классы
+    (School.graduation_class) переименовываются в «11А (выпуск 2025)» и
+    помечаются is_archived. Если first_classes, вместо ушедших вторыми
+    создаются пустые первые классы с теми же буквами. Школа, уже переведенная
+    за этот или более поздний год (School.last_rollover_year), получает ошибку.
+    """
+    year = year or timezone.localdate().year
+    schools = list(schools)
+    plans = {school.id: SchoolRollover(school, year) for school in schools}
+    for plan in plans.values():
+        if plan.school.last_rollover_year is not None and plan.school.last_rollover_year >= year:
+            plan.errors.append(already_done(plan.school))
+
+    classes = ClassGroup.objects.filter(school__in=schools).active().annotate(
+        student_count=Count('students')
+    ).order_by('school_id', 'name').values_list('id', 'school_id', 'name', 'student_count')
+    for class_id, school_id, name, student_count in classes:
+        plan = plans[school_id]
+        if plan.errors:
+            continue
+        parsed = parse_class_name(name)
+        if parsed is None:
+            plan.skipped.append((name, 'не распознан номер класса'))
+            continue
+        level, rest = parsed
+        if level > plan.school.graduation_class or level < 1:
+            plan.skipped.append((name, f'вне параллелей 1–{plan.school.graduation_class}'))
+        elif level == plan.school.graduation_class:
+            plan.graduated.append((class_id, name, archived_name(name, year), student_count))
+        else:
+            plan.promoted.append((class_id, name, f'{level + 1}{rest}', student_count))
+            if level == 1 and first_classes:
+                plan.first_classes.append(name)
+
+    # Названия, которые займут переименованные классы, не должны быть заняты
+    # классами вне переименования (архив прошлых лет, нераспознанные названия)
+    moving = {(plan.school.id, row[1]) for plan in plans.values() for row in plan.promoted + plan.graduated}
+    targets = {
+        (plan.school.id, name)
+        for plan in plans.values()
+        for name in [row[2] for row in plan.promoted + plan.graduated] + plan.first_classes
+    }
+    taken = ClassGroup.objects.filter(
+        school__in=schools, name__in={name for _, name in targets}
+    ).values_list('school_id', 'name')
+    for school_id, name in taken:
+        if (school_id, name) in targets and (school_id, name) not in moving:
+            plans[school_id].errors.append(f'класс «{name}» уже существует')
+
+    return list(plans.values())
+
+def execute_rollover(plans, progress=None):
+    """Выполнить планы: одна транзакция на школу, все изменения пакетные.
+
+    Переименование в две фазы (временные имена, затем итоговые), чтобы
+    «5А» → «6А» не столкнулся с еще не переименованным «6А» в unique_together.
+    Назначения и составы групп уходящего года не меняются: open_year копирует
+    в новый год только назначения активных классов и учащихся, оставшихся в
+    своих классах. Год перевода записывается в School.last_rollover_year в
+    той же транзакции. Школы с ошибками в плане и школы, которые успел
+    перевести параллельный запуск, пропускаются.
+    """
+    totals = {'schools': 0, 'promoted': 0, 'graduated': 0, 'first_classes': 0}
+    for plan in plans:
+        if plan.errors:
+            continue
+        result = _execute_school(plan)
+        if result is None:
+            continue
+        for key, value in result.items():
+            totals[key] += value
+        totals['schools'] += 1
+        logger.info(
+            f"Rollover {plan.year} for school {plan.school.id}: {result['promoted']} classes promoted, "
+            f"{result['graduated']} archived, {result['first_classes']} first classes created"
+        )
+        if progress:
+            progress(plan, result)
+
+    invalidate_all()
+    return totals
+
+def _execute_school(plan):
+    moving = {row[0]: row for row in plan.promoted + plan.graduated}
+    graduated_ids = {row[0] for row in plan.graduated}
+
+    with write_transaction():
+        # Отметка о переводе ставится первой: параллельный запуск ждет записи и
+        # затем не найдет школы, еще не переведенной за этот год
+        claimed = School.objects.filter(pk=plan.school.pk).filter(
+            Q(last_rollover_year__isnull=True) | Q(last_rollover_year__lt=plan.year)
+        ).update(last_rollover_year=plan.year)
+        if not claimed:
+            plan.school.refresh_from_db(fields=['last_rollover_year'])
+            plan.errors.append(already_done(plan.school))
+            return None
+        plan.school.last_rollover_year = plan.year
+
+        classes = list(ClassGroup.objects.filter(id__in=list(moving)).only('id', 'name', 'is_archived'))
+        for class_group in classes:
+            class_group.name = TEMP_NAME.format(id=class_group.id)
+        ClassGroup.objects.bulk_update(classes, ['name'])
+
+        for class_group in classes:
+            class_group.name = moving[class_group.id][2]
+            class_group.is_archived = class_group.id in graduated_ids
+        ClassGroup.objects.bulk_update(classes, ['name', 'is_archived'])
+
+        created = ClassGroup.objects.bulk_create([
+            ClassGroup(school=plan.school, name=name) for name in plan.first_classes
+        ])
+
+    return {
+        'promoted': len(plan.promoted),
+        'graduated': len(plan.graduated),
+        'first_classes': len(created),
+    }
@@ -0,0 +1,203 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from django.db.models import Sum, Count
+from .database import write_transaction
+from .models import (
+    Grade, Student, StudentGradeAggregate, ClassGradeAggregate, SchoolGradeAggregate
+)
+from .stats_cache import invalidate_all, invalidate_classes, invalidate_schools
+
+# Агрегаты обновляются дельтами: save_grade_matrix передает изменения пакетом,
+# одиночные сохранения обрабатываются в signals.py. Удаление оценок
+# (Grade.delete и GradeQuerySet.delete) вычитается одним пакетом через
+# grades_subtracted; сигналов удаления у Grade нет, поэтому каскады от
+# учащегося и предмета остаются быстрыми и вычитаются их обработчиками.
+# Для восстановления — команда rebuild_grade_rollups.
+# Агрегаты считаются только по оценкам активного учебного года.
+
+REBUILD_BATCH_SIZE = 2000
+
+_state = threading.local()
+
+@contextmanager
+def grade_deltas_applied():
+    """Удаления Grade внутри блока уже учтены вызывающим кодом: сигнал их не вычитает"""
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+
+def grade_deltas_pending():
+    return not getattr(_state, 'depth', 0)
+
+@contextmanager
+def grades_subtracted(grades):
+    """Вычесть выборку оценок из агрегатов перед ее удалением внутри блока"""
+    if not grade_deltas_pending():
+        yield
+        return
+    with write_transaction():
+        subtract_grades(grades)
+        with grade_deltas_applied():
+            yield
+
+def collect_grade_deltas(changes):
+    """Свернуть изменения (student_id, quarter, old, new) в дельты {(student_id, quarter): (sum, count)}"""
+    deltas = defaultdict(lambda: [0, 0])
+    for student_id, quarter, old_grade, new_grade in changes:
+        delta = deltas[(student_id, quarter)]
+        delta[0] += (new_grade or 0) - (old_grade or 0)
+        delta[1] += (new_grade is not None) - (old_grade is not None)
+    return {key: tuple(delta) for key, delta in deltas.items() if delta != [0, 0]}
+
+def apply_grade_deltas(deltas, placements=None):
+    """Применить дельты учащихся ко всем уровням агрегатов.
+
+    placements: {student_id: (class_group_id, school_id)}; если не передано,
+    загружается одним запросом.
+    """
+    if not deltas:
+        return
+
+    if placements is None:
+        placements = {
+            student_id: (class_id, school_id)
+            for student_id, class_id, school_id in Student.objects.filter(
+                id__in={student_id for student_id, _ in deltas}
+            ).values_list('id', 'class_group_id', 'class_group__school_id')
+        }
+
+    class_deltas = defaultdict(lambda: [0, 0])
+    school_deltas = defaultdict(lambda: [0, 0])
+    for (student_id, quarter), (grade_sum, grade_count) in deltas.items():
+        placement = placements.get(student_id)
+        if placement is None:
+            continue
+        class_id, school_id = placement
+        for level, owner_id in ((class_deltas, class_id), (school_deltas, school_id)):
+            level[(owner_id, quarter)][0] += grade_sum
+            level[(owner_id, quarter)][1] += grade_count
+
+    with write_transaction():
+        _apply_level(StudentGradeAggregate, 'student_id', deltas)
+        _apply_level(ClassGradeAggregate, 'class_group_id', class_deltas)
+        _apply_level(SchoolGradeAggregate, 'school_id', school_deltas)
+    _invalidate_statistics(class_deltas, school_deltas)
+
+def _invalidate_statistics(class_deltas, school_deltas):
+    """Сбросить кэш статистики классов и школ, чьи агрегаты изменились"""
+    invalidate_classes({class_id for class_id, _ in class_deltas})
+    invalidate_schools({school_id for school_id, _ in school_deltas})
+
+def _apply_level(model, owner_field, deltas):
+    """Прибавить дельты к строкам одного уровня: один SELECT, один UPDATE, один INSERT"""
+    if not deltas:
+        return
+
+    existing = {
+        (getattr(row, owner_field), row.quarter): row
+        for row in model.objects.select_for_update().filter(**{
+            f'{owner_field}__in': {owner_id for owner_id, _ in deltas},
+            'quarter__in': {quarter for _, quarter in deltas},
+        })
+    }
+
+    to_create = []
+    to_update = []
+    for (owner_id, quarter), (grade_sum, grade_count) in deltas.items():
+        row = existing.get((owner_id, quarter))
+        if row is None:
+            if grade_count > 0:
+                to_create.append(model(**{owner_field: owner_id}, quarter=quarter,
+                                       grade_sum=grade_sum, grade_count=grade_count))
+        else:
+            row.grade_sum += grade_sum
+            row.grade_count += grade_count
+            to_update.append(row)
+
+    if to_update:
+        model.objects.bulk_update(to_update, ['grade_sum', 'grade_count'])
+    if to_create:
+        model.objects.bulk_create(to_create)
+
+def move_student_aggregates(student_id, old_placement, new_placement):
+    """Перенести вклад учащегося из старого класса/школы в новый"""
+    rows = StudentGradeAggregate.objects.filter(student_id=student_id, grade_count__gt=0)
+    class_deltas = {}
+    school_deltas = {}
+    for row in rows:
+        for deltas, index in ((class_deltas, 0), (school_deltas, 1)):
+            old_key = (old_placement[index], row.quarter)
+            new_key = (new_placement[index], row.quarter)
+            if old_key == new_key:
+                continue
+            deltas[old_key] = (-row.grade_sum, -row.grade_count)
+            deltas[new_key] = (row.grade_sum, row.grade_count)
+
+    with write_transaction():
+        _apply_level(ClassGradeAggregate, 'class_group_id', class_deltas)
+        _apply_level(SchoolGradeAggregate, 'school_id', school_deltas)
+    _invalidate_statistics(class_deltas, school_deltas)
+
+def subtract_student_aggregates(student_id, placement):
+    """Вычесть вклад удаляемого учащегося из агрегатов класса и школы"""
+    quarter_deltas = {}
+    for row in StudentGradeAggregate.objects.filter(student_id=student_id, grade_count__gt=0):
+        quarter_deltas[row.quarter] = (-row.grade_sum, -row.grade_count)
+
+    class_id, school_id = placement
+    with write_transaction():
+        _apply_level(ClassGradeAggregate, 'class_group_id',
+                     {(class_id, quarter): delta for quarter, delta in quarter_deltas.items()})
+        _apply_level(SchoolGradeAggregate, 'school_id',
+                     {(school_id, quarter): delta for quarter, delta in quarter_deltas.items()})
+    invalidate_classes([class_id])
+    invalidate_schools([school_id])
+
+def subtract_grades(grades):
+    """Вычесть из агрегатов оценки выборки перед ее удалением (например, каскад от предмета)"""
+    deltas = {
+        (row['student_id'], row['quarter']): (-row['grade_sum'], -row['grade_count'])
+        for row in grades.for_year().filter(grade__isnull=False).values('student_id', 'quarter').annotate(
+            grade_sum=Sum('grade'), grade_count=Count('grade')
+        )
+    }
+    apply_grade_deltas(deltas)
+
+def rebuild_rollups(year=None):
+    """Полностью пересчитать агрегаты по оценкам учебного года (по умолчанию активного)"""
+    grades = Grade.objects.for_year(year).filter(grade__isnull=False)
+    levels = [
+        (StudentGradeAggregate, 'student_id', 'student_id'),
+        (ClassGradeAggregate, 'class_group_id', 'student__class_group_id'),
+        (SchoolGradeAggregate, 'school_id', 'student__class_group__school_id'),
+    ]
+
+    counts = {}
+    with write_transaction():
+        for model, owner_field, _ in levels:
+            model.objects.all().delete()
+
+        for model, owner_field, grade_path in levels:
+            rows = grades.values(grade_path, 'quarter').annotate(
+                total=Sum('grade'), number=Count('grade')
+            ).order_by()
+
+            batch = []
+            created = 0
+            for row in rows.iterator():
+                batch.append(model(**{owner_field: row[grade_path]}, quarter=row['quarter'],
+                                   grade_sum=row['total'], grade_count=row['number']))
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    model.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+            counts[model.__name__] = created
+
+    invalidate_all()
+    return counts
@@ -0,0 +1,239 @@
+import csv
+import io
+import os
+import zipfile
+from django.core.exceptions import ValidationError
+from .database import write_transaction
+from .memberships import enroll_in_single_groups
+from .models import ClassGroup, Student
+from .search import normalize_search_text
+from .stats_cache import invalidate_classes, invalidate_schools
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+# Допустимые заголовки колонок (сравниваются без учета регистра)
+ROSTER_COLUMNS = {
+    'school': ('школа', 'school'),
+    'class': ('класс', 'class', 'class_group'),
+    'last_name': ('фамилия', 'last_name'),
+    'first_name': ('имя', 'first_name'),
+    'patronymic': ('отчество', 'patronymic'),
+}
+REQUIRED_COLUMNS = ('class', 'last_name', 'first_name')
+
+FIELD_LIMITS = {
+    'class': ClassGroup._meta.get_field('name').max_length,
+    'last_name': Student._meta.get_field('last_name').max_length,
+    'first_name': Student._meta.get_field('first_name').max_length,
+    'patronymic': Student._meta.get_field('patronymic').max_length,
+}
+
+def iter_csv_rows(file):
+    """Строки CSV по одной; разделитель (',' или ';') определяется по первым строкам"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        # Не даем обертке закрыть исходный файл: им владеет вызывающий код
+        if not file.closed:
+            text.detach()
+
+def iter_xlsx_rows(file):
+    """Строки первого листа XLSX в режиме read-only: лист не загружается в память целиком"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ['' if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+def iter_roster_rows(file, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(file)
+    if extension == '.xlsx':
+        return iter_xlsx_rows(file)
+    raise ValidationError('Поддерживаются только файлы CSV и XLSX')
+
+def map_header(header):
+    """Сопоставить заголовки файла колонкам списка: {'class': индекс, ...}"""
+    positions = {}
+    for index, title in enumerate(header):
+        title = (title or '').strip().lower()
+        for column, aliases in ROSTER_COLUMNS.items():
+            if title in aliases and column not in positions:
+                positions[column] = index
+    missing = [ROSTER_COLUMNS[column][0] for column in REQUIRED_COLUMNS if column not in positions]
+    if missing:
+        raise ValidationError(f"В файле нет колонок: {', '.join(missing)}")
+    return positions
+
+class RosterImporter:
+    """Потоковый импорт списка учащихся из CSV/XLSX.
+
+    Файл читается построчно, строки проверяются и записываются пачками по
+    chunk_size: недостающие классы создаются одним bulk_create на пачку,
+    учащиеся — одним bulk_create. Каждая пачка — отдельная транзакция: шлюз
+    записи не держится на весь файл, и сохранения журнала идут между пачками.
+    Если импорт прервется, уже записанные пачки останутся; повторный импорт
+    того же файла пропустит их как дубликаты. В памяти держится только
+    текущая пачка и справочник классов, поэтому потребление памяти не растет
+    с размером файла.
+    Учащиеся, уже записанные в тот же класс с тем же ФИО, пропускаются;
+    новые записываются в предметы класса, которые ведутся одной группой.
+
+    school — школа администратора; если не задана, школа берется из колонки
+    «Школа» по названию среди schools.
+    """
+
+    def __init__(self, school=None, schools=None, chunk_size=CHUNK_SIZE):
+        if school is None and schools is None:
+            raise ValueError('Нужно указать school или schools')
+        self.school = school
+        self.schools_by_name = {} if schools is None else {s.name.strip().lower(): s for s in schools}
+        self.chunk_size = chunk_size
+        self.class_ids = {}
+        self.result = {
+            'rows': 0,
+            'created': 0,
+            'duplicates': 0,
+            'invalid': 0,
+            'classes_created': 0,
+            'errors': [],
+        }
+
+    def run(self, file, filename):
+        try:
+            return self._run(iter_roster_rows(file, filename))
+        except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile):
+            raise ValidationError('Не удалось прочитать файл: он поврежден или сохранен не в UTF-8')
+
+    def _run(self, rows):
+        header = next(rows, None)
+        if header is None:
+            raise ValidationError('Файл пуст')
+        positions = map_header(header)
+        if self.school is None and 'school' not in positions:
+            raise ValidationError('В файле нет колонки: школа')
+
+        chunk = []
+        for line_number, row in enumerate(rows, start=2):
+            if not any(str(value).strip() for value in row):
+                continue
+            self.result['rows'] += 1
+            record = self.clean_row(line_number, row, positions)
+            if record is None:
+                continue
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self.save_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.save_chunk(chunk)
+        return self.result
+
+    def error(self, line_number, message):
+        self.result['invalid'] += 1
+        if len(self.result['errors']) < MAX_REPORTED_ERRORS:
+            self.result['errors'].append(f"Строка {line_number}: {message}")
+
+    def clean_row(self, line_number, row, positions):
+        values = {}
+        for column, index in positions.items():
+            values[column] = str(row[index]).strip() if index < len(row) else ''
+
+        for column in REQUIRED_COLUMNS:
+            if not values[column]:
+                self.error(line_number, f"не заполнена колонка «{ROSTER_COLUMNS[column][0]}»")
+                return None
+        for column, limit in FIELD_LIMITS.items():
+            if len(values.get(column, '')) > limit:
+                self.error(line_number, f"значение колонки «{ROSTER_COLUMNS[column][0]}» длиннее {limit} символов")
+                return None
+
+        school = self.school
+        if school is None:
+            school = self.schools_by_name.get(values.get('school', '').lower())
+            if school is None:
+                self.error(line_number, f"школа «{values.get('school', '')}» не найдена")
+                return None
+
+        return (school.id, values['class'], values['last_name'], values['first_name'], values.get('patronymic', ''))
+
+    def resolve_classes(self, chunk):
+        """Найти или создать классы пачки; справочник (школа, класс) → id копится между пачками"""
+        missing = {(school_id, class_name) for school_id, class_name, *_ in chunk} - self.class_ids.keys()
+        if not missing:
+            return
+
+        school_ids = {school_id for school_id, _ in missing}
+        names = {class_name for _, class_name in missing}
+        existing = ClassGroup.objects.filter(school_id__in=school_ids, name__in=names).values_list('school_id', 'name', 'id')
+        for school_id, name, class_id in existing:
+            self.class_ids[(school_id, name)] = class_id
+
+        to_create = [
+            ClassGroup(school_id=school_id, name=name)
+            for school_id, name in missing if (school_id, name) not in self.class_ids
+        ]
+        if to_create:
+            ClassGroup.objects.bulk_create(to_create)
+            self.result['classes_created'] += len(to_create)
+            created = ClassGroup.objects.filter(
+                school_id__in={c.school_id for c in to_create},
+                name__in={c.name for c in to_create},
+            ).values_list('school_id', 'name', 'id')
+            for school_id, name, class_id in created:
+                self.class_ids[(school_id, name)] = class_id
+
+    def save_chunk(self, chunk):
+        with write_transaction():
+            self._save_chunk(chunk)
+
+    def _save_chunk(self, chunk):
+        self.resolve_classes(chunk)
+
+        # Только индекс search_last_name: условие по классам заставило бы SQLite
+        # просматривать всех учащихся этих классов; класс входит в ключ сравнения
+        seen = set(Student.objects.filter(
+            search_last_name__in={normalize_search_text(record[2]) for record in chunk},
+        ).values_list('class_group_id', 'last_name', 'first_name', 'patronymic'))
+
+        students = []
+        for school_id, class_name, last_name, first_name, patronymic in chunk:
+            key = (self.class_ids[(school_id, class_name)], last_name, first_name, patronymic)
+            if key in seen:
+                self.result['duplicates'] += 1
+                continue
+            seen.add(key)
+            student = Student(class_group_id=key[0], last_name=last_name, first_name=first_name, patronymic=patronymic)
+            student.update_search_fields()
+            students.append(student)
+
+        if students:
+            Student.objects.bulk_create(students)
+            enroll_in_single_groups(students)
+            self.result['created'] += len(students)
+            # bulk_create не посылает сигналов — кэш статистики сбрасывается здесь
+            invalidate_classes({student.class_group_id for student in students})
+            invalidate_schools({school_id for school_id, *_ in chunk})
+
+def import_roster(file, filename, school=None, schools=None, chunk_size=CHUNK_SIZE):
+    """Импортировать список учащихся; возвращает счетчики и первые ошибки строк"""
+    return RosterImporter(school=school, schools=schools, chunk_size=chunk_size).run(file, filename)
+
+def describe_import(filename, result):
+    return (
+        f"Imported roster {filename}: {result['created']} students created, "
+        f"{result['classes_created']} classes created, {result['duplicates']} duplicates skipped, "
+        f"{result['invalid']} invalid rows"
+    )
@@ -0,0 +1,32 @@
+from django.db.models import Q
+
+# Верхняя граница диапазона для префиксного поиска: больше любого символа Unicode
+PREFIX_UPPER_BOUND = '\U0010ffff'
+
+NAME_FIELDS = ('last_name', 'first_name', 'patronymic')
+SEARCH_FIELDS = ('search_last_name', 'search_first_name', 'search_patronymic')
+
+def normalize_search_text(value):
+    """Привести текст к виду для поиска: casefold (работает и для кириллицы) и ё → е"""
+    return (value or '').casefold().replace('ё', 'е').strip()
+
+def prefix_q(field, term):
+    """Условие «поле начинается с term» в виде диапазона, который использует B-tree индекс
+    
+    В отличие от LIKE 'term%', сравнение диапазона не зависит от регистронезависимости
+    LIKE в SQLite (только ASCII) и не требует полного просмотра таблицы.
+    """
+    return Q(**{f'{field}__gte': term, f'{field}__lt': term + PREFIX_UPPER_BOUND})
+
+def search_people(queryset, query):
+    """Отфильтровать учащихся или учителей по ФИО
+    
+    Каждое слово запроса должно быть префиксом фамилии, имени или отчества,
+    например «иван» найдет и «Иванов», и «Иван», а «петров иван» — Петрова Ивана.
+    """
+    for term in normalize_search_text(query).split():
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= prefix_q(field, term)
+        queryset = queryset.filter(condition)
+    return queryset
@@ -0,0 +1,135 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .academic_years import forget_active_year, get_active_year
+from .backends import invalidate_users
+from .models import AcademicYear, ClassGroup, Grade, School, Student, Subject, Teacher, User
+from .rollups import (
+    apply_grade_deltas, collect_grade_deltas, move_student_aggregates,
+    subtract_student_aggregates, subtract_grades
+)
+from .stats_cache import SYSTEM, invalidate, invalidate_classes, invalidate_schools
+
+def _student_placement(student_id):
+    """(class_group_id, school_id) учащегося по данным БД"""
+    return Student.objects.filter(id=student_id).values_list(
+        'class_group_id', 'class_group__school_id'
+    ).first()
+
+@receiver(pre_save, sender=Grade)
+def remember_previous_grade(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if raw or not instance.pk:
+        return
+    instance._rollup_previous = Grade.objects.filter(pk=instance.pk).values_list(
+        'student_id', 'quarter', 'grade', 'academic_year_id'
+    ).first()
+
+# Активный год читается из БД, а не из кэша: другой процесс мог уже открыть
+# новый год, и агрегаты пересчитаны по нему
+
+@receiver(post_save, sender=Grade)
+def update_rollups_on_grade_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    active_year_id = get_active_year().pk
+    changes = []
+    if instance.academic_year_id == active_year_id:
+        changes.append((instance.student_id, instance.quarter, None, instance.grade))
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous and previous[3] == active_year_id:
+        student_id, quarter, grade, _ = previous
+        changes.append((student_id, quarter, grade, None))
+    if changes:
+        apply_grade_deltas(collect_grade_deltas(changes))
+
+@receiver(pre_save, sender=Student)
+def remember_previous_class(sender, instance, raw=False, **kwargs):
+    instance._rollup_placement = None
+    if raw or not instance.pk:
+        return
+    instance._rollup_placement = _student_placement(instance.pk)
+
+@receiver(post_save, sender=Student)
+def move_rollups_on_class_change(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_placement', None)
+    if created:
+        _invalidate_placements(_student_placement(instance.pk))
+    if not previous or previous[0] == instance.class_group_id:
+        return
+    placement = _student_placement(instance.pk)
+    move_student_aggregates(instance.pk, previous, placement)
+    _invalidate_placements(previous, placement)
+
+@receiver(pre_delete, sender=Student)
+def subtract_rollups_on_student_delete(sender, instance, **kwargs):
+    placement = _student_placement(instance.pk)
+    if placement:
+        subtract_student_aggregates(instance.pk, placement)
+
+@receiver(pre_delete, sender=Subject)
+def subtract_rollups_on_subject_delete(sender, instance, **kwargs):
+    subtract_grades(Grade.objects.filter(subject=instance))
+
+# Кэш статистики (stats_cache.py): число классов, учащихся, учителей, школ,
+# пользователей и предметов. Изменения оценок сбрасывают его в rollups.py.
+
+def _invalidate_placements(*placements):
+    placements = [placement for placement in placements if placement]
+    invalidate_classes({class_id for class_id, _ in placements})
+    invalidate_schools({school_id for _, school_id in placements})
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def invalidate_statistics_on_teacher_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_schools([instance.school_id])
+
+@receiver(post_save, sender=ClassGroup)
+@receiver(post_delete, sender=ClassGroup)
+def invalidate_statistics_on_class_change(sender, instance, raw=False, **kwargs):
+    # В статистике школы хранятся и сами классы (название), поэтому любое сохранение
+    if not raw:
+        invalidate_classes([instance.pk])
+        invalidate_schools([instance.school_id])
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def invalidate_statistics_on_school_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_schools([instance.pk])
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_system_statistics_on_user_change(sender, instance, raw=False, **kwargs):
+    # Любое сохранение: число пользователей зависит от is_superuser
+    if not raw:
+        invalidate(SYSTEM)
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_system_statistics(sender, instance, created=True, raw=False, **kwargs):
+    if created and not raw:
+        invalidate(SYSTEM)
+
+# Кэш пользователей сессий (backends.py): пользователь и его школа
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_users([instance.pk])
+
+@receiver(post_save, sender=School)
+@receiver(pre_delete, sender=School)
+def invalidate_cached_school_admins(sender, instance, raw=False, **kwargs):
+    # pre_delete: после удаления school_id администраторов обнулит SET_NULL без сигналов
+    if not raw:
+        invalidate_users(instance.admins.values_list('id', flat=True))
+
+@receiver(post_save, sender=AcademicYear)
+@receiver(post_delete, sender=AcademicYear)
+def forget_cached_active_year(sender, instance, raw=False, **kwargs):
+    if not raw:
+        forget_active_year()
@@ -0,0 +1,15 @@
+from django.db.backends.sqlite3 import base
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с BEGIN IMMEDIATE для транзакций write_transaction (schools/database.py).
+
+    Обычный BEGIN откладывает блокировку записи до первого изменения; если
+    к этому моменту другое соединение уже записало, SQLite отвечает
+    «database is locked» без ожидания busy_timeout. IMMEDIATE берет блокировку
+    сразу и ждет ее штатно. В Django 5.1 то же дает OPTIONS['transaction_mode'].
+    """
+
+    begin_immediate = False
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE' if self.begin_immediate else 'BEGIN')
@@ -0,0 +1,136 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .caching import entry_timeout
+
+STATISTICS_CACHE_DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    # Сколько хранится вычисленная статистика (секунды)
+    'TIMEOUT': 3600,
+    # Срок в кэше одного процесса (LocMemCache): сброс версий виден только
+    # процессу, изменившему данные, остальные воркеры ждут истечения записи
+    'LOCAL_TIMEOUT': 30,
+    # Сколько действует блокировка пересчета, если пересчитывающий процесс упал
+    'LOCK_TIMEOUT': 30,
+}
+
+KEY_PREFIX = 'stats'
+SYSTEM = 'system'
+GENERATION = 'generation'
+
+def get_statistics_cache_settings():
+    return {**STATISTICS_CACHE_DEFAULTS, **getattr(settings, 'STATISTICS_CACHE', {})}
+
+def get_cache():
+    return caches[get_statistics_cache_settings()['CACHE']]
+
+def scope_name(scope, owner_id=None):
+    """Область статистики: 'system', 'school:5', 'class:12'"""
+    return scope if owner_id is None else f'{scope}:{owner_id}'
+
+def version_key(scope):
+    return f'{KEY_PREFIX}:version:{scope}'
+
+def data_key(scope):
+    return f'{KEY_PREFIX}:data:{scope}'
+
+def lock_key(scope):
+    return f'{KEY_PREFIX}:lock:{scope}'
+
+def new_version():
+    return time.time_ns()
+
+def _current_versions(cache, scopes):
+    """Версии областей вместе с общим поколением; отсутствующие версии создаются"""
+    keys = [version_key(scope) for scope in scopes] + [version_key(GENERATION)]
+    stored = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in stored}
+    if missing:
+        # add, а не set: параллельный процесс мог уже создать версию
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        stored.update(cache.get_many(list(missing)))
+    generation = stored.get(version_key(GENERATION))
+    return {scope: (generation, stored.get(version_key(scope))) for scope in scopes}
+
+def get_or_compute_many(scopes, compute, timeout=None):
+    """Статистика областей из кэша с пересчетом устаревших.
+
+    scopes — имена областей, compute(список областей) -> {область: значение}.
+    Запись свежая, если ее версия совпадает с текущей версией области.
+    Устаревшую запись пересчитывает только процесс, взявший блокировку
+    (cache.add); остальные в это время отдают прежнее значение
+    (stale-while-revalidate), поэтому серия запросов после инвалидации
+    вызывает один пересчет. Без записи в кэше значение считается сразу.
+    timeout — срок записи вместо TIMEOUT из настроек; в кэше процесса
+    он ограничен LOCAL_TIMEOUT.
+    """
+    scopes = list(scopes)
+    options = get_statistics_cache_settings()
+    if not options['ENABLED'] or not scopes:
+        return compute(scopes)
+
+    cache = get_cache()
+    versions = _current_versions(cache, scopes)
+    entries = cache.get_many([data_key(scope) for scope in scopes])
+
+    result = {}
+    to_compute = []
+    locked = []
+    for scope in scopes:
+        entry = entries.get(data_key(scope))
+        if entry is not None and entry['version'] == versions[scope]:
+            result[scope] = entry['value']
+        elif entry is not None and not cache.add(lock_key(scope), 1, options['LOCK_TIMEOUT']):
+            result[scope] = entry['value']
+        else:
+            to_compute.append(scope)
+            if entry is not None:
+                locked.append(scope)
+
+    if to_compute:
+        try:
+            computed = compute(to_compute)
+            # Сохраняется версия, прочитанная до расчета: если область изменилась
+            # во время расчета, запись сразу окажется устаревшей
+            cache.set_many({
+                data_key(scope): {'version': versions[scope], 'value': computed[scope]}
+                for scope in to_compute
+            }, entry_timeout(cache, timeout or options['TIMEOUT'], options['LOCAL_TIMEOUT']))
+        finally:
+            if locked:
+                cache.delete_many([lock_key(scope) for scope in locked])
+        result.update(computed)
+    return result
+
+def get_or_compute(scope, compute, timeout=None):
+    """То же для одной области: compute() -> значение"""
+    return get_or_compute_many([scope], lambda scopes: {scope: compute()}, timeout)[scope]
+
+def _bump(scopes):
+    version = new_version()
+    get_cache().set_many({version_key(scope): version for scope in scopes}, None)
+
+def invalidate(*scopes):
+    """Пометить статистику областей устаревшей после фиксации транзакции.
+
+    До фиксации другие процессы еще видят старые данные и могли бы
+    сохранить их под новой версией.
+    """
+    scopes = set(scopes)
+    if not scopes or not get_statistics_cache_settings()['ENABLED']:
+        return
+    transaction.on_commit(lambda: _bump(scopes))
+
+def invalidate_classes(class_ids):
+    invalidate(*(scope_name('class', class_id) for class_id in class_ids))
+
+def invalidate_schools(school_ids):
+    """Статистика школ и системы (в нее входят суммы по школам)"""
+    invalidate(SYSTEM, *(scope_name('school', school_id) for school_id in school_ids))
+
+def invalidate_all():
+    """Устарела вся статистика (пересчет агрегатов, массовая загрузка данных)"""
+    invalidate(GENERATION)
@@ -0,0 +1,192 @@
+import random
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from .academic_years import get_active_year
+from .memberships import BULK_BATCH_SIZE
+from .models import (
+    ClassGroup, ClassSubjectGroup, Grade, School, Student, StudentSubjectGroup, Subject, Teacher, User,
+)
+from .rollups import rebuild_rollups
+
+LAST_NAMES = [
+    'Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+    'Михайлов', 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов',
+    'Егоров', 'Павлов', 'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров',
+]
+FIRST_NAMES = [
+    'Александр', 'Дмитрий', 'Максим', 'Сергей', 'Андрей', 'Алексей', 'Артем', 'Илья',
+    'Анна', 'Мария', 'Елена', 'Ольга', 'Наталья', 'Татьяна', 'Ирина', 'Екатерина',
+]
+PATRONYMICS = ['Александрович', 'Дмитриевич', 'Сергеевич', 'Андреевна', 'Игоревна', 'Петровна', '']
+SUBJECT_NAMES = [
+    'Русский язык', 'Литература', 'Математика', 'Алгебра', 'Геометрия', 'История', 'Обществознание',
+    'География', 'Биология', 'Физика', 'Химия', 'Информатика', 'Английский язык', 'Физкультура',
+    'Музыка', 'Изобразительное искусство', 'Технология', 'ОБЖ',
+]
+# Четверти, которые заполняются у каждого учащегося по каждому предмету
+GENERATED_QUARTERS = Grade.TERM_QUARTERS + ['year']
+
+class DistrictGenerator:
+    """Синтетический район для нагрузочных проверок.
+
+    Все объекты создаются через bulk_create: учителя и классы — пачкой на
+    школу, учащиеся, назначения, распределения и оценки — пачкой на класс.
+    Первые split_subjects предметов класса ведутся двумя подгруппами с разными
+    учителями, учащиеся делятся между ними поровну. Агрегаты оценок
+    пересчитываются в конце одним проходом.
+
+    Пользователи получают адреса вида {prefix}-dept1@district.test и
+    {prefix}-admin1-2@district.test с общим паролем password.
+    """
+
+    def __init__(self, depts=1, schools_per_dept=5, classes_per_school=11, students_per_class=25,
+                 teachers_per_school=20, subjects=12, split_subjects=2, grade_fill=1.0,
+                 prefix='bench', password='password', seed=None):
+        self.depts = depts
+        self.schools_per_dept = schools_per_dept
+        self.classes_per_school = classes_per_school
+        self.students_per_class = students_per_class
+        self.teachers_per_school = max(teachers_per_school, 2)
+        self.subject_count = subjects
+        self.split_subjects = min(split_subjects, subjects)
+        self.grade_fill = grade_fill
+        self.prefix = prefix
+        self.password = password
+        self.random = random.Random(seed)
+        self.counts = {
+            'education_depts': 0, 'schools': 0, 'school_admins': 0, 'teachers': 0, 'classes': 0,
+            'students': 0, 'assignments': 0, 'memberships': 0, 'grades': 0,
+        }
+
+    def email(self, name):
+        return f'{self.prefix}-{name}@district.test'
+
+    def person(self, model, **fields):
+        obj = model(
+            last_name=self.random.choice(LAST_NAMES),
+            first_name=self.random.choice(FIRST_NAMES),
+            patronymic=self.random.choice(PATRONYMICS),
+            **fields,
+        )
+        obj.update_search_fields()
+        return obj
+
+    def run(self):
+        if User.objects.filter(email__startswith=f'{self.prefix}-', email__endswith='@district.test').exists():
+            raise ValueError(f'Район с префиксом «{self.prefix}» уже создан')
+
+        # Хеш пароля считается один раз: make_password на каждого пользователя — секунды CPU
+        self.password_hash = make_password(self.password)
+        # Год задается явно: значение по умолчанию читало бы кэш на каждую оценку
+        self.year = get_active_year()
+        with transaction.atomic():
+            self.subjects = self.create_subjects()
+            for dept_number in range(1, self.depts + 1):
+                self.create_dept(dept_number)
+            rebuild_rollups()
+        return self.counts
+
+    def create_subjects(self):
+        names = SUBJECT_NAMES[:self.subject_count]
+        names += [f'Предмет {i}' for i in range(len(names) + 1, self.subject_count + 1)]
+        existing = set(Subject.objects.filter(name__in=names).values_list('name', flat=True))
+        Subject.objects.bulk_create([Subject(name=name) for name in names if name not in existing])
+        by_name = {s.name: s for s in Subject.objects.filter(name__in=names)}
+        return [by_name[name] for name in names]
+
+    def create_dept(self, dept_number):
+        dept = User(email=self.email(f'dept{dept_number}'), password=self.password_hash, role='education_dept',
+                    last_name='Отдел образования', first_name=str(dept_number))
+        dept.save()
+        self.counts['education_depts'] += 1
+
+        schools = School.objects.bulk_create([
+            School(
+                name=f'Школа {dept_number}-{number}',
+                graduation_class=self.random.choice([9, 11]),
+                education_dept=dept,
+                location=f'Район {dept_number}',
+            )
+            for number in range(1, self.schools_per_dept + 1)
+        ])
+        self.counts['schools'] += len(schools)
+
+        User.objects.bulk_create([
+            User(email=self.email(f'admin{dept_number}-{number}'), password=self.password_hash,
+                 role='school_admin', school=school, last_name='Администратор', first_name=school.name)
+            for number, school in enumerate(schools, start=1)
+        ])
+        self.counts['school_admins'] += len(schools)
+
+        for school in schools:
+            self.create_school(school)
+
+    def create_school(self, school):
+        teachers = Teacher.objects.bulk_create([
+            self.person(Teacher, school=school) for _ in range(self.teachers_per_school)
+        ])
+        self.counts['teachers'] += len(teachers)
+
+        # Параллели с 1 класса до выпускного, буквы — по кругу
+        names = []
+        for index in range(self.classes_per_school):
+            grade_level = index % school.graduation_class + 1
+            letter = 'АБВГДЕЖЗ'[index // school.graduation_class % 8]
+            suffix = index // (school.graduation_class * 8)
+            names.append(f'{grade_level}{letter}' + (f'-{suffix}' if suffix else ''))
+        classes = ClassGroup.objects.bulk_create([ClassGroup(school=school, name=name) for name in names])
+        self.counts['classes'] += len(classes)
+
+        for class_group in classes:
+            self.create_class(class_group, teachers)
+
+    def create_class(self, class_group, teachers):
+        students = Student.objects.bulk_create([
+            self.person(Student, class_group=class_group) for _ in range(self.students_per_class)
+        ], batch_size=BULK_BATCH_SIZE)
+        self.counts['students'] += len(students)
+
+        assignments = []
+        for index, subject in enumerate(self.subjects):
+            groups = 2 if index < self.split_subjects else 1
+            first_teacher = self.random.randrange(len(teachers))
+            for group_number in range(1, groups + 1):
+                assignments.append(ClassSubjectGroup(
+                    academic_year=self.year,
+                    class_group=class_group,
+                    subject=subject,
+                    teacher=teachers[(first_teacher + group_number - 1) % len(teachers)],
+                    level='advanced' if group_number == 2 else 'basic',
+                    group_number=group_number,
+                ))
+        assignments = ClassSubjectGroup.objects.bulk_create(assignments)
+        self.counts['assignments'] += len(assignments)
+
+        groups_by_subject = {}
+        for assignment in assignments:
+            groups_by_subject.setdefault(assignment.subject_id, []).append(assignment)
+        memberships = [
+            StudentSubjectGroup(student=student, subject_group=groups[position % len(groups)])
+            for groups in groups_by_subject.values()
+            for position, student in enumerate(students)
+        ]
+        StudentSubjectGroup.objects.bulk_create(memberships, batch_size=BULK_BATCH_SIZE)
+        self.counts['memberships'] += len(memberships)
+
+        grades = []
+        for student in students:
+            # У каждого учащегося свой «уровень», чтобы средние различались
+            level = self.random.randint(4, 9)
+            for subject in self.subjects:
+                for quarter in GENERATED_QUARTERS:
+                    if self.random.random() >= self.grade_fill:
+                        continue
+                    value = min(10, max(1, level + self.random.randint(-2, 2)))
+                    grades.append(Grade(academic_year=self.year, student=student, subject=subject,
+                                        quarter=quarter, grade=value))
+        Grade.objects.bulk_create(grades, batch_size=BULK_BATCH_SIZE)
+        self.counts['grades'] += len(grades)
+
+def generate_district(**options):
+    """Создать синтетический район; возвращает количество созданных объектов"""
+    return DistrictGenerator(**options).run()
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from .diagnostics import consume
+
+def test_settings():
+    """Настройки на время тестов: журнал аудита пишется синхронно, в транзакции
+    теста, а превышение бюджета запросов вызывает QueryBudgetExceeded"""
+    return override_settings(
+        AUDIT_LOG={**getattr(settings, 'AUDIT_LOG', {}), 'ASYNC': False},
+        QUERY_BUDGET={**getattr(settings, 'QUERY_BUDGET', {}), 'RAISE': True},
+    )
+
+class SchoolTestRunner(DiscoverRunner):
+    """Тестовый раннер (TEST_RUNNER): включает test_settings() на весь прогон.
+
+    Другие раннеры могут включить те же настройки через test_settings().
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = test_settings()
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetTestMixin:
+    """Проверки бюджета запросов для TestCase (нужен QueryBudgetMiddleware).
+
+    При QUERY_BUDGET['RAISE'] (включается test_settings) нарушение бюджета
+    и так прерывает запрос тестового клиента; assertWithinQueryBudget
+    дополнительно проверяет конкретный ответ и точное число запросов.
+    """
+
+    def assertWithinQueryBudget(self, response, max_queries=None):
+        consume(response)
+        report = getattr(response, 'query_report', None)
+        if report is None:
+            self.fail('В ответе нет query_report: QueryBudgetMiddleware не подключен')
+        if max_queries is not None:
+            report.budget = max_queries
+        violations = report.violations
+        if violations:
+            self.fail(f"{report.summary()}; " + '; '.join(violations))
+        return report
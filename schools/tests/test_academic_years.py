@@ -0,0 +1,58 @@
+from django.core.cache import caches
+from django.test import TestCase
+from schools.academic_years import ACTIVE_YEAR_KEY, get_active_year, get_active_year_id, open_year
+from schools.grades import save_grade_matrix
+from schools.models import ClassSubjectGroup, Grade, School, SchoolGradeAggregate, Student
+from schools.rollover import execute_rollover, plan_rollover
+from schools.rollups import rebuild_rollups
+from schools.synthetic import generate_district
+
+def school_rollups():
+    return sorted(SchoolGradeAggregate.objects.values_list('school_id', 'quarter', 'grade_sum', 'grade_count'))
+
+class OpenYearTest(TestCase):
+    """Открытие года не теряет историю и не путает годы у процессов со старым кэшем"""
+
+    @classmethod
+    def setUpTestData(cls):
+        caches['default'].clear()
+        generate_district(prefix='year', schools_per_dept=1, classes_per_school=11,
+                          students_per_class=2, teachers_per_school=2, subjects=2, seed=1)
+        cls.school = School.objects.get(education_dept__email='year-dept1@district.test')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def open_next_year(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            year, _ = open_year('2099/2100', get_active_year().end_date, get_active_year().end_date.replace(year=2100))
+        return year
+
+    def test_write_with_stale_cached_year_goes_to_the_active_year(self):
+        old_year_id = get_active_year_id()
+        year = self.open_next_year()
+        # Кэш другого воркера еще помнит прежний год
+        caches['default'].set(ACTIVE_YEAR_KEY, old_year_id)
+
+        group = ClassSubjectGroup.objects.filter(academic_year=year, class_group__is_archived=False).first()
+        student = Student.objects.filter(class_group=group.class_group).first()
+        save_grade_matrix({(student.id, group.subject_id, 'q1'): 9})
+
+        grade = Grade.objects.get(student=student, subject_id=group.subject_id, quarter='q1', grade=9)
+        self.assertEqual(grade.academic_year_id, year.id)
+        rollups = school_rollups()
+        rebuild_rollups(year)
+        self.assertEqual(school_rollups(), rollups)
+
+    def test_rollover_keeps_assignments_of_the_ending_year(self):
+        old_year_id = get_active_year_id()
+        with self.captureOnCommitCallbacks(execute=True):
+            execute_rollover(plan_rollover([self.school], year=2030))
+        graduated = ClassSubjectGroup.objects.filter(academic_year_id=old_year_id, class_group__is_archived=True)
+        kept = graduated.count()
+        self.assertGreater(kept, 0)
+
+        year = self.open_next_year()
+        self.assertEqual(graduated.count(), kept)
+        self.assertFalse(ClassSubjectGroup.objects.filter(academic_year=year, class_group__is_archived=True).exists())
+        self.assertTrue(ClassSubjectGroup.objects.filter(academic_year=year, class_group__is_archived=False).exists())
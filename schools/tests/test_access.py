@@ -0,0 +1,92 @@
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from schools.models import ClassGroup, School, Student, Teacher
+from schools.synthetic import generate_district
+
+class SchoolOwnerAccessTest(TestCase):
+    """Отдел образования видит только школы своего района"""
+
+    @classmethod
+    def setUpTestData(cls):
+        caches['default'].clear()
+        generate_district(prefix='access', depts=2, schools_per_dept=1, classes_per_school=1,
+                          students_per_class=2, teachers_per_school=2, subjects=2, seed=1)
+        cls.school = School.objects.get(education_dept__email='access-dept1@district.test')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def url(self, action, school_id=None):
+        return reverse(f'schools:education_dept-school-{action}', kwargs={'school_id': school_id or self.school.id})
+
+    def test_owner_sees_school(self):
+        self.client.login(email='access-dept1@district.test', password='password')
+        self.assertEqual(self.client.get(self.url('detail')).status_code, 200)
+        self.assertEqual(self.client.get(self.url('update')).status_code, 200)
+
+    def test_other_district_is_denied(self):
+        self.client.login(email='access-dept2@district.test', password='password')
+        self.assertEqual(self.client.get(self.url('detail')).status_code, 403)
+        self.assertEqual(self.client.get(self.url('update')).status_code, 403)
+        self.assertEqual(self.client.post(self.url('update'), {'name': 'Чужая'}).status_code, 403)
+        self.assertEqual(self.client.post(self.url('delete')).status_code, 403)
+        self.school.refresh_from_db()
+        self.assertNotEqual(self.school.name, 'Чужая')
+
+    def test_missing_school_is_not_found(self):
+        self.client.login(email='access-dept1@district.test', password='password')
+        missing = School.objects.order_by('-id').first().id + 1
+        self.assertEqual(self.client.get(self.url('detail', missing)).status_code, 404)
+
+class SchoolAdminObjectAccessTest(TestCase):
+    """Администратор школы не открывает и не меняет классы, учащихся и
+    учителей другой школы того же района"""
+
+    @classmethod
+    def setUpTestData(cls):
+        caches['default'].clear()
+        generate_district(prefix='scope', schools_per_dept=2, classes_per_school=1,
+                          students_per_class=2, teachers_per_school=2, subjects=2, seed=1)
+        school = School.objects.get(admins__email='scope-admin1-1@district.test')
+        cls.class_group = ClassGroup.objects.filter(school=school).first()
+        cls.student = Student.objects.filter(class_group=cls.class_group).first()
+        cls.teacher = Teacher.objects.filter(school=school).first()
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def url(self, kind, action, pk):
+        return reverse(f'schools:school_admin-{kind}-{action}', kwargs={f'{kind}_id': pk})
+
+    def objects(self):
+        return [('class', self.class_group), ('student', self.student), ('teacher', self.teacher)]
+
+    def test_other_school_admin_is_denied(self):
+        self.client.login(email='scope-admin1-2@district.test', password='password')
+        for kind, obj in self.objects():
+            for action in ('detail', 'update', 'delete'):
+                with self.subTest(kind=kind, action=action):
+                    self.assertEqual(self.client.get(self.url(kind, action, obj.pk)).status_code, 403)
+            with self.subTest(kind=kind, action='delete', method='post'):
+                self.assertEqual(self.client.post(self.url(kind, 'delete', obj.pk)).status_code, 403)
+                self.assertTrue(type(obj).objects.filter(pk=obj.pk).exists())
+
+    def test_missing_object_is_not_found(self):
+        self.client.login(email='scope-admin1-1@district.test', password='password')
+        for kind, obj in self.objects():
+            missing = type(obj).objects.order_by('-id').first().id + 1
+            with self.subTest(kind=kind):
+                self.assertEqual(self.client.get(self.url(kind, 'update', missing)).status_code, 404)
+
+    def test_owner_has_access(self):
+        self.client.login(email='scope-admin1-1@district.test', password='password')
+        self.assertEqual(self.client.get(self.url('student', 'detail', self.student.pk)).status_code, 200)
+        for kind, obj in self.objects():
+            with self.subTest(kind=kind):
+                self.assertEqual(self.client.get(self.url(kind, 'update', obj.pk)).status_code, 200)
+
+        self.assertEqual(self.client.post(self.url('student', 'delete', self.student.pk)).status_code, 302)
+        self.assertFalse(Student.objects.filter(pk=self.student.pk).exists())
+        self.assertEqual(self.client.post(self.url('teacher', 'delete', self.teacher.pk)).status_code, 302)
+        self.assertFalse(Teacher.objects.filter(pk=self.teacher.pk).exists())
@@ -0,0 +1,51 @@
+import json
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from schools.models import ClassGroup, ClassSubjectGroup, Grade
+from schools.synthetic import generate_district
+
+class GradeJournalCellsTest(TestCase):
+    """Некорректные изменения ячеек отклоняются с 400 и не меняют оценки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_district(prefix='cells', schools_per_dept=1, classes_per_school=1,
+                          students_per_class=3, teachers_per_school=3, subjects=4, seed=1)
+        cls.class_group = ClassGroup.objects.get(school__admins__email='cells-admin1-1@district.test')
+        cls.student = cls.class_group.students.first()
+        cls.subject_id = ClassSubjectGroup.objects.filter(class_group=cls.class_group).values_list(
+            'subject_id', flat=True
+        ).first()
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.login(email='cells-admin1-1@district.test', password='password')
+        self.url = reverse('schools:school_admin-grade-journal-cells', kwargs={'class_id': self.class_group.id})
+        Grade.objects.update_or_create(
+            student=self.student, subject_id=self.subject_id, quarter='q1', defaults={'grade': 7}
+        )
+
+    def patch(self, change):
+        change = {'student': self.student.id, 'subject': self.subject_id, 'quarter': 'q1', **change}
+        return self.client.patch(self.url, json.dumps({'changes': [change]}), content_type='application/json')
+
+    def stored_grade(self):
+        return Grade.objects.get(student=self.student, subject_id=self.subject_id, quarter='q1').grade
+
+    def test_missing_grade_key_is_rejected(self):
+        response = self.patch({})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_grade(), 7)
+
+    def test_unicode_digits_are_rejected(self):
+        for grade in ('²', '٣', '８'):
+            response = self.patch({'grade': grade})
+            self.assertEqual(response.status_code, 400, grade)
+        self.assertEqual(self.stored_grade(), 7)
+
+    def test_valid_grade_and_explicit_delete(self):
+        self.assertEqual(self.patch({'grade': ' 9 '}).status_code, 200)
+        self.assertEqual(self.stored_grade(), 9)
+        self.assertEqual(self.patch({'grade': None}).status_code, 200)
+        self.assertFalse(Grade.objects.filter(student=self.student, subject_id=self.subject_id, quarter='q1').exists())
@@ -0,0 +1,78 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from schools.journal import ERROR_CLASS, grade_field_name
+from schools.models import ClassGroup, ClassSubjectGroup, Grade
+from schools.synthetic import generate_district
+from schools.views import GradeJournalView
+
+class GradeJournalQueryCountTest(TestCase):
+    """Журнал класса стоит одинакового числа запросов при любом размере класса"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for prefix, students in (('small', 3), ('large', 30)):
+            generate_district(prefix=prefix, schools_per_dept=1, classes_per_school=1,
+                              students_per_class=students, teachers_per_school=3, subjects=6, seed=1)
+
+    def setUp(self):
+        # Пользователь сессии и статистика кэшируются между тестами по id
+        caches['default'].clear()
+
+    def journal_queries(self, prefix):
+        class_group = ClassGroup.objects.get(school__admins__email=f'{prefix}-admin1-1@district.test')
+        self.client.login(email=f'{prefix}-admin1-1@district.test', password='password')
+        url = reverse('schools:school_admin-grade-journal', kwargs={'class_id': class_group.id})
+        # Первый запрос заполняет кэши пользователя и активного года
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b'data-student-id='), class_group.students.count())
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_class_size(self):
+        small = self.journal_queries('small')
+        large = self.journal_queries('large')
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, GradeJournalView.query_budget)
+
+class GradeJournalPostTest(TestCase):
+    """Неверные ячейки формы журнала подсвечиваются, оценки не меняются"""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_district(prefix='post', schools_per_dept=1, classes_per_school=1,
+                          students_per_class=3, teachers_per_school=3, subjects=4, seed=1)
+        cls.class_group = ClassGroup.objects.get(school__admins__email='post-admin1-1@district.test')
+        cls.student = cls.class_group.students.first()
+        cls.subject_id = ClassSubjectGroup.objects.filter(class_group=cls.class_group).values_list(
+            'subject_id', flat=True
+        ).first()
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.login(email='post-admin1-1@district.test', password='password')
+        self.url = reverse('schools:school_admin-grade-journal', kwargs={'class_id': self.class_group.id})
+        self.field = grade_field_name(self.student.id, self.subject_id, 'q1')
+
+    def stored_grades(self):
+        return list(Grade.objects.filter(
+            student=self.student, subject_id=self.subject_id, quarter='q1'
+        ).values_list('grade', flat=True))
+
+    def test_unicode_digits_are_highlighted(self):
+        before = self.stored_grades()
+        for raw in ('²', '٣', '11'):
+            response = self.client.post(self.url, {self.field: raw})
+            self.assertEqual(response.status_code, 200, raw)
+            self.assertIn(f'name="{self.field}" class="grade-input form-control form-control-sm '
+                          f'border-0 rounded-0{ERROR_CLASS}"', response.content.decode())
+        self.assertEqual(self.stored_grades(), before)
+
+    def test_valid_grade_is_saved(self):
+        response = self.client.post(self.url, {self.field: '8'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stored_grades(), [8])
@@ -0,0 +1,93 @@
+from collections import Counter
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from schools.memberships import fill_single_groups, set_group_members
+from schools.models import ClassGroup, ClassSubjectGroup, StudentSubjectGroup
+from schools.synthetic import generate_district
+
+def memberships(group_ids):
+    return {
+        (group_id, student_id): membership_id
+        for membership_id, group_id, student_id in StudentSubjectGroup.objects.filter(
+            subject_group_id__in=group_ids
+        ).values_list('id', 'subject_group_id', 'student_id')
+    }
+
+class GroupMembershipTest(TestCase):
+    """Составы групп пишутся разницей: неизменные записи остаются на месте"""
+
+    @classmethod
+    def setUpTestData(cls):
+        caches['default'].clear()
+        generate_district(prefix='members', schools_per_dept=1, classes_per_school=1,
+                          students_per_class=6, teachers_per_school=3, subjects=3, split_subjects=1, seed=1)
+        cls.class_group = ClassGroup.objects.get(school__admins__email='members-admin1-1@district.test')
+        counts = Counter(ClassSubjectGroup.objects.filter(class_group=cls.class_group).values_list('subject_id', flat=True))
+        cls.subject_id = next(subject_id for subject_id, count in counts.items() if count == 2)
+        cls.first, cls.second = ClassSubjectGroup.objects.filter(
+            class_group=cls.class_group, subject_id=cls.subject_id
+        ).order_by('group_number', 'id').values_list('id', flat=True)
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def members(self, group_id):
+        return set(StudentSubjectGroup.objects.filter(subject_group_id=group_id).values_list('student_id', flat=True))
+
+    def test_move_between_subgroups_writes_only_the_difference(self):
+        first, second = self.members(self.first), self.members(self.second)
+        moved = min(first)
+        before = memberships([self.first, self.second])
+
+        result = set_group_members({self.first: first - {moved}, self.second: second | {moved}})
+
+        self.assertEqual(result, {'added': 1, 'removed': 1})
+        after = memberships([self.first, self.second])
+        self.assertNotIn((self.first, moved), after)
+        self.assertIn((self.second, moved), after)
+        unchanged = {key: membership_id for key, membership_id in before.items() if key != (self.first, moved)}
+        self.assertEqual({key: after[key] for key in unchanged}, unchanged)
+        self.assertEqual(set_group_members({self.first: first - {moved}, self.second: second | {moved}}),
+                         {'added': 0, 'removed': 0})
+
+    def test_distribute_view_keeps_unchanged_memberships(self):
+        first, second = self.members(self.first), self.members(self.second)
+        moved = min(second)
+        before = memberships([self.first, self.second])
+        others = StudentSubjectGroup.objects.exclude(subject_group_id__in=[self.first, self.second])
+        other_ids = set(others.values_list('id', flat=True))
+
+        self.client.login(email='members-admin1-1@district.test', password='password')
+        url = reverse('schools:school_admin-distribute-students',
+                      kwargs={'class_id': self.class_group.id, 'subject_id': self.subject_id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        initial = response.context['form'].fields['group_2_students'].initial
+        self.assertEqual({student.id for student in initial}, second)
+
+        response = self.client.post(url, {
+            'group_1_students': sorted(first | {moved}),
+            'group_2_students': sorted(second - {moved}),
+        })
+        self.assertEqual(response.status_code, 302)
+
+        after = memberships([self.first, self.second])
+        self.assertEqual(set(after), set(before) - {(self.second, moved)} | {(self.first, moved)})
+        for key, membership_id in before.items():
+            if key != (self.second, moved):
+                self.assertEqual(after[key], membership_id)
+        self.assertEqual(set(others.values_list('id', flat=True)), other_ids)
+
+    def test_fill_single_groups_skips_existing_members(self):
+        single = ClassSubjectGroup.objects.filter(class_group=self.class_group).exclude(subject_id=self.subject_id)
+        group_ids = list(single.values_list('id', flat=True))
+        before = memberships(group_ids)
+        removed = next(iter(before))
+        StudentSubjectGroup.objects.filter(id=before.pop(removed)).delete()
+
+        fill_single_groups([self.class_group.id])
+
+        after = memberships(group_ids)
+        self.assertEqual(set(after), set(before) | {removed})
+        self.assertEqual({key: after[key] for key in before}, before)
@@ -0,0 +1,85 @@
+import datetime
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from schools.models import AuditLog, User
+from schools.pagination import KeysetPaginator, decode_cursor, encode_cursor
+from schools.views import SuperuserUserListView
+
+def walk(paginator, cursor=None, direction='next_cursor'):
+    """Пройти все страницы по курсорам в одну сторону; возвращает страницы в порядке обхода"""
+    pages = []
+    while True:
+        page = paginator.page(decode_cursor(cursor))
+        pages.append(page)
+        cursor = getattr(page, direction)
+        if cursor is None:
+            return pages
+
+def ids(pages):
+    return [obj.id for page in pages for obj in page]
+
+def create_users():
+    for index in range(11):
+        User.objects.create_user(f'keyset{index}@district.test', last_name=['Иванов', 'Петров', 'Сидоров'][index % 3],
+                                 role='school_admin' if index % 2 else 'education_dept')
+
+class KeysetPaginatorTest(TestCase):
+    """Курсоры не пропускают и не повторяют строки при совпадающих ключах сортировки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_users()
+
+    def test_duplicate_last_names_forward_and_back(self):
+        users = User.objects.filter(email__startswith='keyset')
+        expected = list(users.order_by('last_name', 'id').values_list('id', flat=True))
+        paginator = KeysetPaginator(users, ('last_name', 'id'), per_page=2)
+
+        pages = walk(paginator)
+        self.assertEqual(len(pages), 6)
+        self.assertEqual(ids(pages), expected)
+
+        back = walk(paginator, pages[-1].previous_cursor, 'previous_cursor')
+        self.assertEqual(ids(reversed(back)), expected[:-1])
+
+    def test_microsecond_timestamps(self):
+        created_at = timezone.now().replace(microsecond=123000)
+        for offset in range(5):
+            log = AuditLog.objects.create(action='login', model_name='User')
+            # Пять записей одной миллисекунды и две с одинаковым временем
+            AuditLog.objects.filter(pk=log.pk).update(
+                created_at=created_at + datetime.timedelta(microseconds=min(offset, 3) * 100)
+            )
+        logs = AuditLog.objects.all()
+        expected = list(logs.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids(walk(KeysetPaginator(logs, ('-created_at', '-id'), per_page=1))), expected)
+
+    def test_broken_cursor_is_the_first_page(self):
+        self.assertIsNone(decode_cursor('not a cursor'))
+        self.assertIsNone(decode_cursor(encode_cursor(None)))
+
+class KeysetPaginationViewTest(TestCase):
+    """Фильтр списка пользователей сохраняется в курсоре"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_users()
+        User.objects.create_superuser('keyset-root@district.test', 'password')
+
+    def test_filter_is_carried_in_the_cursor(self):
+        self.client.login(email='keyset-root@district.test', password='password')
+        url = reverse('schools:superuser-user-list')
+        found = []
+        with mock.patch.object(SuperuserUserListView, 'paginate_by', 2):
+            data = self.client.get(url, {'role': 'school_admin', 'format': 'json'}).json()
+            while True:
+                found += [row['id'] for row in data['results']]
+                self.assertEqual({row['role'] for row in data['results']}, {'school_admin'})
+                if not data['next_cursor']:
+                    break
+                # Переход по курсору без параметра role
+                data = self.client.get(url, {'cursor': data['next_cursor'], 'format': 'json'}).json()
+        expected = User.objects.filter(role='school_admin').order_by('last_name', 'id')
+        self.assertEqual(found, list(expected.values_list('id', flat=True)))
@@ -0,0 +1,76 @@
+from unittest import mock
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from schools.audit import get_audit_settings
+from schools.models import ClassGroup
+from schools.query_budget import QueryBudgetExceeded, QueryBudgetReport, get_query_budget_settings
+from schools.synthetic import generate_district
+from schools.testing import QueryBudgetTestMixin
+from schools.views import GradeJournalView
+
+def run_queries(report, statements):
+    for sql in statements:
+        report(lambda sql, params, many, context: None, sql, (), False, {})
+
+class QueryBudgetReportTest(SimpleTestCase):
+    def test_counts_queries_against_budget(self):
+        report = QueryBudgetReport(url_name='page', budget=2)
+        run_queries(report, ['SELECT 1', 'SELECT 2'])
+        self.assertEqual(report.count, 2)
+        self.assertEqual(report.violations, [])
+        run_queries(report, ['SELECT 3'])
+        self.assertTrue(report.over_budget)
+        self.assertEqual(report.violations, ['3 queries, budget 2'])
+
+    def test_repeated_query_is_suspected_n_plus_one(self):
+        report = QueryBudgetReport(url_name='page', budget=100, repeat_threshold=3)
+        run_queries(report, ['SELECT grade'] * 3 + ['SELECT 1'])
+        self.assertFalse(report.over_budget)
+        [(sql, count, call_site)] = report.suspected_n_plus_one
+        self.assertEqual((sql, count), ('SELECT grade', 3))
+        self.assertIn('test_query_budget.py', call_site)
+        self.assertEqual(len(report.violations), 1)
+
+    def test_no_budget_disables_checks(self):
+        report = QueryBudgetReport(url_name='export', budget=None, repeat_threshold=2)
+        run_queries(report, ['SELECT grade'] * 10)
+        self.assertEqual(report.violations, [])
+
+class TestSettingsTest(SimpleTestCase):
+    """Тестовый раннер включает test_settings() независимо от аргументов командной строки"""
+
+    def test_budget_raises_and_audit_is_synchronous(self):
+        self.assertTrue(get_query_budget_settings()['RAISE'])
+        self.assertFalse(get_audit_settings()['ASYNC'])
+
+class QueryBudgetMiddlewareTest(QueryBudgetTestMixin, TestCase):
+    """Бюджет страницы проверяется на настоящем запросе тестового клиента"""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_district(prefix='budget', schools_per_dept=1, classes_per_school=1,
+                          students_per_class=5, teachers_per_school=3, subjects=4, seed=1)
+        cls.class_group = ClassGroup.objects.get(school__admins__email='budget-admin1-1@district.test')
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.login(email='budget-admin1-1@district.test', password='password')
+        self.url = reverse('schools:school_admin-grade-journal', kwargs={'class_id': self.class_group.id})
+
+    def test_journal_is_within_budget(self):
+        report = self.assertWithinQueryBudget(self.client.get(self.url))
+        self.assertEqual(report.budget, GradeJournalView.query_budget)
+        self.assertEqual(report.url_name, 'schools:school_admin-grade-journal')
+
+    @override_settings(QUERY_BUDGET={'RAISE': False})
+    def test_assertion_fails_over_explicit_limit(self):
+        response = self.client.get(self.url)
+        with self.assertRaises(self.failureException):
+            self.assertWithinQueryBudget(response, max_queries=1)
+
+    @override_settings(QUERY_BUDGET={'RAISE': True})
+    def test_over_budget_raises_in_tests(self):
+        with mock.patch.object(GradeJournalView, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(self.url)
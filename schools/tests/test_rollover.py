@@ -0,0 +1,90 @@
+from django.core.cache import caches
+from django.test import TestCase
+from schools.models import ClassGradeAggregate, ClassGroup, School, Student
+from schools.rollover import execute_rollover, plan_rollover
+from schools.synthetic import generate_district
+
+class RolloverTest(TestCase):
+    """Перевод классов за один год выполняется только один раз"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Активный год предыдущих тестов откатан вместе с их транзакцией
+        caches['default'].clear()
+        generate_district(prefix='rollover', schools_per_dept=1, classes_per_school=1,
+                          students_per_class=2, teachers_per_school=2, subjects=2, seed=1)
+        cls.school = School.objects.get(education_dept__email='rollover-dept1@district.test')
+
+    def class_names(self):
+        return sorted(ClassGroup.objects.filter(school=self.school).values_list('name', flat=True))
+
+    def test_second_rollover_for_the_same_year_is_refused(self):
+        totals = execute_rollover(plan_rollover([self.school], year=2030))
+        self.assertEqual(totals['schools'], 1)
+        self.school.refresh_from_db()
+        self.assertEqual(self.school.last_rollover_year, 2030)
+        names = self.class_names()
+
+        [plan] = plan_rollover([self.school], year=2030)
+        self.assertEqual(plan.errors, ['классы уже переведены за 2030 год'])
+        self.assertEqual(execute_rollover([plan])['schools'], 0)
+        self.assertEqual(self.class_names(), names)
+
+    def test_run_that_lost_the_race_changes_nothing(self):
+        plans = plan_rollover([self.school], year=2030)
+        names = self.class_names()
+        School.objects.filter(pk=self.school.pk).update(last_rollover_year=2030)
+        self.assertEqual(execute_rollover(plans)['schools'], 0)
+        self.assertEqual(plans[0].errors, ['классы уже переведены за 2030 год'])
+        self.assertEqual(self.class_names(), names)
+
+class RolloverRenameTest(TestCase):
+    """Классы переименовываются на месте: «5А» становится «6А» вместе с учащимися
+    и агрегатами, выпускной класс уходит в архив, первые классы создаются заново"""
+
+    @classmethod
+    def setUpTestData(cls):
+        caches['default'].clear()
+        # Все параллели школы: «5А» переходит в уже существующий «6А»
+        generate_district(prefix='promote', schools_per_dept=1, classes_per_school=11,
+                          students_per_class=2, teachers_per_school=2, subjects=2, seed=1)
+        cls.school = School.objects.get(education_dept__email='promote-dept1@district.test')
+
+    def snapshot(self):
+        classes = {row[0]: row[1:] for row in ClassGroup.objects.filter(school=self.school)
+                   .values_list('id', 'name', 'is_archived')}
+        students = {class_id: set(Student.objects.filter(class_group_id=class_id).values_list('id', flat=True))
+                    for class_id in classes}
+        aggregates = sorted(ClassGradeAggregate.objects.filter(class_group__school=self.school)
+                            .values_list('class_group_id', 'quarter', 'grade_sum', 'grade_count'))
+        return classes, students, aggregates
+
+    def test_classes_are_renamed_in_place(self):
+        graduation = self.school.graduation_class
+        classes, students, aggregates = self.snapshot()
+        ids = {name: class_id for class_id, (name, _) in classes.items()}
+        self.assertIn('6А', ids)
+
+        totals = execute_rollover(plan_rollover([self.school], year=2030))
+        self.assertEqual(totals['graduated'], 1)
+        self.assertEqual(totals['promoted'], len(classes) - 1)
+        after, after_students, after_aggregates = self.snapshot()
+
+        self.assertEqual(after[ids['5А']], ('6А', False))
+        self.assertEqual(after[ids['6А']], ('7А', False))
+        self.assertEqual(after[ids[f'{graduation}А']], (f'{graduation}А (выпуск 2030)', True))
+        # Учащиеся и агрегаты остаются у тех же классов
+        for class_id in classes:
+            self.assertEqual(after_students[class_id], students[class_id])
+        self.assertEqual(after_aggregates, aggregates)
+
+        first_classes = {class_id: name for class_id, (name, _) in after.items() if class_id not in classes}
+        expected_first = {name for name in ids if name.startswith('1') and len(name) == 2}
+        self.assertEqual(set(first_classes.values()), expected_first)
+        for class_id in first_classes:
+            self.assertEqual(after_students[class_id], set())
+            self.assertFalse(after[class_id][1])
+
+        promoted = {f'{int(name[:-1]) + 1}{name[-1]}' for name in ids if name != f'{graduation}А'}
+        active = {name for name, archived in after.values() if not archived}
+        self.assertEqual(active, promoted | expected_first)
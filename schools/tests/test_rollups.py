@@ -0,0 +1,81 @@
+from django.core.cache import caches
+from django.db.models import Count, Sum
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from schools.models import (
+    ClassGradeAggregate, ClassGroup, Grade, School, SchoolGradeAggregate, Student,
+    StudentGradeAggregate, Subject
+)
+from schools.synthetic import generate_district
+
+LEVELS = [
+    (StudentGradeAggregate, 'student_id', 'student_id'),
+    (ClassGradeAggregate, 'class_group_id', 'student__class_group_id'),
+    (SchoolGradeAggregate, 'school_id', 'student__class_group__school_id'),
+]
+
+class RollupConsistencyTest(TestCase):
+    """Агрегаты учащихся, классов и школ совпадают с таблицей Grade после
+    сохранения, удаления оценок и перевода учащегося в другой класс"""
+
+    @classmethod
+    def setUpTestData(cls):
+        caches['default'].clear()
+        generate_district(prefix='rollup', schools_per_dept=2, classes_per_school=2,
+                          students_per_class=3, teachers_per_school=2, subjects=3, seed=1)
+        cls.school = School.objects.filter(education_dept__email='rollup-dept1@district.test').first()
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def assertRollupsMatchGrades(self):
+        grades = Grade.objects.for_year().filter(grade__isnull=False)
+        for model, owner_field, grade_field in LEVELS:
+            expected = sorted(
+                (row[grade_field], row['quarter'], row['grade_sum'], row['grade_count'])
+                for row in grades.values(grade_field, 'quarter').annotate(
+                    grade_sum=Sum('grade'), grade_count=Count('grade')
+                )
+            )
+            actual = sorted(model.objects.filter(grade_count__gt=0).values_list(
+                owner_field, 'quarter', 'grade_sum', 'grade_count'
+            ))
+            self.assertEqual(actual, expected, model.__name__)
+
+    def test_generated_rollups_match(self):
+        self.assertRollupsMatchGrades()
+
+    def test_save_and_update(self):
+        grade = Grade.objects.for_year().filter(grade__isnull=False).first()
+        grade.grade = 10 if grade.grade != 10 else 1
+        grade.save()
+        self.assertRollupsMatchGrades()
+        student = Student.objects.filter(class_group__school=self.school).first()
+        Grade.objects.create(student=student, subject=Subject.objects.first(), quarter='exam', grade=7)
+        self.assertRollupsMatchGrades()
+
+    def test_instance_delete(self):
+        Grade.objects.for_year().filter(grade__isnull=False).first().delete()
+        self.assertRollupsMatchGrades()
+
+    def test_queryset_delete(self):
+        self.assertFalse(post_delete.has_listeners(Grade))
+        count, _ = Grade.objects.filter(student__class_group__school=self.school, quarter='q1').delete()
+        self.assertGreater(count, 1)
+        self.assertRollupsMatchGrades()
+
+    def test_cascade_delete(self):
+        Student.objects.filter(class_group__school=self.school).first().delete()
+        self.assertRollupsMatchGrades()
+        Subject.objects.first().delete()
+        self.assertRollupsMatchGrades()
+
+    def test_class_move(self):
+        student = Student.objects.filter(class_group__school=self.school).first()
+        for class_group in (
+            ClassGroup.objects.filter(school=self.school).exclude(pk=student.class_group_id).first(),
+            ClassGroup.objects.exclude(school=self.school).first(),
+        ):
+            student.class_group = class_group
+            student.save()
+            self.assertRollupsMatchGrades()
@@ -0,0 +1,121 @@
+import io
+from unittest import mock
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from openpyxl import Workbook
+from schools.models import ClassGroup, School, Student
+from schools import roster_import
+from schools.roster_import import import_roster
+from schools.synthetic import generate_district
+
+def csv_file(lines, delimiter=',', bom=False):
+    text = '\n'.join(delimiter.join(line) for line in lines) + '\n'
+    return io.BytesIO((('\ufeff' if bom else '') + text).encode('utf-8'))
+
+def xlsx_file(lines):
+    workbook = Workbook()
+    for line in lines:
+        workbook.active.append(line)
+    file = io.BytesIO()
+    workbook.save(file)
+    file.seek(0)
+    return file
+
+class RosterImportTest(TestCase):
+    """Импорт списка учащихся: разделители, BOM, новые классы, дубликаты и ошибки строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        caches['default'].clear()
+        generate_district(prefix='roster', schools_per_dept=2, classes_per_school=1,
+                          students_per_class=2, teachers_per_school=2, subjects=2, seed=1)
+        cls.school = School.objects.get(admins__email='roster-admin1-1@district.test')
+        cls.class_group = ClassGroup.objects.get(school=cls.school)
+        cls.existing = Student.objects.filter(class_group=cls.class_group).first()
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def roster(self):
+        existing = self.existing
+        return [
+            ['Класс', 'Фамилия', 'Имя', 'Отчество'],
+            [self.class_group.name, 'Иванов', 'Петр', 'Сергеевич'],
+            [self.class_group.name, existing.last_name, existing.first_name, existing.patronymic],
+            ['7Я', 'Смирнова', 'Анна', ''],
+            ['7Я', 'Смирнова', 'Анна', ''],
+            ['7Я', 'Котов', '', ''],
+            ['', '', '', ''],
+            ['7Я', 'Орлов', 'Илья', 'Ильич'],
+        ]
+
+    def assertImported(self, result):
+        self.assertEqual(result['rows'], 6)
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(result['duplicates'], 2)
+        self.assertEqual(result['invalid'], 1)
+        self.assertEqual(result['classes_created'], 1)
+        self.assertEqual(result['errors'], ['Строка 6: не заполнена колонка «имя»'])
+
+        new_class = ClassGroup.objects.get(school=self.school, name='7Я')
+        self.assertEqual(
+            sorted(Student.objects.filter(class_group=new_class).values_list('last_name', 'first_name', 'patronymic')),
+            [('Орлов', 'Илья', 'Ильич'), ('Смирнова', 'Анна', '')],
+        )
+        student = Student.objects.get(class_group=self.class_group, last_name='Иванов')
+        self.assertEqual((student.first_name, student.patronymic), ('Петр', 'Сергеевич'))
+        self.assertEqual(Student.objects.filter(
+            class_group=self.class_group, last_name=self.existing.last_name, first_name=self.existing.first_name
+        ).count(), 1)
+
+    def test_comma_csv_in_small_chunks(self):
+        # Пачки по две строки: дубликат «Смирновой» попадает в следующую пачку
+        result = import_roster(csv_file(self.roster()), 'roster.csv', school=self.school, chunk_size=2)
+        self.assertImported(result)
+
+    def test_semicolon_csv_with_bom_through_the_view(self):
+        self.client.login(email='roster-admin1-1@district.test', password='password')
+        upload = SimpleUploadedFile('roster.csv', csv_file(self.roster(), ';', bom=True).getvalue())
+        response = self.client.post(reverse('schools:school_admin-student-import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['import_errors'], ['Строка 6: не заполнена колонка «имя»'])
+        self.assertTrue(Student.objects.filter(class_group__school=self.school, last_name='Орлов').exists())
+
+    def test_xlsx(self):
+        self.assertImported(import_roster(xlsx_file(self.roster()), 'roster.xlsx', school=self.school))
+
+    def test_repeated_import_only_reports_duplicates(self):
+        import_roster(csv_file(self.roster()), 'roster.csv', school=self.school)
+        result = import_roster(csv_file(self.roster()), 'roster.csv', school=self.school)
+        self.assertEqual((result['created'], result['duplicates'], result['classes_created']), (0, 5, 0))
+
+    def test_failed_chunk_keeps_the_saved_ones(self):
+        # Вторая пачка падает после вставки: ее транзакция откатывается, первая остается
+        enroll = roster_import.enroll_in_single_groups
+        calls = []
+
+        def enroll_once(students):
+            calls.append(students)
+            if len(calls) > 1:
+                raise RuntimeError('сбой записи')
+            enroll(students)
+
+        with mock.patch.object(roster_import, 'enroll_in_single_groups', enroll_once):
+            with self.assertRaises(RuntimeError):
+                import_roster(csv_file(self.roster()), 'roster.csv', school=self.school, chunk_size=2)
+        names = set(Student.objects.filter(class_group__school=self.school).values_list('last_name', flat=True))
+        self.assertIn('Иванов', names)
+        self.assertNotIn('Смирнова', names)
+
+    def test_unknown_school_is_reported(self):
+        schools = School.objects.filter(education_dept__email='roster-dept1@district.test')
+        lines = [
+            ['Школа', 'Класс', 'Фамилия', 'Имя'],
+            [self.school.name, '7Я', 'Орлов', 'Илья'],
+            ['Школа №0', '7Я', 'Котов', 'Олег'],
+        ]
+        result = import_roster(csv_file(lines), 'roster.csv', schools=schools)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(result['errors'], ['Строка 3: школа «Школа №0» не найдена'])
@@ -9,6 +9,7 @@ superuser_patterns = [
     path('users/', views.SuperuserUserListView.as_view(), name='superuser-user-list'),
     path('users/add/', views.SuperuserAddUserView.as_view(), name='superuser-user-add'),
     path('logs/', views.SuperuserViewLogsView.as_view(), name='superuser-logs'),
+    path('profiler/', views.SuperuserProfilerView.as_view(), name='superuser-profiler'),
 ]
 
 # EDUCATION DEPARTMENT URLS
@@ -21,6 +22,8 @@ education_dept_patterns = [
     path('schools/<int:school_id>/', views.SchoolDetailView.as_view(), name='education_dept-school-detail'),
     path('schools/<int:school_id>/update/', views.SchoolUpdateView.as_view(), name='education_dept-school-update'),
     path('schools/<int:school_id>/delete/', views.SchoolDeleteView.as_view(), name='education_dept-school-delete'),
+    path('schools/<int:school_id>/export/', views.SchoolGradesExportView.as_view(), name='education_dept-school-export'),
+    path('export/', views.DistrictGradesExportView.as_view(), name='education_dept-export'),
     
     # Users
     path('users/', views.EducationDeptUserListView.as_view(), name='education_dept-user-list'),
@@ -52,6 +55,7 @@ school_admin_patterns = [
     # Students
     path('students/', views.StudentListView.as_view(), name='school_admin-student-list'),
     path('students/add/', views.StudentCreateView.as_view(), name='school_admin-student-create'),
+    path('students/import/', views.StudentImportView.as_view(), name='school_admin-student-import'),
     path('students/<int:student_id>/', views.StudentDetailView.as_view(), name='school_admin-student-detail'),
     path('students/<int:student_id>/update/', views.StudentUpdateView.as_view(), name='school_admin-student-update'),
     path('students/<int:student_id>/delete/', views.StudentDeleteView.as_view(), name='school_admin-student-delete'),
@@ -74,6 +78,9 @@ school_admin_patterns = [
     
     # Grade Journal
     path('classes/<int:class_id>/journal/', views.GradeJournalView.as_view(), name='school_admin-grade-journal'),
+    path('classes/<int:class_id>/journal/grades/', views.GradeJournalCellsView.as_view(), name='school_admin-grade-journal-cells'),
+    path('classes/<int:class_id>/journal/export/', views.GradeJournalExportView.as_view(), name='school_admin-grade-journal-export'),
+    path('export/', views.SchoolAdminGradesExportView.as_view(), name='school_admin-export'),
 ]
 
 # MAIN URL PATTERNS
@@ -1,22 +1,35 @@
 import logging
-from django.db.models import Avg, Count, Q
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from .models import Grade, ClassGroup, School, Student, AuditLog, User, Subject, Teacher
+from .models import (
+    Grade, ClassGroup, School, Student, AuditLog, User, Subject, Teacher,
+    StudentGradeAggregate, ClassGradeAggregate, SchoolGradeAggregate
+)
+from .analytics import analytics_reads, replica_cache_timeout
+from .audit import audit_writer
+from .grades import QUARTERS, load_grade_matrix
+from .log_reader import tail_log
+from .stats_cache import SYSTEM, get_or_compute, get_or_compute_many, scope_name
 
 logger = logging.getLogger('schools')
 
 def log_action(user, action, model_name, object_id=None, details=None, ip_address=None):
-    """Универсальная функция логирования действий"""
+    """Универсальная функция логирования действий
+    
+    Запись ставится в очередь фонового писателя (audit.py) и сохраняется
+    пакетом вне запроса; см. настройку AUDIT_LOG.
+    """
     try:
-        AuditLog.objects.create(
+        audit_writer.submit(AuditLog(
             actor=user,
             action=action,
             model_name=model_name,
             object_id=str(object_id) if object_id else '',
             details=details or '',
-            ip_address=ip_address
-        )
-        logger.info(f"Action logged: {user} {action} {model_name} {object_id}")
+            ip_address=ip_address,
+            created_at=timezone.now()
+        ))
     except Exception as e:
         logger.error(f"Failed to log action: {e}")
 
@@ -29,88 +42,124 @@ def get_user_school(user):
     except AttributeError:
         return None
 
-def get_student_average_by_quarter(student, quarter):
-    """Получить средний балл учащегося за четверть"""
-    if quarter not in ['q1', 'q2', 'q3', 'q4', 'exam', 'year', 'final']:
+def get_student_average_by_quarter(student, quarter, grade_matrix=None):
+    """Получить средний балл учащегося за четверть
+    
+    Если уже загружена матрица оценок (load_grade_matrix), средний балл
+    считается по ней без запроса к БД.
+    """
+    if quarter not in QUARTERS:
         raise ValueError("Invalid quarter")
     
-    average = Grade.objects.filter(
-        student=student,
-        quarter=quarter,
-        grade__isnull=False
-    ).aggregate(avg=Avg('grade'))['avg']
+    if grade_matrix is not None:
+        return grade_matrix.average(student.id, quarters={quarter})
     
-    return round(average, 2) if average else None
+    return StudentGradeAggregate.objects.filter(student=student, quarter=quarter).average()
+
+# Статистика считается по аналитической реплике (analytics.py), если она свежая.
+# Снимок отстает от основной БД до MAX_STALENESS, поэтому в кэше статистики
+# такая запись живет не дольше: иначе старые данные закрепились бы под новой версией.
 
 def get_class_average(class_obj):
-    """Получить средний балл класса (по четвертям)"""
-    students = class_obj.students.all()
-    if not students:
-        return 0
-    
-    average = Grade.objects.filter(
-        student__in=students,
-        quarter__in=['q1', 'q2', 'q3', 'q4'],
-        grade__isnull=False
-    ).aggregate(avg=Avg('grade'))['avg']
-    
-    return round(average, 2) if average else 0
+    """Получить средний балл класса (по четвертям); кэшируется, см. stats_cache.py"""
+    def compute():
+        return ClassGradeAggregate.objects.filter(
+            class_group=class_obj,
+            quarter__in=Grade.TERM_QUARTERS
+        ).average()
+    
+    return get_or_compute(scope_name('class', class_obj.id), analytics_reads()(compute), replica_cache_timeout()) or 0
 
+@analytics_reads()
 def get_school_average(school):
     """Получить средний балл школы"""
-    students = Student.objects.filter(class_group__school=school)
-    if not students:
-        return 0
-    
-    average = Grade.objects.filter(
-        student__in=students,
-        quarter__in=['q1', 'q2', 'q3', 'q4'],
-        grade__isnull=False
-    ).aggregate(avg=Avg('grade'))['avg']
+    average = SchoolGradeAggregate.objects.filter(
+        school=school,
+        quarter__in=Grade.TERM_QUARTERS
+    ).average()
     
-    return round(average, 2) if average else 0
+    return average or 0
 
 def calculate_statistics(school):
     """Расчет всей статистики по школе"""
-    classes = school.classes.all()
-    students = Student.objects.filter(class_group__school=school)
-    teachers = school.teachers.all()
+    return calculate_district_statistics([school])[school.id]
+
+def calculate_district_statistics(schools):
+    """Статистика сразу по нескольким школам (например, всем школам отдела образования).
     
-    class_count = classes.count()
-    student_count = students.count()
-    teacher_count = teachers.count()
+    Статистика каждой школы кэшируется отдельно (stats_cache.py): страница отдела
+    образования читает записи своих школ одним get_many, а устаревшие школы
+    пересчитываются вместе. Возвращает {school_id: статистика в формате calculate_statistics}.
+    """
+    scopes = {scope_name('school', school.id): school.id for school in schools}
+    
+    def compute(stale_scopes):
+        statistics = _compute_district_statistics([scopes[scope] for scope in stale_scopes])
+        return {scope: statistics[scopes[scope]] for scope in stale_scopes}
     
-    average_grade = Grade.objects.filter(
-        student__in=students,
-        quarter__in=['q1', 'q2', 'q3', 'q4'],
-        grade__isnull=False
-    ).aggregate(avg=Avg('grade'))['avg']
+    cached = get_or_compute_many(list(scopes), analytics_reads()(compute), replica_cache_timeout())
+    return {school_id: cached[scope] for scope, school_id in scopes.items()}
+
+def _compute_district_statistics(school_ids):
+    """Статистика школ фиксированным числом сгруппированных запросов независимо
+    от количества школ и классов"""
+    
+    classes = ClassGroup.objects.filter(school_id__in=school_ids).active().annotate(
+        student_count=Count('students')
+    )
+    teacher_counts = dict(
+        Teacher.objects.filter(school_id__in=school_ids).values('school_id').annotate(
+            count=Count('id')
+        ).values_list('school_id', 'count')
+    )
+    class_averages = _aggregate_averages(
+        ClassGradeAggregate.objects.filter(class_group__school_id__in=school_ids), 'class_group_id'
+    )
+    school_averages = _aggregate_averages(
+        SchoolGradeAggregate.objects.filter(school_id__in=school_ids), 'school_id'
+    )
+    
+    statistics = {
+        school_id: {
+            'class_count': 0,
+            'student_count': 0,
+            'teacher_count': teacher_counts.get(school_id, 0),
+            'average_grade': school_averages.get(school_id) or 0,
+            'class_statistics': []
+        }
+        for school_id in school_ids
+    }
     
-    class_stats = []
     for class_obj in classes:
-        class_students = class_obj.students.count()
-        if class_students > 0:
-            class_avg = get_class_average(class_obj)
-            class_stats.append({
+        school_stats = statistics[class_obj.school_id]
+        school_stats['class_count'] += 1
+        school_stats['student_count'] += class_obj.student_count
+        if class_obj.student_count > 0:
+            school_stats['class_statistics'].append({
                 'class': class_obj,
-                'student_count': class_students,
-                'average_grade': class_avg
+                'student_count': class_obj.student_count,
+                'average_grade': class_averages.get(class_obj.id) or 0
             })
     
+    return statistics
+
+def _aggregate_averages(aggregates, owner_field):
+    """Средние баллы за четверти по строкам агрегатов, сгруппированные по владельцу"""
+    rows = aggregates.filter(quarter__in=Grade.TERM_QUARTERS).values(owner_field).annotate(
+        total=Sum('grade_sum'), number=Sum('grade_count')
+    ).values_list(owner_field, 'total', 'number')
     return {
-        'class_count': class_count,
-        'student_count': student_count,
-        'teacher_count': teacher_count,
-        'average_grade': round(average_grade, 2) if average_grade else 0,
-        'class_statistics': class_stats
+        owner_id: round(total / number, 2)
+        for owner_id, total, number in rows
+        if number
     }
 
 def get_class_subject_groups(class_obj):
-    """Получить все назначения предметов для класса с информацией о подгруппах"""
+    """Получить назначения предметов класса в активном учебном году с информацией о подгруппах"""
     from .models import ClassSubjectGroup
     
     subject_assignments = {}
-    assignments = ClassSubjectGroup.objects.filter(class_group=class_obj).select_related('subject', 'teacher')
+    assignments = ClassSubjectGroup.objects.for_year().filter(class_group=class_obj).select_related('subject', 'teacher')
     
     for assignment in assignments:
         subject_id = assignment.subject_id
@@ -130,10 +179,10 @@ def get_class_subject_groups(class_obj):
     return subject_assignments
 
 def get_teacher_assignments(teacher):
-    """Получить все назначения учителя с детализацией по классам"""
+    """Получить назначения учителя в активном учебном году с детализацией по классам"""
     from .models import ClassSubjectGroup
     
-    assignments = ClassSubjectGroup.objects.filter(teacher=teacher).select_related('class_group', 'subject')
+    assignments = ClassSubjectGroup.objects.for_year().filter(teacher=teacher).select_related('class_group', 'subject')
     
     result = {}
     for assignment in assignments:
@@ -155,31 +204,27 @@ def get_teacher_assignments(teacher):
 
 def calculate_student_averages(student):
     """Пересчитать все средние баллы учащегося"""
-    quarters = ['q1', 'q2', 'q3', 'q4', 'exam', 'year', 'final']
-    
-    results = {}
-    for quarter in quarters:
-        results[quarter] = get_student_average_by_quarter(student, quarter)
-    
-    return results
+    return load_grade_matrix([student]).quarter_averages(student.id)
 
 def get_system_statistics():
-    """Получить глобальную статистику системы (для суперпользователя)"""
+    """Получить глобальную статистику системы (для суперпользователя); кэшируется"""
+    return get_or_compute(SYSTEM, analytics_reads()(_compute_system_statistics), replica_cache_timeout())
+
+def _compute_system_statistics():
     from .models import School
     
     school_count = School.objects.count()
     user_count = User.objects.filter(is_superuser=False).count()
     
-    students = Student.objects.all()
+    students = Student.objects.filter(class_group__is_archived=False)
     student_count = students.count()
     
     teachers_count = Teacher.objects.count()
     subjects_count = Subject.objects.count()
     
-    average_grade = Grade.objects.filter(
-        quarter__in=['q1', 'q2', 'q3', 'q4'],
-        grade__isnull=False
-    ).aggregate(avg=Avg('grade'))['avg']
+    average_grade = SchoolGradeAggregate.objects.filter(
+        quarter__in=Grade.TERM_QUARTERS
+    ).average()
     
     return {
         'school_count': school_count,
@@ -187,40 +232,18 @@ def get_system_statistics():
         'student_count': student_count,
         'teacher_count': teachers_count,
         'subject_count': subjects_count,
-        'average_grade': round(average_grade, 2) if average_grade else 0
+        'average_grade': average_grade or 0
     }
 
-def parse_log_file(limit=100, search_term=None):
+def parse_log_file(limit=100, search_term=None, date_from=None, date_to=None):
     """Парсинг лог-файла для отображения в веб-интерфейсе"""
     import os
-    from datetime import datetime
     
     log_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs', 'app.log')
     
-    if not os.path.exists(log_file_path):
-        return []
-    
     try:
-        with open(log_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        logs = []
-        for line in lines[-limit:]:
-            if search_term and search_term.lower() not in line.lower():
-                continue
-            
-            try:
-                parts = line.strip().split(' ', 3)
-                if len(parts) >= 4:
-                    logs.append({
-                        'level': parts[0],
-                        'timestamp': parts[1] + ' ' + parts[2],
-                        'message': parts[3]
-                    })
-            except (IndexError, ValueError):
-                continue
-        
-        return list(reversed(logs))
+        return tail_log(log_file_path, limit=limit, search_term=search_term,
+                        date_from=date_from, date_to=date_to)
     except Exception as e:
         logger.error(f"Error reading log file: {e}")
-        return []
\ No newline at end of file
+        return []
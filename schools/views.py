@@ -1,6 +1,7 @@
 import csv
 import json
 import logging
+from datetime import datetime, time, timedelta
 from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -10,15 +11,18 @@ from django.db.models import Avg, Count, Q, Prefetch
 from django.http import HttpResponse, JsonResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import (
     TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView,
-    FormView
+    FormView, View
 )
 from .mixins import (
     SuperuserRequiredMixin, EducationDeptRequiredMixin, SchoolAdminRequiredMixin,
     SchoolOwnerRequiredMixin, ClassOwnerRequiredMixin, StudentOwnerRequiredMixin, 
-    TeacherOwnerRequiredMixin
+    TeacherOwnerRequiredMixin, AssignmentOwnerRequiredMixin
 )
 from .models import (
     User, School, ClassGroup, Student, Teacher, Subject, 
@@ -27,20 +31,34 @@ from .models import (
 from .forms import (
     SchoolForm, UserForm, UserChangePasswordForm, SubjectForm, ClassForm,
     StudentForm, TeacherForm, AssignTeacherToSubjectForm, 
-    DistributeStudentsToSubgroupsForm, AssignTeacherToGroupForm, GradeJournalForm
+    DistributeStudentsToSubgroupsForm, AssignTeacherToGroupForm,
+    RosterImportForm
 )
 from .utils import (
     log_action, get_student_average_by_quarter, get_class_average, 
-    get_school_average, calculate_statistics, get_user_school, 
+    get_school_average, calculate_statistics, calculate_district_statistics, get_user_school, 
     get_system_statistics, get_class_subject_groups, get_teacher_assignments,
     parse_log_file
 )
+from .search import search_people
+from .pagination import KeysetPaginationMixin
+from .roster_import import import_roster, describe_import
+from .exports import export_response, journal_rows, grade_rows
+from .analytics import analytics_iter
+from .academic_years import get_active_year_id
+from .memberships import set_group_members, fill_single_groups, enroll_in_single_groups
+from .profiling import get_profiler_settings, profile_store
+from .journal import parse_journal_post, render_journal_rows
+from .grades import (
+    QUARTERS, TERM_QUARTERS, JournalSnapshot, save_grade_matrix, load_grade_matrix, save_grade_cells
+)
 
 logger = logging.getLogger('schools')
 
 # ==================== SUPERUSER VIEWS ====================
 
 class SuperuserDashboardView(SuperuserRequiredMixin, TemplateView):
+    query_budget = 10
     template_name = 'schools/superuser/dashboard.html'
     
     def get_context_data(self, **kwargs):
@@ -76,68 +94,143 @@ class SuperuserAddUserView(SuperuserRequiredMixin, CreateView):
         
         return super().form_valid(form)
 
-class SuperuserUserListView(SuperuserRequiredMixin, ListView):
+class SuperuserUserListView(SuperuserRequiredMixin, KeysetPaginationMixin, ListView):
+    query_budget = 6
     model = User
     template_name = 'schools/superuser/user_list.html'
     context_object_name = 'users'
+    keyset_ordering = ('last_name', 'id')
+    keyset_filter_params = ('role',)
+    json_fields = ('id', 'email', 'last_name', 'first_name', 'patronymic', 'role')
     
     def get_queryset(self):
-        return User.objects.exclude(id=self.request.user.id).select_related()
+        users = User.objects.exclude(id=self.request.user.id).select_related('school')
+        role_filter = self.get_filter_params()['role']
+        if role_filter:
+            users = users.filter(role=role_filter)
+        return users
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        role_filter = self.request.GET.get('role', '')
-        if role_filter:
-            context['users'] = context['users'].filter(role=role_filter)
-        context['role_filter'] = role_filter
+        context['role_filter'] = self.get_filter_params()['role']
+        context['roles'] = User.ROLE_CHOICES
         return context
 
-class SuperuserViewLogsView(SuperuserRequiredMixin, TemplateView):
+class SuperuserViewLogsView(SuperuserRequiredMixin, KeysetPaginationMixin, ListView):
+    query_budget = 6
+    model = AuditLog
     template_name = 'schools/superuser/logs.html'
+    context_object_name = 'db_logs'
+    paginate_by = 100
+    keyset_ordering = ('-created_at', '-id')
+    keyset_filter_params = ('search', 'date')
+    
+    def get_log_date(self):
+        try:
+            return parse_date(self.get_filter_params()['date'])
+        except ValueError:
+            return None
+    
+    def get_queryset(self):
+        db_logs = AuditLog.objects.select_related('actor')
+        search = self.get_filter_params()['search']
+        if search:
+            db_logs = db_logs.filter(self.get_search_filter(search))
+        log_date = self.get_log_date()
+        if log_date:
+            # Диапазон вместо created_at__date, чтобы использовался индекс (created_at, id)
+            day_start = timezone.make_aware(datetime.combine(log_date, time.min))
+            db_logs = db_logs.filter(created_at__gte=day_start, created_at__lt=day_start + timedelta(days=1))
+        return db_logs
+    
+    def get_search_filter(self, search):
+        # Точное совпадение вместо icontains: LIKE '%...%' не использует
+        # индексы (action, created_at) и (model_name, created_at)
+        term = search.strip()
+        condition = Q(model_name=term)
+        actions = [
+            code for code, label in AuditLog.ACTION_CHOICES
+            if term.lower() in (code, str(label).lower())
+        ]
+        if actions:
+            condition |= Q(action__in=actions)
+        return condition
+    
+    def get_json_item(self, obj):
+        return {
+            'id': obj.id,
+            'created_at': obj.created_at,
+            'actor': str(obj.actor) if obj.actor else None,
+            'action': obj.action,
+            'model_name': obj.model_name,
+            'object_id': obj.object_id,
+            'details': obj.details,
+        }
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        search = self.request.GET.get('search', '')
+        filters = self.get_filter_params()
+        log_date = self.get_log_date()
         
-        # Парсим лог-файл
-        context['logs'] = parse_log_file(limit=100, search_term=search)
-        context['search'] = search
-        
-        # Также показываем логи из базы данных
-        db_logs = AuditLog.objects.select_related('actor').order_by('-created_at')
-        if search:
-            db_logs = db_logs.filter(Q(action__icontains=search) | Q(model_name__icontains=search))
-        context['db_logs'] = db_logs[:100]
+        # Читаем лог-файл с конца, при указанной дате — по индексу смещений
+        context['logs'] = parse_log_file(limit=100, search_term=filters['search'], date_from=log_date, date_to=log_date)
+        context['search'] = filters['search']
+        context['log_date'] = filters['date']
         
         return context
 
+class SuperuserProfilerView(SuperuserRequiredMixin, TemplateView):
+    query_budget = 4
+    template_name = 'schools/superuser/profiler.html'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        rows = profile_store.summary()
+        role = self.request.GET.get('role', '')
+        if role:
+            rows = [row for row in rows if row['role'] == role]
+        context['rows'] = rows
+        context['role_filter'] = role
+        context['roles'] = User.ROLE_CHOICES
+        context['profiler'] = get_profiler_settings()
+        return context
+    
+    def post(self, request, *args, **kwargs):
+        profile_store.clear()
+        messages.success(request, _('Замеры сброшены'))
+        return redirect('schools:superuser-profiler')
+
 # ==================== EDUCATION DEPARTMENT VIEWS ====================
 
 class EducationDeptDashboardView(EducationDeptRequiredMixin, TemplateView):
+    query_budget = 10
     template_name = 'schools/education_dept/dashboard.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        schools = School.objects.filter(education_dept=self.request.user).select_related()
+        schools = list(School.objects.filter(education_dept=self.request.user))
+        statistics = calculate_district_statistics(schools)
         
         school_stats = []
         for school in schools:
-            stats = calculate_statistics(school)
             school_stats.append({
                 'school': school,
-                'stats': stats
+                'stats': statistics[school.id]
             })
         
         context['school_stats'] = school_stats
         return context
 
 class SchoolListView(EducationDeptRequiredMixin, ListView):
+    query_budget = 8
     model = School
     template_name = 'schools/education_dept/school_list.html'
     context_object_name = 'schools'
     
     def get_queryset(self):
-        return School.objects.filter(education_dept=self.request.user).select_related()
+        return School.objects.filter(education_dept=self.request.user).annotate(
+            class_count=Count('classes', filter=Q(classes__is_archived=False))
+        )
 
 class SchoolCreateView(EducationDeptRequiredMixin, CreateView):
     model = School
@@ -154,7 +247,8 @@ class SchoolCreateView(EducationDeptRequiredMixin, CreateView):
         
         return redirect('schools:education_dept-school-list')
 
-class SchoolDetailView(EducationDeptRequiredMixin, DetailView):
+class SchoolDetailView(EducationDeptRequiredMixin, SchoolOwnerRequiredMixin, DetailView):
+    query_budget = 10
     model = School
     template_name = 'schools/education_dept/school_detail.html'
     context_object_name = 'school'
@@ -167,15 +261,18 @@ class SchoolDetailView(EducationDeptRequiredMixin, DetailView):
         stats = calculate_statistics(school)
         context['statistics'] = stats
         
-        classes = school.classes.annotate(
-            student_count=Count('students'),
-            average_grade=Avg('students__grades__grade', filter=Q(students__grades__quarter__in=['q1', 'q2', 'q3', 'q4']))
+        classes = school.classes.active().annotate(
+            student_count=Count('students', distinct=True),
+            average_grade=Avg('students__grades__grade', filter=Q(
+                students__grades__quarter__in=['q1', 'q2', 'q3', 'q4'],
+                students__grades__academic_year=get_active_year_id(),
+            ))
         )
         context['classes'] = classes
         
         return context
 
-class SchoolUpdateView(EducationDeptRequiredMixin, UpdateView):
+class SchoolUpdateView(EducationDeptRequiredMixin, SchoolOwnerRequiredMixin, UpdateView):
     model = School
     form_class = SchoolForm
     template_name = 'schools/education_dept/school_form.html'
@@ -192,7 +289,7 @@ class SchoolUpdateView(EducationDeptRequiredMixin, UpdateView):
         messages.success(self.request, _('Школа успешно обновлена'))
         return redirect('schools:education_dept-school-detail', school_id=school.id)
 
-class SchoolDeleteView(EducationDeptRequiredMixin, DeleteView):
+class SchoolDeleteView(EducationDeptRequiredMixin, SchoolOwnerRequiredMixin, DeleteView):
     model = School
     template_name = 'schools/education_dept/school_confirm_delete.html'
     pk_url_kwarg = 'school_id'
@@ -204,13 +301,48 @@ class SchoolDeleteView(EducationDeptRequiredMixin, DeleteView):
         messages.success(request, _('Школа успешно удалена'))
         return super().delete(request, *args, **kwargs)
 
-class EducationDeptUserListView(EducationDeptRequiredMixin, ListView):
+class SchoolGradesExportView(EducationDeptRequiredMixin, View):
+    """Выгрузка оценок одной школы отдела образования (CSV или XLSX по ?format=)"""
+    query_budget = None  # один запрос на класс, см. exports.grade_rows
+    
+    def get(self, request, *args, **kwargs):
+        school = get_object_or_404(School, id=self.kwargs['school_id'], education_dept=request.user)
+        return export_response(analytics_iter(grade_rows([school])), f'grades_school_{school.id}', request.GET.get('format'))
+
+class DistrictGradesExportView(EducationDeptRequiredMixin, View):
+    """Выгрузка оценок всех школ отдела образования"""
+    query_budget = None  # один запрос на класс, см. exports.grade_rows
+    
+    def get(self, request, *args, **kwargs):
+        schools = School.objects.filter(education_dept=request.user)
+        return export_response(analytics_iter(grade_rows(schools)), 'grades_district', request.GET.get('format'))
+
+class EducationDeptUserListView(EducationDeptRequiredMixin, KeysetPaginationMixin, ListView):
+    query_budget = 6
     model = User
     template_name = 'schools/education_dept/user_list.html'
     context_object_name = 'users'
+    keyset_ordering = ('last_name', 'id')
+    keyset_filter_params = ('q', 'role')
+    json_fields = ('id', 'email', 'last_name', 'first_name', 'patronymic', 'role')
     
     def get_queryset(self):
-        return User.objects.exclude(role='superuser').select_related().prefetch_related('schools')
+        users = User.objects.exclude(role='superuser').select_related('school')
+        filters = self.get_filter_params()
+        for term in filters['q'].split():
+            users = users.filter(
+                Q(last_name__icontains=term) | Q(first_name__icontains=term) | Q(patronymic__icontains=term)
+            )
+        if filters['role']:
+            users = users.filter(role=filters['role'])
+        return users
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        filters = self.get_filter_params()
+        context['search_query'] = filters['q']
+        context['role_filter'] = filters['role']
+        return context
 
 class EducationDeptUserCreateView(EducationDeptRequiredMixin, CreateView):
     model = User
@@ -240,6 +372,7 @@ class EducationDeptUserCreateView(EducationDeptRequiredMixin, CreateView):
         return redirect('schools:education_dept-user-list')
 
 class EducationDeptUserDetailView(EducationDeptRequiredMixin, DetailView):
+    query_budget = 6
     model = User
     template_name = 'schools/education_dept/user_detail.html'
     context_object_name = 'target_user'
@@ -302,6 +435,7 @@ class EducationDeptUserDeleteView(EducationDeptRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 class SubjectListView(EducationDeptRequiredMixin, ListView):
+    query_budget = 5
     model = Subject
     template_name = 'schools/education_dept/subject_list.html'
     context_object_name = 'subjects'
@@ -380,15 +514,19 @@ class SchoolAdminChangePasswordView(SchoolAdminRequiredMixin, FormView):
         return redirect('schools:school_admin-profile')
 
 class ClassListView(SchoolAdminRequiredMixin, ListView):
+    query_budget = 6
     model = ClassGroup
     template_name = 'schools/school_admin/class_list.html'
     context_object_name = 'classes'
     
     def get_queryset(self):
         school = get_user_school(self.request.user)
-        return ClassGroup.objects.filter(school=school).annotate(
-            student_count=Count('students'),
-            average_grade=Avg('students__grades__grade', filter=Q(students__grades__quarter__in=['q1', 'q2', 'q3', 'q4']))
+        return ClassGroup.objects.filter(school=school).active().annotate(
+            student_count=Count('students', distinct=True),
+            average_grade=Avg('students__grades__grade', filter=Q(
+                students__grades__quarter__in=['q1', 'q2', 'q3', 'q4'],
+                students__grades__academic_year=get_active_year_id(),
+            ))
         )
 
 class ClassCreateView(SchoolAdminRequiredMixin, CreateView):
@@ -411,7 +549,8 @@ class ClassCreateView(SchoolAdminRequiredMixin, CreateView):
         
         return redirect('schools:school_admin-class-list')
 
-class ClassDetailView(SchoolAdminRequiredMixin, DetailView):
+class ClassDetailView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, DetailView):
+    query_budget = 12
     model = ClassGroup
     template_name = 'schools/school_admin/class_detail.html'
     context_object_name = 'class_obj'
@@ -422,7 +561,9 @@ class ClassDetailView(SchoolAdminRequiredMixin, DetailView):
         class_obj = self.object
         
         students = class_obj.students.annotate(
-            average_grade=Avg('grades__grade', filter=Q(grades__quarter__in=['q1', 'q2', 'q3', 'q4']))
+            average_grade=Avg('grades__grade', filter=Q(
+                grades__quarter__in=['q1', 'q2', 'q3', 'q4'], grades__academic_year=get_active_year_id()
+            ))
         )
         context['students'] = students
         
@@ -431,7 +572,7 @@ class ClassDetailView(SchoolAdminRequiredMixin, DetailView):
         
         return context
 
-class ClassUpdateView(SchoolAdminRequiredMixin, UpdateView):
+class ClassUpdateView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, UpdateView):
     model = ClassGroup
     form_class = ClassForm
     template_name = 'schools/school_admin/class_form.html'
@@ -453,7 +594,7 @@ class ClassUpdateView(SchoolAdminRequiredMixin, UpdateView):
         messages.success(self.request, _('Класс успешно обновлен'))
         return redirect('schools:school_admin-class-detail', class_id=class_group.id)
 
-class ClassDeleteView(SchoolAdminRequiredMixin, DeleteView):
+class ClassDeleteView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, DeleteView):
     model = ClassGroup
     template_name = 'schools/school_admin/class_confirm_delete.html'
     pk_url_kwarg = 'class_id'
@@ -465,26 +606,29 @@ class ClassDeleteView(SchoolAdminRequiredMixin, DeleteView):
         messages.success(request, _('Класс успешно удален'))
         return super().delete(request, *args, **kwargs)
 
-class StudentListView(SchoolAdminRequiredMixin, ListView):
+class StudentListView(SchoolAdminRequiredMixin, KeysetPaginationMixin, ListView):
+    query_budget = 7
     model = Student
     template_name = 'schools/school_admin/student_list.html'
     context_object_name = 'students'
+    keyset_ordering = ('search_last_name', 'id')
+    keyset_filter_params = ('q', 'class')
+    json_fields = ('id', 'last_name', 'first_name', 'patronymic', 'class_group_id')
     
     def get_queryset(self):
         school = get_user_school(self.request.user)
-        query = self.request.GET.get('q', '')
-        class_filter = self.request.GET.get('class', '')
+        filters = self.get_filter_params()
+        query = filters['q']
+        class_filter = filters['class']
         
-        students = Student.objects.filter(class_group__school=school).select_related('class_group')
+        students = Student.objects.filter(
+            class_group__school=school, class_group__is_archived=False
+        ).select_related('class_group')
         
         if query:
-            students = students.filter(
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query) |
-                Q(patronymic__icontains=query)
-            )
+            students = search_people(students, query)
         
-        if class_filter:
+        if class_filter.isascii() and class_filter.isdecimal():
             students = students.filter(class_group_id=class_filter)
         
         return students
@@ -492,12 +636,14 @@ class StudentListView(SchoolAdminRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         school = get_user_school(self.request.user)
-        context['classes'] = ClassGroup.objects.filter(school=school)
-        context['current_class'] = self.request.GET.get('class', '')
-        context['search_query'] = self.request.GET.get('q', '')
+        filters = self.get_filter_params()
+        context['classes'] = ClassGroup.objects.filter(school=school).active()
+        context['current_class'] = filters['class']
+        context['search_query'] = filters['q']
         return context
 
 class StudentCreateView(SchoolAdminRequiredMixin, CreateView):
+    query_budget = 8
     model = Student
     form_class = StudentForm
     template_name = 'schools/school_admin/student_form.html'
@@ -509,11 +655,40 @@ class StudentCreateView(SchoolAdminRequiredMixin, CreateView):
     
     def form_valid(self, form):
         student = form.save()
+        enroll_in_single_groups([student])
         log_action(self.request.user, 'create', 'Student', student.id, f"Created student: {student.get_full_name()}")
         messages.success(self.request, _('Учащийся успешно добавлен'))
         return redirect('schools:school_admin-student-list')
 
-class StudentDetailView(SchoolAdminRequiredMixin, DetailView):
+class StudentImportView(SchoolAdminRequiredMixin, FormView):
+    query_budget = None  # запросы на каждую пачку строк файла
+    form_class = RosterImportForm
+    template_name = 'schools/school_admin/student_import.html'
+    
+    def form_valid(self, form):
+        uploaded = form.cleaned_data['file']
+        school = get_user_school(self.request.user)
+        if school is None:
+            raise PermissionDenied("Администратор не привязан к школе")
+        try:
+            result = import_roster(uploaded, uploaded.name, school=school)
+        except ValidationError as e:
+            form.add_error('file', e)
+            return self.form_invalid(form)
+        
+        log_action(self.request.user, 'create', 'Student', None, describe_import(uploaded.name, result))
+        messages.success(self.request, _('Импортировано учащихся: %(created)s, создано классов: %(classes)s') % {
+            'created': result['created'], 'classes': result['classes_created']
+        })
+        if result['duplicates']:
+            messages.info(self.request, _('Пропущено уже существующих учащихся: %(count)s') % {'count': result['duplicates']})
+        if result['invalid']:
+            messages.warning(self.request, _('Строк с ошибками: %(count)s') % {'count': result['invalid']})
+            return self.render_to_response(self.get_context_data(form=form, import_errors=result['errors']))
+        return redirect('schools:school_admin-student-list')
+
+class StudentDetailView(SchoolAdminRequiredMixin, StudentOwnerRequiredMixin, DetailView):
+    query_budget = 7
     model = Student
     template_name = 'schools/school_admin/student_detail.html'
     context_object_name = 'student'
@@ -523,43 +698,33 @@ class StudentDetailView(SchoolAdminRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
         student = self.object
         
-        quarters = ['q1', 'q2', 'q3', 'q4', 'exam', 'year', 'final']
-        grades_data = {}
+        subjects = Subject.objects.filter(
+            class_groups__class_group_id=student.class_group_id,
+            class_groups__academic_year=get_active_year_id(),
+        ).distinct()
+        matrix = load_grade_matrix([student])
         
-        class_subjects = ClassSubjectGroup.objects.filter(
-            class_group=student.class_group
-        ).select_related('subject').distinct('subject')
-        
-        for subject in [cs.subject for cs in class_subjects]:
-            subject_grades = {}
-            for quarter in quarters:
-                try:
-                    grade = Grade.objects.get(student=student, subject=subject, quarter=quarter)
-                    subject_grades[quarter] = grade.grade
-                except Grade.DoesNotExist:
-                    subject_grades[quarter] = None
-            
-            # Рассчитываем средний балл по четвертям
-            quarter_averages = []
-            for quarter in ['q1', 'q2', 'q3', 'q4']:
-                grades_in_quarter = [g for g in subject_grades.values() if g is not None and g in range(1, 11)]
-                if grades_in_quarter:
-                    avg = sum(grades_in_quarter) / len(grades_in_quarter)
-                    quarter_averages.append(avg)
-            
-            if quarter_averages:
-                subject_grades['quarter_avg'] = round(sum(quarter_averages) / len(quarter_averages), 2)
-            else:
-                subject_grades['quarter_avg'] = None
+        grades_data = {}
+        grades_by_subject = []
+        for subject in subjects:
+            subject_grades = {
+                quarter: matrix.get(student.id, subject.id, quarter) for quarter in QUARTERS
+            }
+            # Средний балл по четвертям
+            subject_grades['quarter_avg'] = matrix.subject_average(student.id, subject.id)
             
             grades_data[subject] = subject_grades
+            grades_by_subject.append(dict(subject_grades, subject=subject, avg=subject_grades['quarter_avg']))
         
+        student.avg_grade = matrix.average(student.id, quarters=TERM_QUARTERS)
         context['grades_data'] = grades_data
-        context['quarters'] = quarters
+        context['grades_by_subject'] = grades_by_subject
+        context['quarters'] = QUARTERS
         
         return context
 
-class StudentUpdateView(SchoolAdminRequiredMixin, UpdateView):
+class StudentUpdateView(SchoolAdminRequiredMixin, StudentOwnerRequiredMixin, UpdateView):
+    query_budget = 8
     model = Student
     form_class = StudentForm
     template_name = 'schools/school_admin/student_form.html'
@@ -581,7 +746,7 @@ class StudentUpdateView(SchoolAdminRequiredMixin, UpdateView):
         messages.success(self.request, _('Информация об учащемся обновлена'))
         return redirect('schools:school_admin-student-detail', student_id=student.id)
 
-class StudentDeleteView(SchoolAdminRequiredMixin, DeleteView):
+class StudentDeleteView(SchoolAdminRequiredMixin, StudentOwnerRequiredMixin, DeleteView):
     model = Student
     template_name = 'schools/school_admin/student_confirm_delete.html'
     pk_url_kwarg = 'student_id'
@@ -593,7 +758,7 @@ class StudentDeleteView(SchoolAdminRequiredMixin, DeleteView):
         messages.success(request, _('Учащийся успешно удален'))
         return super().delete(request, *args, **kwargs)
 
-class AddStudentToClassView(SchoolAdminRequiredMixin, CreateView):
+class AddStudentToClassView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, CreateView):
     model = Student
     form_class = StudentForm
     template_name = 'schools/school_admin/add_student_to_class.html'
@@ -608,18 +773,36 @@ class AddStudentToClassView(SchoolAdminRequiredMixin, CreateView):
     
     def form_valid(self, form):
         student = form.save()
+        enroll_in_single_groups([student])
         log_action(self.request.user, 'create', 'Student', student.id, f"Added student to class: {student.get_full_name()}")
         messages.success(self.request, _('Учащийся успешно добавлен в класс'))
         return redirect('schools:school_admin-class-detail', class_id=student.class_group_id)
 
-class TeacherListView(SchoolAdminRequiredMixin, ListView):
+class TeacherListView(SchoolAdminRequiredMixin, KeysetPaginationMixin, ListView):
+    query_budget = 6
     model = Teacher
     template_name = 'schools/school_admin/teacher_list.html'
     context_object_name = 'teachers'
+    keyset_ordering = ('search_last_name', 'id')
+    keyset_filter_params = ('q',)
+    json_fields = ('id', 'last_name', 'first_name', 'patronymic')
     
     def get_queryset(self):
         school = get_user_school(self.request.user)
-        return Teacher.objects.filter(school=school)
+        teachers = Teacher.objects.filter(school=school).annotate(
+            assignment_count=Count('subject_groups', filter=Q(subject_groups__academic_year=get_active_year_id()))
+        )
+        
+        query = self.get_filter_params()['q']
+        if query:
+            teachers = search_people(teachers, query)
+        
+        return teachers
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['search_query'] = self.get_filter_params()['q']
+        return context
 
 class TeacherCreateView(SchoolAdminRequiredMixin, CreateView):
     model = Teacher
@@ -636,7 +819,8 @@ class TeacherCreateView(SchoolAdminRequiredMixin, CreateView):
         
         return redirect('schools:school_admin-teacher-list')
 
-class TeacherDetailView(SchoolAdminRequiredMixin, DetailView):
+class TeacherDetailView(SchoolAdminRequiredMixin, TeacherOwnerRequiredMixin, DetailView):
+    query_budget = 10
     model = Teacher
     template_name = 'schools/school_admin/teacher_detail.html'
     context_object_name = 'teacher'
@@ -651,7 +835,7 @@ class TeacherDetailView(SchoolAdminRequiredMixin, DetailView):
         
         return context
 
-class TeacherUpdateView(SchoolAdminRequiredMixin, UpdateView):
+class TeacherUpdateView(SchoolAdminRequiredMixin, TeacherOwnerRequiredMixin, UpdateView):
     model = Teacher
     form_class = TeacherForm
     template_name = 'schools/school_admin/teacher_form.html'
@@ -668,7 +852,7 @@ class TeacherUpdateView(SchoolAdminRequiredMixin, UpdateView):
         messages.success(self.request, _('Информация об учителе обновлена'))
         return redirect('schools:school_admin-teacher-detail', teacher_id=teacher.id)
 
-class TeacherDeleteView(SchoolAdminRequiredMixin, DeleteView):
+class TeacherDeleteView(SchoolAdminRequiredMixin, TeacherOwnerRequiredMixin, DeleteView):
     model = Teacher
     template_name = 'schools/school_admin/teacher_confirm_delete.html'
     pk_url_kwarg = 'teacher_id'
@@ -680,32 +864,32 @@ class TeacherDeleteView(SchoolAdminRequiredMixin, DeleteView):
         messages.success(request, _('Учитель успешно удален'))
         return super().delete(request, *args, **kwargs)
 
-class AssignTeacherToSubjectView(SchoolAdminRequiredMixin, FormView):
+class AssignTeacherToSubjectView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, FormView):
     form_class = AssignTeacherToSubjectForm
     template_name = 'schools/school_admin/assign_teacher_to_subject.html'
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['school'] = get_user_school(self.request.user)
-        kwargs['class_group'] = get_object_or_404(ClassGroup, id=self.kwargs['class_id'])
+        kwargs['class_group'] = self.scoped_object
         return kwargs
     
     def form_valid(self, form):
         subject = form.cleaned_data['subject']
         teacher = form.cleaned_data['teacher']
         level = form.cleaned_data['level']
-        class_group = get_object_or_404(ClassGroup, id=self.kwargs['class_id'])
+        class_group = self.scoped_object
         
-        existing_assignments = ClassSubjectGroup.objects.filter(
+        existing_count = ClassSubjectGroup.objects.for_year().filter(
             class_group=class_group,
             subject=subject
-        )
+        ).count()
         
         group_number = 1
-        if existing_assignments.count() == 1:
+        if existing_count == 1:
             # Уже есть один учитель, создаем вторую группу
             group_number = 2
-        elif existing_assignments.count() >= 2:
+        elif existing_count >= 2:
             # Несколько учителей, нужно распределение по подгруппам
             messages.warning(self.request, _('Этот предмет уже имеет несколько учителей. Используйте распределение по подгруппам.'))
             return redirect('schools:school_admin-class-detail', class_id=class_group.id)
@@ -720,12 +904,7 @@ class AssignTeacherToSubjectView(SchoolAdminRequiredMixin, FormView):
         
         # Если это единственная группа, добавляем всех студентов
         if group_number == 1:
-            students = class_group.students.all()
-            for student in students:
-                StudentSubjectGroup.objects.create(
-                    student=student,
-                    subject_group=assignment
-                )
+            fill_single_groups([class_group.id], [subject.id])
         
         log_action(self.request.user, 'create', 'ClassSubjectGroup', assignment.id, 
                   f"Assigned teacher {teacher.get_full_name()} to subject {subject.name} in class {class_group.name}")
@@ -733,38 +912,56 @@ class AssignTeacherToSubjectView(SchoolAdminRequiredMixin, FormView):
         
         return redirect('schools:school_admin-class-detail', class_id=class_group.id)
 
-class AssignTeacherToGroupView(SchoolAdminRequiredMixin, FormView):
+class AssignTeacherToGroupView(SchoolAdminRequiredMixin, TeacherOwnerRequiredMixin, FormView):
     form_class = AssignTeacherToGroupForm
     template_name = 'schools/school_admin/assign_teacher_to_group.html'
     
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['school'] = get_user_school(self.request.user)
-        kwargs['teacher'] = get_object_or_404(Teacher, id=self.kwargs['teacher_id'])
+        kwargs['teacher'] = self.scoped_object
         return kwargs
     
     def form_valid(self, form):
         subject = form.cleaned_data['subject']
         class_groups = form.cleaned_data['class_groups']
         level = form.cleaned_data['level']
-        teacher = get_object_or_404(Teacher, id=self.kwargs['teacher_id'])
-        
-        for class_group in class_groups:
-            ClassSubjectGroup.objects.create(
-                class_group=class_group,
-                subject=subject,
-                teacher=teacher,
-                level=level,
-                group_number=1
-            )
+        teacher = self.scoped_object
+        
+        with transaction.atomic():
+            # Уже существующие назначения пропускаются и не попадают в отчет
+            assigned = set(ClassSubjectGroup.objects.for_year().filter(
+                class_group__in=class_groups, subject=subject, teacher=teacher, group_number=1
+            ).values_list('class_group_id', flat=True))
+            new_classes = [class_group for class_group in class_groups if class_group.id not in assigned]
+            ClassSubjectGroup.objects.bulk_create([
+                ClassSubjectGroup(
+                    class_group=class_group,
+                    subject=subject,
+                    teacher=teacher,
+                    level=level,
+                    group_number=1
+                )
+                for class_group in new_classes
+            ])
+            
+            # Там, где предмет ведется одной группой, в нее входит весь класс
+            fill_single_groups([c.id for c in new_classes], [subject.id])
+        
+        if not new_classes:
+            messages.info(self.request, _('Учитель уже назначен на выбранные классы'))
+            return redirect('schools:school_admin-teacher-detail', teacher_id=teacher.id)
         
+        class_names = ', '.join(class_group.name for class_group in new_classes)
         log_action(self.request.user, 'create', 'ClassSubjectGroup', None, 
-                  f"Assigned teacher {teacher.get_full_name()} to multiple classes")
-        messages.success(self.request, _('Учитель успешно назначен на классы'))
+                  f"Assigned teacher {teacher.get_full_name()} to subject {subject.name} in classes {class_names}")
+        messages.success(self.request, _('Учитель назначен на классы: %(classes)s') % {'classes': class_names})
+        if assigned:
+            messages.info(self.request, _('Пропущено классов с уже существующим назначением: %(count)s') % {'count': len(assigned)})
         
         return redirect('schools:school_admin-teacher-detail', teacher_id=teacher.id)
 
-class DeleteAssignmentView(SchoolAdminRequiredMixin, DeleteView):
+class DeleteAssignmentView(SchoolAdminRequiredMixin, AssignmentOwnerRequiredMixin, DeleteView):
     model = ClassSubjectGroup
     template_name = 'schools/school_admin/assignment_confirm_delete.html'
     pk_url_kwarg = 'assignment_id'
@@ -781,198 +978,143 @@ class DeleteAssignmentView(SchoolAdminRequiredMixin, DeleteView):
         
         return super().delete(request, *args, **kwargs)
 
-class DistributeStudentsToSubgroupsView(SchoolAdminRequiredMixin, FormView):
+class DistributeStudentsToSubgroupsView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, FormView):
+    query_budget = 16
     form_class = DistributeStudentsToSubgroupsForm
     template_name = 'schools/school_admin/distribute_students.html'
     
+    @cached_property
+    def subject(self):
+        return get_object_or_404(Subject, id=self.kwargs['subject_id'])
+    
+    @cached_property
+    def assignments(self):
+        return list(ClassSubjectGroup.objects.for_year().filter(
+            class_group=self.scoped_object,
+            subject=self.subject
+        ).select_related('teacher').order_by('group_number', 'id'))
+    
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        class_id = self.kwargs['class_id']
-        class_group = get_object_or_404(ClassGroup, id=class_id)
-        
-        subject_id = self.kwargs['subject_id']
-        subject = get_object_or_404(Subject, id=subject_id)
-        
-        assignments = ClassSubjectGroup.objects.filter(
-            class_group=class_group,
-            subject=subject
-        ).select_related('teacher')
+        class_group = self.scoped_object
         
         students = class_group.students.all()
-        current_distribution = {}
         
-        for i, assignment in enumerate(assignments):
-            student_groups = StudentSubjectGroup.objects.filter(subject_group=assignment)
-            current_distribution[i+1] = [sg.student for sg in student_groups]
+        # Текущее распределение одним запросом для всех подгрупп; при отправке
+        # формы initial не используется, и запрос не нужен
+        current_distribution = {}
+        if self.request.method not in ('POST', 'PUT'):
+            group_numbers = {assignment.id: i + 1 for i, assignment in enumerate(self.assignments)}
+            current_distribution = {number: [] for number in group_numbers.values()}
+            for membership in StudentSubjectGroup.objects.filter(
+                subject_group_id__in=list(group_numbers)
+            ).select_related('student'):
+                current_distribution[group_numbers[membership.subject_group_id]].append(membership.student)
         
         kwargs['students'] = students
-        kwargs['teachers'] = [a.teacher for a in assignments]
+        kwargs['teachers'] = [a.teacher for a in self.assignments]
         kwargs['current_distribution'] = current_distribution
         return kwargs
     
     def form_valid(self, form):
-        class_id = self.kwargs['class_id']
-        subject_id = self.kwargs['subject_id']
+        class_group = self.scoped_object
+        subject = self.subject
         
-        class_group = get_object_or_404(ClassGroup, id=class_id)
-        subject = get_object_or_404(Subject, id=subject_id)
+        desired = {}
+        for i, assignment in enumerate(self.assignments):
+            students = form.cleaned_data.get(f'group_{i+1}_students') or []
+            desired[assignment.id] = {student.id for student in students}
         
-        assignments = ClassSubjectGroup.objects.filter(
-            class_group=class_group,
-            subject=subject
-        )
-        
-        with transaction.atomic():
-            # Удаляем старое распределение
-            StudentSubjectGroup.objects.filter(
-                subject_group__in=assignments
-            ).delete()
-            
-            # Создаем новое распределение
-            for i, assignment in enumerate(assignments):
-                field_name = f'group_{i+1}_students'
-                students = form.cleaned_data.get(field_name, [])
-                
-                for student in students:
-                    StudentSubjectGroup.objects.create(
-                        student=student,
-                        subject_group=assignment
-                    )
+        # Пишется только разница с текущим распределением
+        result = set_group_members(desired)
         
         log_action(self.request.user, 'update', 'StudentSubjectGroup', None, 
-                  f"Redistributed students for subject {subject.name} in class {class_group.name}")
+                  f"Redistributed students for subject {subject.name} in class {class_group.name}: "
+                  f"added {result['added']}, removed {result['removed']}")
         messages.success(self.request, _('Распределение учащихся по подгруппам успешно сохранено'))
         
         return redirect('schools:school_admin-class-detail', class_id=class_group.id)
 
-class GradeJournalView(SchoolAdminRequiredMixin, FormView):
-    form_class = GradeJournalForm
-    template_name = 'schools/school_admin/grade_journal.html'
+class GradeJournalExportView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, View):
+    """Выгрузка журнала класса в том же виде, что и на странице журнала"""
+    query_budget = 8
     
-    def get_form_kwargs(self):
-        kwargs = super().get_form_kwargs()
-        class_id = self.kwargs['class_id']
-        class_group = get_object_or_404(ClassGroup, id=class_id)
-        
-        students = class_group.students.all()
-        
-        subject_assignments = ClassSubjectGroup.objects.filter(
-            class_group=class_group
-        ).select_related('subject')
-        
-        # Get unique subjects
-        subjects_seen = set()
-        subjects = []
-        for sa in subject_assignments:
-            if sa.subject_id not in subjects_seen:
-                subjects.append(sa.subject)
-                subjects_seen.add(sa.subject_id)
-        
-        grades_data = {}
-        grades = Grade.objects.filter(
-            student__in=students,
-            subject__in=subjects
-        )
-        
-        for grade in grades:
-            grades_data[(grade.student_id, grade.subject_id, grade.quarter)] = grade.grade
-        
-        kwargs['class_group'] = class_group
-        kwargs['students'] = students
-        kwargs['subjects'] = subjects
-        kwargs['grades_data'] = grades_data
-        return kwargs
+    def get(self, request, *args, **kwargs):
+        class_group = self.scoped_object
+        return export_response(journal_rows(class_group), f'journal_class_{class_group.id}', request.GET.get('format'))
 
-    def get_context_data(self, **kwargs):
+class SchoolAdminGradesExportView(SchoolAdminRequiredMixin, View):
+    """Выгрузка всех оценок школы администратора"""
+    query_budget = None  # один запрос на класс, см. exports.grade_rows
+    
+    def get(self, request, *args, **kwargs):
+        school = get_user_school(request.user)
+        if school is None:
+            raise PermissionDenied("Администратор не привязан к школе")
+        return export_response(analytics_iter(grade_rows([school])), f'grades_school_{school.id}', request.GET.get('format'))
+
+class GradeJournalView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, TemplateView):
+    query_budget = 30  # POST: оценки, агрегаты трех уровней и (в тестах) журнал аудита
+    template_name = 'schools/school_admin/grade_journal.html'
+    
+    @cached_property
+    def snapshot(self):
+        class_group = self.scoped_object
+        return JournalSnapshot(class_group)
+    
+    def get_context_data(self, submitted=None, invalid=(), **kwargs):
         context = super().get_context_data(**kwargs)
-        class_id = self.kwargs['class_id']
-        class_group = get_object_or_404(ClassGroup, id=class_id)
-        context['school_class'] = class_group
-        
-        students = class_group.students.all()
-        context['students'] = students
-        
-        subject_assignments = ClassSubjectGroup.objects.filter(
-            class_group=class_group
-        ).select_related('subject')
-        
-        subjects_seen = set()
-        subjects = []
-        for sa in subject_assignments:
-            if sa.subject_id not in subjects_seen:
-                subjects.append(sa.subject)
-                subjects_seen.add(sa.subject_id)
-        context['subjects'] = subjects
-        
-        # Organize grades for template
-        grades_dict = {}
-        grades = Grade.objects.filter(student__in=students, subject__in=subjects)
-        for g in grades:
-            if g.student_id not in grades_dict:
-                grades_dict[g.student_id] = {}
-            if g.subject_id not in grades_dict[g.student_id]:
-                grades_dict[g.student_id][g.subject_id] = {}
-            
-            # Map database quarter codes to template keys
-            q_map = {'q1': 'q1', 'q2': 'q2', 'q3': 'q3', 'q4': 'q4', 'exam': 'exam', 'year': 'year', 'final': 'final'}
-            grades_dict[g.student_id][g.subject_id][q_map.get(g.quarter)] = g.grade
-            
-        context['grades'] = grades_dict
+        snapshot = self.snapshot
+        context['school_class'] = snapshot.class_group
+        context['class_group'] = snapshot.class_group
+        context['subjects'] = snapshot.subjects
+        # Строки журнала собираются без полей формы: тысячи ячеек на класс
+        context['journal_rows'] = render_journal_rows(snapshot, submitted, invalid)
         return context
     
     def post(self, request, *args, **kwargs):
-        class_id = self.kwargs['class_id']
-        class_group = get_object_or_404(ClassGroup, id=class_id)
-        
-        students = class_group.students.all()
-        
-        subject_assignments = ClassSubjectGroup.objects.filter(
-            class_group=class_group
-        ).select_related('subject').distinct('subject')
+        snapshot = self.snapshot
+        class_group = snapshot.class_group
         
-        subjects = [sa.subject for sa in subject_assignments]
-        quarters = ['q1', 'q2', 'q3', 'q4', 'exam', 'year', 'final']
+        # Сначала разбираем и проверяем все ячейки, затем пишем одним пакетом
+        values, invalid = parse_journal_post(request.POST, snapshot)
+        if invalid:
+            messages.error(request, _('Оценка должна быть от 1 до 10'))
+            return self.render_to_response(self.get_context_data(submitted=request.POST, invalid=invalid))
         
-        grades_updated = 0
-        grades_created = 0
-        
-        with transaction.atomic():
-            for student in students:
-                for subject in subjects:
-                    for quarter in quarters:
-                        field_name = f'grade_{student.id}_{subject.id}_{quarter}'
-                        grade_value = request.POST.get(field_name)
-                        
-                        if grade_value in [None, '']:
-                            grade_value = None
-                        else:
-                            try:
-                                grade_value = int(grade_value)
-                                if not (1 <= grade_value <= 10):
-                                    messages.error(request, _('Оценка должна быть от 1 до 10'))
-                                    return self.form_invalid(self.get_form())
-                            except ValueError:
-                                grade_value = None
-                        
-                        grade_obj, created = Grade.objects.update_or_create(
-                            student=student,
-                            subject=subject,
-                            quarter=quarter,
-                            defaults={'grade': grade_value}
-                        )
-                        
-                        if created:
-                            grades_created += 1
-                        else:
-                            grades_updated += 1
+        result = save_grade_matrix(values)
         
         log_action(request.user, 'update', 'Grade', None, 
-                  f"Updated {grades_updated} and created {grades_created} grades for class {class_group.name}")
+                  f"Saved grade journal for class {class_group.name}: "
+                  f"created {result['created']}, updated {result['updated']}, "
+                  f"deleted {result['deleted']}, unchanged {result['unchanged']}")
         messages.success(request, _('Оценки успешно сохранены'))
         
         return redirect('schools:school_admin-grade-journal', class_id=class_group.id)
-    
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['class_group'] = get_object_or_404(ClassGroup, id=self.kwargs['class_id'])
-        return context
\ No newline at end of file
+
+class GradeJournalCellsView(SchoolAdminRequiredMixin, ClassOwnerRequiredMixin, View):
+    """JSON API журнала: PATCH пакета ячеек вместо отправки всей формы"""
+    query_budget = 24  # в тестах журнал аудита пишется синхронно: +3 запроса
+    http_method_names = ['patch']
+    
+    def patch(self, request, *args, **kwargs):
+        class_group = self.scoped_object
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'errors': ['Некорректный JSON']}, status=400)
+        changes = payload.get('changes') if isinstance(payload, dict) else None
+        
+        result, averages, errors = save_grade_cells(class_group, changes)
+        if errors:
+            return JsonResponse({'errors': errors}, status=400)
+        
+        if result['created'] or result['updated'] or result['deleted']:
+            log_action(request.user, 'update', 'Grade', None,
+                      f"Saved {len(changes)} grade journal cells for class {class_group.name}: "
+                      f"created {result['created']}, updated {result['updated']}, deleted {result['deleted']}")
+        
+        return JsonResponse({
+            'saved': result,
+            'averages': {str(student_id): average for student_id, average in averages.items()},
+        })
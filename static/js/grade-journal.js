@@ -1,31 +1,56 @@
 const GradeJournal = {
+    // Изменения копятся и отправляются одним PATCH после паузы во вводе
+    SAVE_DELAY: 600,
+
     init: function() {
         const table = document.querySelector('.grade-journal-table');
         if (!table) return;
 
+        this.table = table;
+        this.cellsUrl = table.dataset.cellsUrl;
+        this.status = document.getElementById('journal-save-status');
+        this.pending = new Map();
+        this.saving = false;
+        this.timer = null;
+
         table.addEventListener('input', (e) => {
             if (e.target.classList.contains('grade-input')) {
                 this.handleInput(e.target);
             }
         });
 
-        const exportBtn = document.querySelector('#export-csv');
-        if (exportBtn) {
-            exportBtn.addEventListener('click', () => this.exportToCSV(table));
-        }
+        window.addEventListener('beforeunload', (e) => {
+            if (this.pending.size || this.saving) {
+                e.preventDefault();
+                e.returnValue = '';
+            }
+        });
+    },
+
+    // Как на сервере: только цифры ASCII, без дробей и знаков
+    parseGrade: function(value) {
+        if (!/^\d+$/.test(value)) return null;
+        const grade = Number(value);
+        return grade >= 1 && grade <= 10 ? grade : null;
     },
 
     handleInput: function(input) {
-        let value = input.value.trim();
+        const value = input.value.trim();
         if (value === '') {
-            input.classList.remove('grade-low');
+            input.classList.remove('grade-low', 'grade-error');
+            this.updateAverages(input.closest('tr'));
+            this.queueChange(input, null);
             return;
         }
 
-        const grade = parseInt(value);
-        if (isNaN(grade) || grade < 1 || grade > 10) {
-            input.value = '';
-            input.classList.remove('grade-low');
+        const grade = this.parseGrade(value);
+        if (grade === null) {
+            // Неверное значение остается в поле и не отправляется: сохраненная
+            // оценка удаляется только очисткой ячейки
+            this.pending.delete(input.name);
+            input.classList.remove('grade-low', 'grade-pending');
+            input.classList.add('grade-error');
+            this.updateAverages(input.closest('tr'));
             return;
         }
 
@@ -36,6 +61,84 @@ const GradeJournal = {
         }
 
         this.updateAverages(input.closest('tr'));
+        this.queueChange(input, grade);
+    },
+
+    queueChange: function(input, grade) {
+        if (!this.cellsUrl) return;
+
+        // Имя поля: grade_<учащийся>_<предмет>_<четверть>
+        const [, student, subject, quarter] = input.name.split('_');
+        this.pending.set(input.name, {
+            input: input,
+            change: {student: Number(student), subject: Number(subject), quarter: quarter, grade: grade}
+        });
+        input.classList.remove('grade-error');
+        input.classList.add('grade-pending');
+
+        clearTimeout(this.timer);
+        this.timer = setTimeout(() => this.flush(), this.SAVE_DELAY);
+    },
+
+    flush: function() {
+        if (this.saving || !this.pending.size) return;
+
+        const batch = Array.from(this.pending.values());
+        this.pending.clear();
+        this.saving = true;
+        this.setStatus('Сохранение…');
+
+        fetch(this.cellsUrl, {
+            method: 'PATCH',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': this.csrfToken()
+            },
+            credentials: 'same-origin',
+            body: JSON.stringify({changes: batch.map(item => item.change)})
+        })
+            .then(response => response.json().then(data => ({ok: response.ok, data: data})))
+            .then(({ok, data}) => {
+                if (!ok) throw new Error((data.errors || ['Ошибка сохранения']).join('; '));
+
+                batch.forEach(item => {
+                    // Ячейку могли изменить снова, пока шел запрос
+                    if (!this.pending.has(item.input.name)) {
+                        item.input.classList.remove('grade-pending');
+                    }
+                });
+                Object.entries(data.averages).forEach(([studentId, average]) => {
+                    const row = this.table.querySelector(`tr[data-student-id="${studentId}"]`);
+                    const avgCell = row && row.querySelector('.average-cell');
+                    if (avgCell) {
+                        avgCell.textContent = average === null ? '-' : average.toFixed(2);
+                    }
+                });
+                this.setStatus('Сохранено');
+            })
+            .catch(error => {
+                batch.forEach(item => {
+                    item.input.classList.remove('grade-pending');
+                    item.input.classList.add('grade-error');
+                });
+                this.setStatus(error.message || 'Ошибка сохранения', true);
+            })
+            .finally(() => {
+                this.saving = false;
+                if (this.pending.size) this.flush();
+            });
+    },
+
+    csrfToken: function() {
+        const field = document.querySelector('#journal-form [name=csrfmiddlewaretoken]');
+        return field ? field.value : '';
+    },
+
+    setStatus: function(text, isError) {
+        if (!this.status) return;
+        this.status.textContent = text;
+        this.status.classList.toggle('text-danger', !!isError);
+        this.status.classList.toggle('text-muted', !isError);
     },
 
     updateAverages: function(row) {
@@ -43,40 +146,17 @@ const GradeJournal = {
         let sum = 0;
         let count = 0;
         inputs.forEach(input => {
-            const val = parseInt(input.value);
-            if (!isNaN(val)) {
+            const val = this.parseGrade(input.value.trim());
+            if (val !== null) {
                 sum += val;
                 count++;
             }
         });
 
         const avgCell = row.querySelector('.average-cell');
-        if (avgCell && count > 0) {
-            avgCell.textContent = (sum / count).toFixed(2);
+        if (avgCell) {
+            avgCell.textContent = count > 0 ? (sum / count).toFixed(2) : '-';
         }
-    },
-
-    exportToCSV: function(table) {
-        let csv = [];
-        const rows = table.querySelectorAll('tr');
-        
-        for (let i = 0; i < rows.length; i++) {
-            let row = [], cols = rows[i].querySelectorAll('td, th');
-            
-            for (let j = 0; j < cols.length; j++) {
-                let data = cols[j].querySelector('input') ? cols[j].querySelector('input').value : cols[j].innerText;
-                row.push('"' + data + '"');
-            }
-            csv.push(row.join(','));
-        }
-
-        const csvContent = "data:text/csv;charset=utf-8," + csv.join("\n");
-        const encodedUri = encodeURI(csvContent);
-        const link = document.createElement("a");
-        link.setAttribute("href", encodedUri);
-        link.setAttribute("download", "grade_journal.csv");
-        document.body.appendChild(link);
-        link.click();
     }
 };
 